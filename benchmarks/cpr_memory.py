@@ -0,0 +1,62 @@
+"""
+Benchmark of the memory used by CPR numbers held in a list and in a set.
+
+Compares the slotted Cpr with the previous representation, a plain object
+with a per-instance dict. The numbers are a contiguous range of the index,
+so the list and the set hold distinct numbers. The field values are
+created up front and shared, so only the objects and containers count.
+
+Run with: python benchmarks/cpr_memory.py [COUNT]
+"""
+
+import sys
+import tracemalloc
+from typing import Callable
+from typing import Iterable
+
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import Options
+from improbable_cpr.index import CprIndex
+
+
+class DictCpr:
+    def __init__(self, day, month, year, running_number) -> None:
+        self.running_number = running_number
+        self.year = year
+        self.month = month
+        self.day = day
+
+
+def bytes_per_number(
+    numbers: list[tuple[int, int, int, int]],
+    make: Callable[..., object],
+    container: Callable[[Iterable[object]], object],
+) -> float:
+    tracemalloc.start()
+    held = container(make(*fields) for fields in numbers)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return size / len(numbers)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    index = CprIndex(Options(years=list(range(1950, 2000))))
+    numbers = [
+        (cpr.day, cpr.month, cpr.year, cpr.running_number)
+        for cpr in index.iter_range(0, count)
+    ]
+
+    for name, container in (("list", list), ("set", set)):
+        before = bytes_per_number(numbers, DictCpr, container)
+        after = bytes_per_number(numbers, Cpr, container)
+        print(
+            f"{name:4} dict: {before:6.1f} bytes/number"
+            f"   slots: {after:6.1f} bytes/number"
+            f"   ({before / after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
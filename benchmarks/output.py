@@ -0,0 +1,59 @@
+"""
+Benchmark of writing CPR numbers as text, one per line.
+
+Compares printing every number through the text mode stdout, as the CLI
+used to, with the buffered byte records of CprWriter. The numbers are
+generated up front so only formatting and writing is measured.
+
+Run with: python benchmarks/output.py [COUNT]
+"""
+
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import Options
+from improbable_cpr.index import CprIndex
+from improbable_cpr.output import CprWriter
+
+
+def print_numbers(cprs: list[Cpr], dash: bool) -> float:
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        for cpr in cprs:
+            if dash:
+                print(cpr.get_dash())
+            else:
+                print(cpr.get_no_dash())
+        return time.perf_counter() - start
+
+
+def write_numbers(cprs: list[Cpr], dash: bool) -> float:
+    with open(os.devnull, "wb") as devnull:
+        start = time.perf_counter()
+        writer = CprWriter(devnull, dash)
+        writer.write_all(cprs)
+        writer.flush()
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    index = CprIndex(Options(years=list(range(1950, 2000))))
+    step = len(index) // count
+    cprs = [index.unrank(position * step) for position in range(count)]
+
+    for fmt, dash in (("dash", True), ("no-dash", False)):
+        before = print_numbers(cprs, dash)
+        after = write_numbers(cprs, dash)
+        print(
+            f"{fmt:8} print: {count / before:12,.0f} numbers/s"
+            f"   CprWriter: {count / after:12,.0f} numbers/s"
+            f"   ({before / after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
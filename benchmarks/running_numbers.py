@@ -0,0 +1,97 @@
+"""
+Benchmark of the shared running number tables on a full-year run.
+
+Compares generating every number for a single year with the cached tables
+against rebuilding the candidate list from the 7th digit and gender rules
+every time a day/gender branch is opened.
+
+Run with: python benchmarks/running_numbers.py [YEAR]
+"""
+
+import random
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from improbable_cpr import generators
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import CprGenerator
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import Options
+
+
+class RebuildingRunningNumberGenerator(generators.RunningNumberGenerator):
+    def _validate_7_digit(self, running_number: int) -> bool:
+        return generators.valid_7_digit(running_number // 1000, self.year)
+
+    def _validate_gender(self, number: int) -> bool:
+        if self.gender == Gender.FEMALE:
+            return number % 2 == 0
+        else:
+            return not number % 2 == 0
+
+    def __iter__(self) -> Iterator[Cpr]:
+        runningNumbers = [
+            i
+            for i in range(10000)
+            if self._validate_gender(i) and self._validate_7_digit(i)
+        ]
+        if self.date_residue is not None:
+            runningNumbers = [
+                i
+                for i in runningNumbers
+                if (self.date_residue + generators.RUNNING_NUMBER_RESIDUES[i])
+                % 11
+            ]
+        random.shuffle(runningNumbers)
+        for number in runningNumbers:
+            cpr = Cpr()
+            cpr.running_number = number
+            yield cpr
+
+
+@contextmanager
+def rebuilding_tables() -> Iterator[None]:
+    original = generators.RunningNumberGenerator
+    generators.RunningNumberGenerator = RebuildingRunningNumberGenerator
+    try:
+        yield
+    finally:
+        generators.RunningNumberGenerator = original
+
+
+def full_year(year: int) -> tuple[int, float]:
+    start = time.perf_counter()
+    count = sum(1 for _ in CprGenerator(Options(years=[year])))
+    return count, time.perf_counter() - start
+
+
+def open_branches(year: int) -> float:
+    start = time.perf_counter()
+    for _ in range(365):
+        for gender in Gender:
+            next(iter(generators.RunningNumberGenerator(year, gender)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else 1990
+    random.seed(year)
+
+    with rebuilding_tables():
+        rebuilding = open_branches(year)
+    cached = open_branches(year)
+    print(f"opening 730 branches: {rebuilding:.3f}s -> {cached:.3f}s")
+
+    with rebuilding_tables():
+        count, rebuilding = full_year(year)
+    print(f"rebuild per branch: {count} numbers in {rebuilding:.2f}s")
+
+    count, cached = full_year(year)
+    print(f"shared tables:      {count} numbers in {cached:.2f}s")
+    print(f"speedup:            {rebuilding / cached:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark of the start up cost of the package and the CLI.
+
+Measures the cumulative import time of the package modules reported by
+`python -X importtime`, and the end-to-end latency of the CLI generating a
+single number, each as the fastest of a number of fresh processes. The
+slowest imports below the CLI are listed to show where the time goes.
+
+Run with: python benchmarks/startup.py [--repeat N] [--output FILE]
+    [--compare FILE]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Any
+
+
+MODULES = [
+    "improbable_cpr",
+    "improbable_cpr.cpr_builder",
+    "improbable_cpr.main",
+]
+CLI = "from improbable_cpr import main_cli; main_cli()"
+COMMANDS = {
+    "-n 1": ["-n", "1"],
+    "-n 1 --year 1990": ["-n", "1", "--year", "1990"],
+    "-n 1 --order shuffled": ["-n", "1", "--order", "shuffled"],
+}
+
+
+def import_times(module: str) -> dict[str, float]:
+    """The cumulative import time in seconds of every module imported."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def fastest_import(module: str, repeat: int) -> tuple[float, dict[str, float]]:
+    runs = [import_times(module) for _ in range(repeat)]
+    best = min(runs, key=lambda times: times[module])
+    return best[module], best
+
+
+def fastest(command: list[str], repeat: int) -> float:
+    """The fastest of `repeat` runs of the command, from starting the
+    process to its exit."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def compare(value: float, old: dict[str, Any] | None, key: str) -> str:
+    if old is None or key not in old:
+        return ""
+    return f"   {value / old[key]:.2f}x"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="startup-results.json")
+    parser.add_argument("--compare", help="Results of an earlier run")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as old_file:
+            baseline = json.load(old_file)
+
+    results: dict[str, Any] = {
+        "interpreter_seconds": fastest([sys.executable, "-c", ""], args.repeat),
+        "import_seconds": {},
+        "latency_seconds": {},
+    }
+    print(f"interpreter start: {results['interpreter_seconds'] * 1000:.1f} ms")
+
+    slowest: dict[str, float] = {}
+    for module in MODULES:
+        seconds, times = fastest_import(module, args.repeat)
+        results["import_seconds"][module] = seconds
+        slowest = times
+        old = None if baseline is None else baseline["import_seconds"]
+        print(
+            f"import {module:30} {seconds * 1000:7.1f} ms"
+            + compare(seconds, old, module)
+        )
+    for name, command in COMMANDS.items():
+        seconds = fastest([sys.executable, "-c", CLI, *command], args.repeat)
+        results["latency_seconds"][name] = seconds
+        old = None if baseline is None else baseline["latency_seconds"]
+        print(
+            f"improbable_cpr {name:22} {seconds * 1000:7.1f} ms"
+            + compare(seconds, old, name)
+        )
+
+    print("slowest imports of the CLI (cumulative):")
+    leaves = sorted(slowest.items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in leaves[1:11]:
+        print(f"  {name:40} {seconds * 1000:7.1f} ms")
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
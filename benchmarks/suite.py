@@ -0,0 +1,183 @@
+"""
+Benchmark suite over representative specs.
+
+For every spec and order, a fresh process measures the time to the first
+number, the throughput of generating COUNT numbers and the peak memory
+traced while generating them, together with the peak RSS of the process.
+The cold start of the CLI generating a single number is timed separately.
+The results are printed as a table and saved as JSON, and can be compared
+with the results of an earlier run.
+
+Run with: python benchmarks/suite.py [--count COUNT] [--output FILE]
+    [--compare FILE] [--spec NAME ...] [--order ORDER ...]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any
+
+from improbable_cpr.main import make_argument_parser
+from improbable_cpr.main import make_builder
+
+
+SPECS = {
+    "full": [],
+    "single-year": ["--year", "1990"],
+    "single-day": ["--year", "1990", "--month", "6", "--day", "15"],
+    "age-30": ["--age", "30"],
+    "date-window": ["--min_date", "1990-06-10", "--max_date", "1990-06-20"],
+    "female": ["--gender", "female"],
+    "male": ["--gender", "male"],
+}
+ORDERS = ["random", "shuffled", "windowed", "sequential"]
+CLI = "from improbable_cpr.main import main_cli; main_cli()"
+
+
+def measure(args: list[str], count: int) -> dict[str, Any]:
+    """Generate `count` numbers for the CLI arguments in this process."""
+    parsed_args = make_argument_parser().parse_args([*args, "--seed", "1"])
+
+    start = time.perf_counter()
+    numbers = iter(make_builder(parsed_args))
+    next(numbers, None)
+    first = time.perf_counter() - start
+    generated = 1 + sum(1 for _ in itertools.islice(numbers, count - 1))
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    numbers = iter(make_builder(parsed_args))
+    for _ in itertools.islice(numbers, count):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "numbers": generated,
+        "seconds": seconds,
+        "numbers_per_second": generated / seconds,
+        "first_number_seconds": first,
+        "tracemalloc_peak_bytes": peak,
+        "max_rss_bytes": max_rss * (1 if sys.platform == "darwin" else 1024),
+    }
+
+
+def cold_start(args: list[str], repeat: int = 3) -> float:
+    """The fastest of `repeat` runs of the CLI generating one number."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", CLI, *args, "-n", "1"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_spec(name: str, order: str, count: int) -> dict[str, Any]:
+    args = [*SPECS[name], "--order", order]
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure", str(count), *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return {
+        "spec": name,
+        "order": order,
+        "args": args,
+        **json.loads(output),
+        "cold_start_seconds": cold_start(args),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(
+    results: list[dict[str, Any]], baseline: dict[tuple, dict] | None
+) -> None:
+    print(
+        f"{'spec':12} {'order':8} {'numbers/s':>12} {'first (ms)':>11}"
+        f" {'traced (KB)':>12} {'RSS (MB)':>9} {'start (ms)':>11}"
+    )
+    for result in results:
+        line = (
+            f"{result['spec']:12} {result['order']:8}"
+            f" {result['numbers_per_second']:12,.0f}"
+            f" {result['first_number_seconds'] * 1000:11.1f}"
+            f" {result['tracemalloc_peak_bytes'] / 2**10:12,.0f}"
+            f" {result['max_rss_bytes'] / 2**20:9.1f}"
+            f" {result['cold_start_seconds'] * 1000:11.1f}"
+        )
+        old = (baseline or {}).get((result["spec"], result["order"]))
+        if old is not None:
+            ratio = result["numbers_per_second"] / old["numbers_per_second"]
+            line += f"   {ratio:.2f}x throughput"
+        print(line)
+
+
+def main() -> None:
+    if len(sys.argv) > 2 and sys.argv[1] == "--measure":
+        print(json.dumps(measure(sys.argv[3:], int(sys.argv[2]))))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="Results of an earlier run")
+    parser.add_argument("--spec", nargs="+", choices=list(SPECS))
+    parser.add_argument("--order", nargs="+", choices=ORDERS)
+    args = parser.parse_args()
+
+    results = [
+        run_spec(name, order, args.count)
+        for name in args.spec or SPECS
+        for order in args.order or ORDERS
+    ]
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as old_file:
+            baseline = {
+                (result["spec"], result["order"]): result
+                for result in json.load(old_file)["results"]
+            }
+    print_results(results, baseline)
+
+    with open(args.output, "w") as output:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "count": args.count,
+                "results": results,
+            },
+            output,
+            indent=2,
+        )
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
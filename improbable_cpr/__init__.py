@@ -1,11 +1,43 @@
 """
 __init__ file.
+
+The exports are imported on first use, so importing the package or one of
+its modules does not load the command line interface.
 """
 
-from .cpr import Cpr
-from .cpr_builder import CprBuilder
+from typing import TYPE_CHECKING
+from typing import Any
+
 from .version import __version__
-from .main import main_cli
 
 
-__all__ = ["__version__", "Cpr", "CprBuilder", "main_cli"]
+if TYPE_CHECKING:
+    from .cpr import Cpr
+    from .cpr_builder import CprBuilder
+    from .index import CprIndex
+    from .main import main_cli
+
+
+__all__ = ["__version__", "Cpr", "CprBuilder", "CprIndex", "main_cli"]
+
+EXPORTS = {
+    "Cpr": "cpr",
+    "CprBuilder": "cpr_builder",
+    "CprIndex": "index",
+    "main_cli": "main",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *EXPORTS])
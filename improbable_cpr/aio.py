@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from concurrent.futures import Executor
+from itertools import islice
+from typing import Iterable
+from typing import Iterator
+from typing import Self
+
+from improbable_cpr.cpr import Cpr
+
+
+class AsyncCprStream:
+    """Asynchronous iterator drawing CPR numbers in batches on an executor.
+
+    Every batch, including the setup of the iterator, is drawn on a worker
+    thread, so the event loop keeps running however long a single number
+    takes to find. A batch is only drawn when the previous one has been
+    consumed, which bounds the numbers held to one batch. Cancelling a
+    waiting consumer or closing the stream stops the batch being drawn
+    after the current number.
+    """
+
+    def __init__(
+        self,
+        numbers: Iterable[Cpr],
+        batch_size: int = 1000,
+        count: int | None = None,
+        executor: Executor | None = None,
+    ) -> None:
+        self.numbers = numbers
+        self.iterator: Iterator[Cpr] | None = None
+        self.batch_size = batch_size
+        self.remaining = count
+        self.executor = executor
+        self.batch: list[Cpr] = []
+        self.offset = 0
+        self.exhausted = False
+        self.stopped = threading.Event()
+
+    def draw(self, size: int) -> list[Cpr]:
+        if self.iterator is None:
+            self.iterator = iter(self.numbers)
+        batch = []
+        for cpr in islice(self.iterator, size):
+            batch.append(cpr)
+            if self.stopped.is_set():
+                break
+        return batch
+
+    async def next_batch(self) -> list[Cpr]:
+        """The next batch of at most `batch_size` numbers, empty when the
+        stream is exhausted."""
+        if self.offset < len(self.batch):
+            batch = self.batch[self.offset :]
+            self.batch, self.offset = [], 0
+            return batch
+        size = self.batch_size
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        if self.exhausted or size <= 0 or self.stopped.is_set():
+            return []
+
+        loop = asyncio.get_running_loop()
+        try:
+            batch = await loop.run_in_executor(self.executor, self.draw, size)
+        except asyncio.CancelledError:
+            self.stopped.set()
+            raise
+        if len(batch) < size:
+            self.exhausted = True
+        if self.remaining is not None:
+            self.remaining -= len(batch)
+        return batch
+
+    def __aiter__(self) -> Self:
+        return self
+
+    async def __anext__(self) -> Cpr:
+        if self.offset == len(self.batch):
+            self.batch, self.offset = await self.next_batch(), 0
+            if not self.batch:
+                raise StopAsyncIteration
+        cpr = self.batch[self.offset]
+        self.offset += 1
+        return cpr
+
+    async def aclose(self) -> None:
+        self.stopped.set()
@@ -0,0 +1,428 @@
+import struct
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from functools import cache
+from typing import Any
+from typing import Iterable
+from typing import Self
+
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import MULTIPLICATION_TABLE
+from improbable_cpr.generators import RUNNING_NUMBER_RESIDUES
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import Options
+from improbable_cpr.generators import matching_dates
+from improbable_cpr.generators import seventh_digits
+
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment, unused-ignore]
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def numpy_installed() -> bool:
+    return np is not None
+
+
+RECORD_WIDTHS = {"dash": 11, "no-dash": 10, "packed": 8}
+PARSE_FORMATS = tuple(RECORD_WIDTHS)
+PARSE_CHUNK_SIZE = 1 << 16
+
+
+@dataclass
+class CprBatch:
+    """CPR numbers stored as columns of date ordinals and running numbers.
+
+    The columns are NumPy arrays when produced by the NumPy engine and
+    `array.array` objects when produced by the pure Python fallback.
+    """
+
+    ordinals: Any
+    running_numbers: Any
+
+    @classmethod
+    def from_cprs(cls, cprs: Iterable[Cpr]) -> Self:
+        ordinals = array("l")
+        running_numbers = array("H")
+        for cpr in cprs:
+            birth_date = date(cpr.year, cpr.month, cpr.day)  # type: ignore
+            ordinals.append(birth_date.toordinal())
+            running_numbers.append(cpr.running_number)  # type: ignore
+        return cls(ordinals, running_numbers)
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def to_cprs(self) -> list[Cpr]:
+        cprs = []
+        for ordinal, running_number in zip(self.ordinals, self.running_numbers):
+            birth_date = date.fromordinal(int(ordinal))
+            cprs.append(
+                Cpr(
+                    birth_date.day,
+                    birth_date.month,
+                    birth_date.year,
+                    int(running_number),
+                )
+            )
+        return cprs
+
+    def no_dash(self) -> Any:
+        """The numbers as fixed width `S10` records, e.g. b"0101901234"."""
+        return self._format(dash=False)
+
+    def dash(self) -> Any:
+        """The numbers as fixed width `S11` records, e.g. b"010190-1234"."""
+        return self._format(dash=True)
+
+    def _format(self, dash: bool) -> Any:
+        if np is not None and isinstance(self.running_numbers, np.ndarray):
+            return format_records(self.ordinals, self.running_numbers, dash)
+        return [
+            (cpr.get_dash() if dash else cpr.get_no_dash()).encode("ascii")
+            for cpr in self.to_cprs()
+        ]
+
+
+def split_ordinals(ordinals: "np.ndarray") -> tuple["np.ndarray", ...]:
+    """Split date ordinals into arrays of years, months and days."""
+    days = (ordinals - EPOCH_ORDINAL).astype("datetime64[D]")
+    first_of_month = days.astype("datetime64[M]")
+    first_of_year = days.astype("datetime64[Y]")
+    return (
+        first_of_year.astype(np.int64) + 1970,
+        (first_of_month - first_of_year).astype(np.int64) + 1,
+        (days - first_of_month).astype(np.int64) + 1,
+    )
+
+
+def format_records(
+    ordinals: "np.ndarray", running_numbers: "np.ndarray", dash: bool
+) -> "np.ndarray":
+    years, months, days = split_ordinals(ordinals)
+    two_digit_years = years % 100
+    width = 11 if dash else 10
+    records = np.empty((len(ordinals), width), dtype=np.uint8)
+    date_digits = (
+        days // 10,
+        days % 10,
+        months // 10,
+        months % 10,
+        two_digit_years // 10,
+        two_digit_years % 10,
+    )
+    for column, digits in enumerate(date_digits):
+        records[:, column] = digits + ord("0")
+    if dash:
+        records[:, 6] = ord("-")
+    for column, divisor in enumerate((1000, 100, 10, 1), start=width - 4):
+        records[:, column] = running_numbers // divisor % 10 + ord("0")
+    return records.view(f"S{width}").ravel()
+
+
+def date_residues(
+    years: "np.ndarray", months: "np.ndarray", days: "np.ndarray"
+) -> "np.ndarray":
+    digits = (
+        days // 10,
+        days % 10,
+        months // 10,
+        months % 10,
+        years // 10 % 10,
+        years % 10,
+    )
+    products = map(np.multiply, digits, MULTIPLICATION_TABLE)
+    return sum(products, np.zeros_like(years)) % 11
+
+
+def generate(
+    options: Options, n: int | None = None, seed: Any = None
+) -> CprBatch:
+    """Draw `n` distinct numbers, or all of them, matching the options.
+
+    Every date matched by the options gets a key from its 7th digit band and
+    its modulus 11 date residue. The improbable running numbers are computed
+    once per key with array operations, after which the drawn positions are
+    mapped to a date and a running number using the cumulative counts.
+    """
+    rng = np.random.default_rng(seed)
+    ordinals = np.fromiter(
+        (day.toordinal() for day in matching_dates(options)), dtype=np.int64
+    )
+    if len(ordinals) == 0:
+        return CprBatch(ordinals, np.empty(0, dtype=np.uint16))
+
+    years, months, days = split_ordinals(ordinals)
+    bands = sorted({seventh_digits(int(year)) for year in np.unique(years)})
+    band_of_year = {
+        year: bands.index(seventh_digits(year))
+        for year in map(int, np.unique(years))
+    }
+    band_ids = np.array([band_of_year[int(year)] for year in years])
+    keys = band_ids * 11 + date_residues(years, months, days)
+    unique_keys, key_of_day = np.unique(keys, return_inverse=True)
+
+    numbers = np.arange(10000)
+    residues = np.frombuffer(RUNNING_NUMBER_RESIDUES, dtype=np.uint8)
+    parities = [
+        0 if gender == Gender.FEMALE else 1 for gender in options.genders
+    ]
+    gender_mask = np.isin(numbers % 2, parities)
+    tables = []
+    for key in unique_keys:
+        band, residue = divmod(int(key), 11)
+        mask = (
+            gender_mask
+            & np.isin(numbers // 1000, bands[band])
+            & ((residues + residue) % 11 != 0)
+        )
+        tables.append(np.flatnonzero(mask))
+
+    lengths = np.array([len(table) for table in tables], dtype=np.int64)
+    padded = np.zeros((len(tables), max(lengths.max(), 1)), dtype=np.uint16)
+    for row, table in enumerate(tables):
+        padded[row, : len(table)] = table
+
+    counts = lengths[key_of_day]
+    ends = np.cumsum(counts)
+    total = int(ends[-1])
+    if n is None or n >= total:
+        positions = rng.permutation(total)
+    else:
+        positions = rng.choice(total, size=n, replace=False)
+
+    day_index = np.searchsorted(ends, positions, side="right")
+    offsets = positions - (ends[day_index] - counts[day_index])
+    return CprBatch(ordinals[day_index], padded[key_of_day[day_index], offsets])
+
+
+@dataclass
+class ParsedCprs:
+    """The fields of CPR records parsed by `parse_records`.
+
+    The columns are NumPy arrays of `uint8`, `uint8`, `uint16`, `uint16`
+    and `bool` when NumPy is installed, and `array.array` objects otherwise.
+    The fields of the records marked in `errors` are 0.
+    """
+
+    days: Any
+    months: Any
+    years: Any
+    running_numbers: Any
+    errors: Any
+
+    def __len__(self) -> int:
+        return len(self.errors)
+
+    def to_cprs(self) -> list[Cpr | None]:
+        """The records as `Cpr` objects, None for the records with errors."""
+        return [
+            None if error else Cpr(int(day), int(month), int(year), int(rn))
+            for day, month, year, rn, error in zip(
+                self.days,
+                self.months,
+                self.years,
+                self.running_numbers,
+                self.errors,
+            )
+        ]
+
+
+@cache
+def year_table() -> list[list[int]]:
+    """The year of every 7th digit and two digit year."""
+    return [
+        [Cpr.calculate_year(digit, year) for year in range(100)]
+        for digit in range(10)
+    ]
+
+
+def record_count(size: int, fmt: str) -> int:
+    """The number of records in a buffer of `size` bytes.
+
+    Text records end with a newline, which the last record may leave out.
+    Raises ValueError if the size does not fit whole records.
+    """
+    if fmt not in RECORD_WIDTHS:
+        raise ValueError(
+            f"Unknown format {fmt!r}, expected one of {', '.join(PARSE_FORMATS)}"
+        )
+    if fmt == "packed":
+        rows, rest = divmod(size, 8)
+    else:
+        rows, rest = divmod(size + 1, RECORD_WIDTHS[fmt] + 1)
+        # A remainder of 1 is the newline after the last record.
+        rest = 0 if rest == 1 else rest
+    if rest:
+        raise ValueError(f"{size} bytes is not a whole number of {fmt} records")
+    return rows
+
+
+def parse_records(buffer: Any, fmt: str = "dash") -> ParsedCprs:
+    """Parse fixed width CPR records without creating a `str` or `Cpr` per
+    record.
+
+    `buffer` is any object supporting the buffer protocol, such as `bytes`,
+    a `memoryview` or an `mmap`. The `dash` and `no-dash` records are lines
+    as written by `CprWriter`, and the year is found from the 7th digit like
+    `Cpr.calculate_year` does. `packed` records are the little-endian 64-bit
+    integers written by `PackedWriter`. Records that are malformed, are not
+    a real date, or whose year cannot be written with their 7th digit are
+    marked in `errors`.
+    """
+    size = memoryview(buffer).nbytes
+    rows = record_count(size, fmt)
+    if numpy_installed():
+        return parse_arrays(buffer, fmt, rows)
+    return parse_python(buffer, fmt, rows)
+
+
+def parse_arrays(buffer: Any, fmt: str, rows: int) -> ParsedCprs:
+    days = np.zeros(rows, dtype=np.uint8)
+    months = np.zeros(rows, dtype=np.uint8)
+    years = np.zeros(rows, dtype=np.uint16)
+    running_numbers = np.zeros(rows, dtype=np.uint16)
+    errors = np.zeros(rows, dtype=bool)
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    if fmt == "packed":
+        values = raw[: rows * 8].view("<u8")
+    else:
+        width = RECORD_WIDTHS[fmt]
+        records = np.lib.stride_tricks.as_strided(
+            raw, shape=(rows, width), strides=(width + 1, 1), writeable=False
+        )
+        newlines = raw[width :: width + 1]
+        errors[: len(newlines)] = newlines != 10
+
+    # Chunks keep the temporary arrays small for large buffers.
+    for start in range(0, rows, PARSE_CHUNK_SIZE):
+        end = min(start + PARSE_CHUNK_SIZE, rows)
+        if fmt == "packed":
+            fields = split_packed(values[start:end])
+        else:
+            fields = split_digits(records[start:end], fmt == "dash")
+        day, month, year, running_number, error = fields
+        error |= errors[start:end]
+        valid = ~error
+        days[start:end] = np.where(valid, day, 0)
+        months[start:end] = np.where(valid, month, 0)
+        years[start:end] = np.where(valid, year, 0)
+        running_numbers[start:end] = np.where(valid, running_number, 0)
+        errors[start:end] = error
+    return ParsedCprs(days, months, years, running_numbers, errors)
+
+
+def split_digits(records: "np.ndarray", dash: bool) -> tuple["np.ndarray", ...]:
+    columns = [0, 1, 2, 3, 4, 5, 7, 8, 9, 10] if dash else list(range(10))
+    # Bytes below b"0" wrap around, so every non-digit is above 9.
+    digits = records[:, columns] - np.uint8(48)
+    error = (digits > 9).any(axis=1)
+    if dash:
+        error |= records[:, 6] != 45
+    digits[error] = 0
+    digits = digits.astype(np.int64)
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    year = np.array(year_table())[
+        digits[:, 6], digits[:, 4] * 10 + digits[:, 5]
+    ]
+    running_number = digits[:, 6:] @ np.array([1000, 100, 10, 1])
+    error |= ~valid_dates(day, month, year)
+    return day, month, year, running_number, error
+
+
+def split_packed(values: "np.ndarray") -> tuple["np.ndarray", ...]:
+    date_key, running_number = np.divmod(values.astype(np.int64), 10000)
+    year_month, day = np.divmod(date_key, 100)
+    year, month = np.divmod(year_month, 100)
+    error = ~valid_dates(day, month, year)
+    digit = running_number // 1000
+    years = np.array(year_table())
+    error |= years[digit, year % 100] != year
+    return day, month, year, running_number, error
+
+
+def valid_dates(
+    days: "np.ndarray", months: "np.ndarray", years: "np.ndarray"
+) -> "np.ndarray":
+    leap = (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+    month_lengths = np.array(
+        [[0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]] * 2
+    )
+    month_lengths[1, 2] = 29
+    valid = (months >= 1) & (months <= 12) & (days >= 1)
+    return valid & (days <= month_lengths[leap.astype(np.int64), months % 13])
+
+
+def parse_python(buffer: Any, fmt: str, rows: int) -> ParsedCprs:
+    parsed = ParsedCprs(
+        array("B", bytes(rows)),
+        array("B", bytes(rows)),
+        array("H", bytes(2 * rows)),
+        array("H", bytes(2 * rows)),
+        array("B", bytes(rows)),
+    )
+    years = year_table()
+    data = memoryview(buffer).cast("B")
+    if fmt == "packed":
+        fields: Iterable = (
+            split_packed_value(value, years)
+            for (value,) in struct.iter_unpack("<Q", data[: rows * 8])
+        )
+    else:
+        width = RECORD_WIDTHS[fmt]
+        fields = (
+            split_record(data, row * (width + 1), width, years)
+            for row in range(rows)
+        )
+    for row, field in enumerate(fields):
+        if field is None:
+            parsed.errors[row] = 1
+            continue
+        day, month, year, running_number = field
+        try:
+            date(year, month, day)
+        except ValueError:
+            parsed.errors[row] = 1
+            continue
+        parsed.days[row] = day
+        parsed.months[row] = month
+        parsed.years[row] = year
+        parsed.running_numbers[row] = running_number
+    return parsed
+
+
+def split_record(
+    data: memoryview, start: int, width: int, years: list[list[int]]
+) -> tuple[int, int, int, int] | None:
+    end = start + width
+    if end < len(data) and data[end] != 10:
+        return None
+    record = list(data[start:end])
+    if width == 11 and record.pop(6) != 45:
+        return None
+    digits = [byte - 48 for byte in record]
+    if not all(0 <= digit <= 9 for digit in digits):
+        return None
+    return (
+        digits[0] * 10 + digits[1],
+        digits[2] * 10 + digits[3],
+        years[digits[6]][digits[4] * 10 + digits[5]],
+        ((digits[6] * 10 + digits[7]) * 10 + digits[8]) * 10 + digits[9],
+    )
+
+
+def split_packed_value(
+    value: int, years: list[list[int]]
+) -> tuple[int, int, int, int] | None:
+    date_key, running_number = divmod(value, 10000)
+    year_month, day = divmod(date_key, 100)
+    year, month = divmod(year_month, 100)
+    if years[running_number // 1000][year % 100] != year:
+        return None
+    return day, month, year, running_number
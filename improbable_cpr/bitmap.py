@@ -0,0 +1,244 @@
+"""
+Persistent bitmap of the complete improbable space.
+
+The file holds one bit per running number of every date from 1858 to 2057,
+set when the number is improbable: its 7th digit can be allocated in the
+year of the date and it fails the modulo 11 test. Excluded days are not
+part of the file, they depend on the options. Build it once with
+`improbable_cpr build-index`; when it is missing, the bits of a date are
+computed from the running number tables instead.
+"""
+
+import mmap
+import os
+import struct
+import warnings
+import zlib
+from datetime import date
+from functools import cache
+from typing import BinaryIO
+from typing import Iterable
+
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.cpr import Gender
+from improbable_cpr.generators import date_residue
+from improbable_cpr.generators import improbable_running_numbers
+from improbable_cpr.generators import seventh_digits
+
+
+BITMAP_VERSION = 1
+MAGIC = b"ICPRBITS"
+HEADER = struct.Struct("<8sIIIII")
+HEADER_SIZE = 64
+FIRST_DAY = date(1858, 1, 1)
+LAST_DAY = date(2057, 12, 31)
+BYTES_PER_DAY = 10000 // 8
+GENDER_MASKS = {Gender.FEMALE: 0x55, Gender.MALE: 0xAA}
+PATH_VARIABLE = "IMPROBABLE_CPR_BITMAP"
+
+
+def default_path() -> str:
+    """The path of the bitmap: `$IMPROBABLE_CPR_BITMAP` if set, otherwise
+    a versioned file in the user's cache directory."""
+    path = os.environ.get(PATH_VARIABLE)
+    if path:
+        return path
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(
+        cache_home, "improbable_cpr", f"improbable-v{BITMAP_VERSION}.bitmap"
+    )
+
+
+@cache
+def computed_bits(digits: tuple[int, ...], residue: int) -> bytes:
+    """The bits of the improbable running numbers of a 7th digit band and
+    date residue, bit `n % 8` of byte `n // 8` standing for number `n`."""
+    bits = bytearray(BYTES_PER_DAY)
+    for gender in Gender:
+        for number in improbable_running_numbers(digits, gender, residue):
+            bits[number >> 3] |= 1 << (number & 7)
+    return bytes(bits)
+
+
+def compute_day_bits(day: date) -> bytes:
+    return computed_bits(
+        seventh_digits(day.year), date_residue(day.day, day.month, day.year)
+    )
+
+
+def dates(first: date, last: date) -> Iterable[date]:
+    for ordinal in range(first.toordinal(), last.toordinal() + 1):
+        yield date.fromordinal(ordinal)
+
+
+def write(
+    stream: BinaryIO, first: date = FIRST_DAY, last: date = LAST_DAY
+) -> None:
+    """Write the bitmap of the dates from `first` to `last` to a seekable
+    stream."""
+    stream.write(bytes(HEADER_SIZE))
+    checksum = 0
+    days = 0
+    for day in dates(first, last):
+        bits = compute_day_bits(day)
+        checksum = zlib.crc32(bits, checksum)
+        stream.write(bits)
+        days += 1
+    header = HEADER.pack(
+        MAGIC,
+        BITMAP_VERSION,
+        first.toordinal(),
+        days,
+        BYTES_PER_DAY,
+        checksum,
+    )
+    stream.seek(0)
+    stream.write(header.ljust(HEADER_SIZE, b"\0"))
+
+
+def build(
+    path: str | None = None, first: date = FIRST_DAY, last: date = LAST_DAY
+) -> str:
+    """Build the bitmap file and return its path.
+
+    The file is written next to its final path and then moved in place, so
+    readers never see a partial file.
+    """
+    path = default_path() if path is None else path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as stream:
+        write(stream, first, last)
+    os.replace(temporary_path, path)
+    load.cache_clear()
+    return path
+
+
+class SpaceBitmap:
+    """Read-only, memory-mapped view of a bitmap file.
+
+    Raises ValueError if the header does not describe a bitmap of this
+    version matching the size of the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as stream:
+            self.data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER_SIZE:
+            raise ValueError(f"{path} is not a bitmap file")
+        magic, version, first, days, width, checksum = HEADER.unpack_from(
+            self.data
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a bitmap file")
+        if version != BITMAP_VERSION:
+            raise ValueError(
+                f"{path} has version {version}, expected {BITMAP_VERSION}"
+            )
+        if width != BYTES_PER_DAY or len(self.data) != (
+            HEADER_SIZE + days * width
+        ):
+            raise ValueError(f"The size of {path} does not match its header")
+        self.first = first
+        self.days = days
+        self.checksum = checksum
+
+    def verify(self) -> bool:
+        """Whether the bits match the checksum in the header."""
+        bits = memoryview(self.data)[HEADER_SIZE:]
+        try:
+            return zlib.crc32(bits) == self.checksum
+        finally:
+            bits.release()
+
+    def offset(self, day: date) -> int | None:
+        """The position of the bits of the date, None if not covered."""
+        index = day.toordinal() - self.first
+        if 0 <= index < self.days:
+            return HEADER_SIZE + index * BYTES_PER_DAY
+        return None
+
+    def day_bits(self, day: date) -> bytes | None:
+        start = self.offset(day)
+        if start is None:
+            return None
+        return self.data[start : start + BYTES_PER_DAY]
+
+    def close(self) -> None:
+        self.data.close()
+
+
+@cache
+def load(path: str | None = None) -> SpaceBitmap | None:
+    """The bitmap at `path`, or the default path, if it exists.
+
+    The checksum is verified when the file is loaded. A file that cannot be
+    used or is damaged is ignored with a warning, so lookups fall back to
+    computing the bits.
+    """
+    path = default_path() if path is None else path
+    if not os.path.exists(path):
+        return None
+    try:
+        bitmap = SpaceBitmap(path)
+    except (OSError, ValueError) as e:
+        warnings.warn(f"Ignoring the bitmap: {e}")
+        return None
+    if not bitmap.verify():
+        bitmap.close()
+        warnings.warn(f"Ignoring the bitmap: {path} does not match its checksum")
+        return None
+    return bitmap
+
+
+def day_location(day: date) -> tuple[bytes | mmap.mmap, int]:
+    """The buffer holding the bits of the date and the position of their
+    first byte in it. The bits are read in place from the bitmap file if
+    there is one covering the date, without copying them."""
+    bitmap = load()
+    if bitmap is not None:
+        start = bitmap.offset(day)
+        if start is not None:
+            return bitmap.data, start
+    return compute_day_bits(day), 0
+
+
+def day_bits(day: date) -> bytes:
+    """The bits of the improbable running numbers of the date, read from the
+    bitmap file if there is one covering the date."""
+    bitmap = load()
+    if bitmap is not None:
+        bits = bitmap.day_bits(day)
+        if bits is not None:
+            return bits
+    return compute_day_bits(day)
+
+
+def is_improbable(cpr: Cpr) -> bool:
+    """Whether the date is real and the number improbable for it."""
+    try:
+        day = date(cpr.year, cpr.month, cpr.day)  # type: ignore
+    except ValueError:
+        return False
+    bits, start = day_location(day)
+    number = cpr.running_number
+    return bool(bits[start + (number >> 3)] >> (number & 7) & 1)  # type: ignore
+
+
+@cache
+def gender_mask(genders: frozenset[Gender]) -> int:
+    """The bits of the running numbers of the genders on any date."""
+    mask = 0
+    for gender in genders:
+        mask |= GENDER_MASKS[gender]
+    return int.from_bytes(bytes([mask]) * BYTES_PER_DAY, "little")
+
+
+def day_count(day: date, genders: Iterable[Gender] = tuple(Gender)) -> int:
+    """The number of improbable running numbers of the genders on the date,
+    counted from its bits."""
+    bits = int.from_bytes(day_bits(day), "little")
+    return (bits & gender_mask(frozenset(genders))).bit_count()
@@ -0,0 +1,283 @@
+import calendar
+from collections import Counter
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import date
+from enum import StrEnum
+from enum import auto
+from functools import cache
+from typing import Any
+from typing import BinaryIO
+from typing import Iterator
+
+from improbable_cpr.bitmap import BYTES_PER_DAY
+from improbable_cpr.bitmap import FIRST_DAY
+from improbable_cpr.bitmap import HEADER_SIZE
+from improbable_cpr.bitmap import LAST_DAY
+from improbable_cpr.bitmap import SpaceBitmap
+from improbable_cpr.bitmap import day_location
+from improbable_cpr.bitmap import load
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import MULTIPLICATION_TABLE
+
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment, unused-ignore]
+
+
+DASH_COLUMNS = [0, 1, 2, 3, 4, 5, 7, 8, 9, 10]
+
+
+class Status(StrEnum):
+    IMPROBABLE = auto()
+    VALID_MOD11 = "valid-mod11"
+    BAD_CENTURY = "bad-century"
+    BAD_DATE = "bad-date"
+    MALFORMED = auto()
+
+    def __str__(self):
+        return self.value
+
+
+@dataclass
+class CheckReport:
+    """The number of lines of every status and the line numbers, counting
+    from 1, of up to `limit` lines of every status but improbable."""
+
+    limit: int = 1000
+    counts: Counter[Status] = field(default_factory=Counter)
+    lines: dict[Status, list[int]] = field(default_factory=dict)
+
+    def add(self, status: Status, line_number: int) -> None:
+        self.counts[status] += 1
+        if status != Status.IMPROBABLE:
+            lines = self.lines.setdefault(status, [])
+            if len(lines) < self.limit:
+                lines.append(line_number)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def ok(self) -> bool:
+        return self.counts[Status.IMPROBABLE] == self.total
+
+
+def valid_date(day: int, month: int, year: int) -> bool:
+    return 1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]
+
+
+RUNNING_NUMBERS = {b"%04d" % number: number for number in range(10000)}
+NO_BITS: tuple[Any, int] = (None, 0)
+
+
+def date_status(key: bytes) -> tuple[Status | None, date | None]:
+    """The status of the date and 7th digit of a CPR number, None if valid,
+    together with the date if valid.
+
+    `key` is the number without the last three digits, in dash or no-dash
+    form.
+    """
+    if len(key) == 8 and key[6] == 45:  # b"-"
+        key = key[:6] + key[7:]
+    if len(key) != 7 or not key.isdigit():
+        return Status.MALFORMED, None
+    day, month, two_digit_year = int(key[0:2]), int(key[2:4]), int(key[4:6])
+    year = Cpr.calculate_year(key[6] - 48, two_digit_year)
+    if valid_date(day, month, year):
+        return None, date(year, month, day)
+    for century in (1800, 1900, 2000):
+        if valid_date(day, month, century + two_digit_year):
+            return Status.BAD_CENTURY, None
+    return Status.BAD_DATE, None
+
+
+def classify(line: bytes) -> Status:
+    """The status of a single CPR number in dash or no-dash form."""
+    status, day = date_status(line[:-3])
+    if status is not None:
+        return status
+    number = RUNNING_NUMBERS.get(line[-4:])
+    if number is None:
+        return Status.MALFORMED
+    # The year follows from the 7th digit, so every number of a valid date
+    # that is not improbable passes the modulo 11 test.
+    bits, start = day_location(day)  # type: ignore
+    if bits[start + (number >> 3)] >> (number & 7) & 1:
+        return Status.IMPROBABLE
+    return Status.VALID_MOD11
+
+
+def read_blocks(stream: BinaryIO, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """The stream in blocks of about `chunk_size` bytes holding whole lines.
+
+    Only the last block may lack a final line ending.
+    """
+    rest = b""
+    while chunk := stream.read(chunk_size):
+        block = rest + chunk
+        end = block.rfind(b"\n") + 1
+        rest = block[end:]
+        if end:
+            yield block[:end]
+    if rest:
+        yield rest
+
+
+def check_lines(
+    block: bytes,
+    first: int,
+    report: CheckReport,
+    dates: dict[bytes, tuple[Status | None, Any, int]],
+) -> int:
+    """Classify the lines of the block, numbered from `first`, and return
+    the number of lines.
+
+    The status of every distinct date, and the buffer and position of its
+    improbable bits, are looked up once in `dates` and the running numbers
+    come from a table of all endings, so the common case of an improbable
+    number takes two dictionary lookups and a bit test. The bits are shared
+    with the bitmap file or the tables they are computed from, so `dates`
+    does not hold a copy of them per date.
+    """
+    lines = block.split(b"\n")
+    if not lines[-1]:
+        lines.pop()
+    improbable = 0
+    numbers = RUNNING_NUMBERS
+    for line_number, line in enumerate(lines, first):
+        key = line[:-3]
+        entry = dates.get(key)
+        if entry is None:
+            status, day = date_status(key)
+            bits, start = NO_BITS if day is None else day_location(day)
+            entry = status, bits, start
+            if status != Status.MALFORMED:
+                dates[key] = entry
+        number = numbers.get(line[-4:])
+        if entry[0] is None and number is not None:
+            if entry[1][entry[2] + (number >> 3)] >> (number & 7) & 1:
+                improbable += 1
+            else:
+                report.add(Status.VALID_MOD11, line_number)
+        else:
+            line = line.strip()
+            if line:
+                report.add(classify(line), line_number)
+    report.counts[Status.IMPROBABLE] += improbable
+    return len(lines)
+
+
+@cache
+def record_tables() -> tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """The year of every 7th digit and two digit year, the length of every
+    month in common and leap years, and the ordinal of the first day of
+    every month from `bitmap.FIRST_DAY` on."""
+    years = np.array(
+        [
+            [Cpr.calculate_year(digit, year) for year in range(100)]
+            for digit in range(10)
+        ]
+    )
+    month_lengths = np.array(
+        [
+            [0]
+            + [calendar.monthrange(year, month)[1] for month in range(1, 13)]
+            for year in (2001, 2000)
+        ]
+    )
+    month_starts = np.array(
+        [
+            [0] + [date(year, month, 1).toordinal() for month in range(1, 13)]
+            for year in range(FIRST_DAY.year, LAST_DAY.year + 1)
+        ]
+    )
+    return years, month_lengths, month_starts
+
+
+def record_bits(space: SpaceBitmap | None) -> "np.ndarray | None":
+    """The bits of the bitmap as an array, if it covers every year a CPR
+    number can have."""
+    if space is None or space.first > FIRST_DAY.toordinal():
+        return None
+    if space.first + space.days <= LAST_DAY.toordinal():
+        return None
+    return np.frombuffer(space.data, dtype=np.uint8, offset=HEADER_SIZE)
+
+
+def check_records(
+    block: bytes,
+    first: int,
+    report: CheckReport,
+    space: SpaceBitmap | None = None,
+) -> int | None:
+    """Classify a block of fixed width records with NumPy.
+
+    Returns the number of lines, or None if the lines of the block are not
+    all in the same dash or no-dash form. Only the lines that are not
+    improbable are classified one by one. With a bitmap covering every
+    year, the numbers are looked up in it instead of computing the modulo
+    11 test.
+    """
+    width = block.find(b"\n") + 1
+    if width not in (11, 12) or len(block) % width:
+        return None
+    records = np.frombuffer(block, dtype=np.uint8).reshape(-1, width)
+    if not (records[:, -1] == 10).all():
+        return None
+    if width == 12 and not (records[:, 6] == 45).all():
+        return None
+
+    columns = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9] if width == 11 else DASH_COLUMNS
+    digits = records[:, columns].astype(np.int64) - 48
+    improbable = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    digits[~improbable] = 0
+
+    years, month_lengths, month_starts = record_tables()
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    year = years[digits[:, 6], digits[:, 4] * 10 + digits[:, 5]]
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    improbable &= (month >= 1) & (month <= 12) & (day >= 1)
+    improbable &= day <= month_lengths[leap.astype(np.int64), month % 13]
+
+    bits = record_bits(space)
+    if bits is None:
+        improbable &= digits @ np.array(MULTIPLICATION_TABLE) % 11 != 0
+    else:
+        month = np.where(improbable, month, 1)
+        day = np.where(improbable, day, 1)
+        ordinal = month_starts[year - FIRST_DAY.year, month] + day - 1
+        number = digits[:, 6:] @ np.array([1000, 100, 10, 1])
+        offset = (ordinal - space.first) * BYTES_PER_DAY + number // 8  # type: ignore
+        improbable &= (bits[offset] >> (number % 8) & 1).astype(bool)
+
+    report.counts[Status.IMPROBABLE] += int(improbable.sum())
+    for row in np.flatnonzero(~improbable).tolist():
+        line = block[row * width : (row + 1) * width - 1]
+        report.add(classify(line), first + row)
+    return len(records)
+
+
+def check(stream: BinaryIO, limit: int = 1000) -> CheckReport:
+    """Classify every line of the stream without parsing them into `Cpr`
+    objects. Blank lines are skipped.
+
+    The stream is read in large blocks. With NumPy installed, blocks where
+    all lines have the same form are classified as arrays of records.
+    """
+    report = CheckReport(limit)
+    dates: dict[bytes, tuple[Status | None, Any, int]] = {}
+    space = load()
+    first = 1
+    for block in read_blocks(stream):
+        count = None
+        if np is not None:
+            count = check_records(block, first, report, space)
+        if count is None:
+            count = check_lines(block, first, report, dates)
+        first += count
+    return report
@@ -1,23 +1,76 @@
+from datetime import date
+from enum import StrEnum
+from enum import auto
+from functools import cache
+from functools import total_ordering
+from typing import TYPE_CHECKING
+from typing import Any
 from typing import Self
 
 
+if TYPE_CHECKING:
+    from improbable_cpr.batch import ParsedCprs
+
+
+class Gender(StrEnum):
+    FEMALE = auto()
+    MALE = auto()
+
+    def __str__(self):
+        return self.value
+
+
+@cache
+def birth_date(year: int, month: int, day: int) -> date:
+    return date(year, month, day)
+
+
+@total_ordering
 class Cpr:
+    """A CPR number.
 
-    def __init__(self) -> None:
-        self.running_number: int | None = None
-        self.year: int | None = None
-        self.month: int | None = None
-        self.day: int | None = None
+    Instances are slotted and compare, hash and sort by their year, month,
+    day and running number, which orders by birth date and then running
+    number, with fields that are not set first. The hash follows the fields,
+    so a number must not be changed while it is in a set or a dict. The
+    derived properties are computed from the fields, with the dates shared
+    between all numbers of the same day.
+    """
+
+    __slots__ = ("running_number", "year", "month", "day")
+
+    def __init__(
+        self,
+        day: int | None = None,
+        month: int | None = None,
+        year: int | None = None,
+        running_number: int | None = None,
+    ) -> None:
+        self.running_number = running_number
+        self.year = year
+        self.month = month
+        self.day = day
 
     @classmethod
     def from_str(cls, cpr_str: str) -> Self:
+        """Parse a number written with or without the dash."""
+        cpr_str = cpr_str.replace("-", "")
         cpr = cls()
         cpr.day = int(cpr_str[0:2])
         cpr.month = int(cpr_str[2:4])
-        cpr.year = cls.calculate_year(int(cpr_str[7]), int(cpr_str[4:6]))
+        cpr.year = cls.calculate_year(int(cpr_str[6]), int(cpr_str[4:6]))
         cpr.running_number = int(cpr_str[6:10])
         return cpr
 
+    @classmethod
+    def parse_many(cls, buffer: Any, fmt: str = "dash") -> "ParsedCprs":
+        """Parse a buffer of fixed width records into arrays of days, months,
+        years and running numbers, with a mask of the records that are not
+        valid. See `batch.parse_records`."""
+        from improbable_cpr.batch import parse_records
+
+        return parse_records(buffer, fmt)
+
     @classmethod
     def calculate_year(cls, digit_7: int, two_digit_year: int) -> int:
         if digit_7 >= 0 and digit_7 <= 3:
@@ -52,6 +105,55 @@ class Cpr:
     def get_dash(self) -> str:
         return self.get_date() + "-" + self.get_running_number()
 
+    @property
+    def packed(self) -> int:
+        """The number as the single integer YYYYMMDDNNNN."""
+        date_key = (self.year * 100 + self.month) * 100 + self.day  # type: ignore
+        return date_key * 10000 + self.running_number  # type: ignore
+
+    @classmethod
+    def from_packed(cls, packed: int) -> Self:
+        date_key, running_number = divmod(packed, 10000)
+        year_month, day = divmod(date_key, 100)
+        year, month = divmod(year_month, 100)
+        return cls(day, month, year, running_number)
+
+    @property
+    def birth_date(self) -> date:
+        return birth_date(self.year, self.month, self.day)
+
+    @property
+    def gender(self) -> Gender:
+        if self.running_number % 2:  # type: ignore
+            return Gender.MALE
+        return Gender.FEMALE
+
+    @property
+    def century(self) -> int:
+        """The first year of the century of the birth date, e.g. 1900."""
+        return self.year // 100 * 100  # type: ignore
+
+    def age_on(self, day: date) -> int:
+        """The age in whole years on the given day."""
+        before_birthday = (day.month, day.day) < (self.month, self.day)
+        return day.year - self.year - before_birthday  # type: ignore
+
+    @property
+    def fields(self) -> tuple[int | None, int | None, int | None, int | None]:
+        """The year, month, day and running number."""
+        return self.year, self.month, self.day, self.running_number
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Cpr):
+            return NotImplemented
+        return self.fields == other.fields
+
+    def __lt__(self, other: "Cpr") -> bool:
+        return sort_key(self.fields) < sort_key(other.fields)
+
+    def __hash__(self) -> int:
+        return hash(self.fields)
+
     def __str__(self) -> str:
         return self.get_dash()
 
@@ -61,5 +163,9 @@ class Cpr:
         )
 
 
+def sort_key(fields: tuple[int | None, ...]) -> tuple[int, ...]:
+    return tuple(-1 if field is None else field for field in fields)
+
+
 class CprException(Exception):
     pass
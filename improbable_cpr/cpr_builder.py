@@ -1,15 +1,54 @@
+import itertools
+import random
 from datetime import date
+from enum import StrEnum
+from enum import auto
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import AsyncIterator
+from typing import BinaryIO
 from typing import Iterator
+from typing import Mapping
 from typing import Self
+from typing import Sequence
 
+from improbable_cpr import output
+from improbable_cpr import stats
 from improbable_cpr.cpr import Cpr
+from improbable_cpr.distribution import Distribution
+from improbable_cpr.distribution import DistributionGenerator
 from improbable_cpr.generators import CprGenerator
 from improbable_cpr.generators import Gender
+from improbable_cpr.generators import GenerationException
 from improbable_cpr.generators import Options
+from improbable_cpr.index import CprIndex
+from improbable_cpr.index import IndexStream
+from improbable_cpr.permutation import FeistelPermutation
+
+
+# The modules for processes, asyncio and NumPy take longer to import than
+# the rest of the package, so they are imported when first used.
+if TYPE_CHECKING:
+    from improbable_cpr.aio import AsyncCprStream
+    from improbable_cpr.batch import CprBatch
 
 
 today_func = date.today
 
+PARTITION_KEY = 0
+
+DEFAULT_WINDOW = 4
+
+
+class Order(StrEnum):
+    RANDOM = auto()
+    SHUFFLED = auto()
+    WINDOWED = auto()
+    SEQUENTIAL = auto()
+
+    def __str__(self):
+        return self.value
+
 
 class CprBuilder:
     def __init__(self):
@@ -18,6 +57,14 @@ class CprBuilder:
         self.custom_year = False
         self.custom_month = False
         self.custom_day = False
+        self.order = Order.RANDOM
+        self.key: int | None = None
+        self.seed: int | None = None
+        self.position = 0
+        self.stop: int | None = None
+        self.shard: tuple[int, int] | None = None
+        self.window = DEFAULT_WINDOW
+        self.distribution: Distribution | None = None
 
     def with_years(self, years: list[int]) -> Self:
         if not self.custom_year:
@@ -93,10 +140,291 @@ class CprBuilder:
                 raise e
         return self
 
+    def with_distribution(
+        self,
+        weights: Mapping[Any, float],
+        by: str = "age",
+        genders: Mapping[Gender, float] | None = None,
+    ) -> Self:
+        """Draw the numbers so every age, year or date range gets a share of
+        them proportional to its weight.
+
+        `by` is "age", with the ages taken on today's date, "year" or
+        "date", with inclusive `(start, end)` ranges of dates as keys. The
+        numbers of other dates are not drawn. `genders` optionally weights
+        the genders within every group. The numbers within a group and
+        gender are equally likely, and no number is drawn twice; once a
+        group runs out, the others keep their relative shares.
+        """
+        self.distribution = Distribution(
+            dict(weights),
+            by,
+            None if genders is None else dict(genders),
+            today_func(),
+        )
+        return self
+
+    def with_excluded_dates(self, start: date, end: date | None = None) -> Self:
+        """Leave out the dates from `start` to `end`, both included."""
+        self.options.excluded_dates.append(
+            (start, start if end is None else end)
+        )
+        return self
+
+    def with_allocated_days(self) -> Self:
+        """Also generate numbers for the days that are known to have numbers
+        failing the modulo 11 test allocated, which are left out by default."""
+        self.options.exclude_allocated = False
+        return self
+
+    def count(self) -> int:
+        return stats.count(self.options)
+
+    def histogram(self, by: str | Sequence[str] = "year") -> dict[Any, int]:
+        return stats.histogram(self.options, by)
+
+    def index(self) -> CprIndex:
+        return CprIndex(self.options)
+
+    def with_seed(self, seed: int) -> Self:
+        """Draw from a private random generator seeded with `seed`.
+
+        The same seed and options give the same numbers in the same order,
+        and the global `random` state is neither used nor changed.
+        """
+        self.seed = seed
+        return self
+
+    def rng(self) -> random.Random | None:
+        return None if self.seed is None else random.Random(self.seed)
+
+    def to_array(self, n: int | None = None) -> "CprBatch":
+        return CprGenerator(self.options, self.rng()).generate_batch(n)
+
+    def shuffled(self, key: int | None = None) -> Self:
+        """Generate the numbers through a keyed permutation of the index.
+
+        Every remaining number is equally likely at each step and memory use
+        does not grow with the number of numbers drawn. The same key gives
+        the same order, a random key is drawn when none is given.
+        """
+        self.order = Order.SHUFFLED
+        self.key = key
+        return self
+
+    def sequential(self) -> Self:
+        """Generate the numbers sorted by birth date and running number.
+
+        The numbers are read straight from the running number tables of
+        each date, without any shuffling, which makes this by far the
+        fastest order for writing out all the numbers of a spec.
+        """
+        self.order = Order.SEQUENTIAL
+        return self
+
+    def windowed(self, window: int = DEFAULT_WINDOW) -> Self:
+        """Generate all the numbers while holding at most `window` open
+        branches at every level of years, months, days and genders.
+
+        Memory use stays bounded however many years are selected, which
+        makes this the order for enumerating everything. The branches open
+        in a random order and the numbers of the open branches are drawn
+        at random, but unlike the random order not every remaining number
+        is equally likely at each step.
+        """
+        if window < 1:
+            raise ValueError(f"The window must be at least 1, not {window}")
+        self.order = Order.WINDOWED
+        self.window = window
+        return self
+
+    def partition(self, shard_index: int, shard_count: int) -> Self:
+        """Generate only shard `shard_index` of `shard_count` disjoint shards.
+
+        The shards are contiguous ranges of positions in the shuffled order,
+        differing in size by at most one, so every shard is a uniformly
+        shuffled share of the matching numbers. Shards made with the same
+        options, seed and key never overlap. Without a seed or key a fixed
+        key is used, so independent workers agree on the order without any
+        coordination.
+        """
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(
+                f"Shard {shard_index} is not between 0 and {shard_count - 1}"
+            )
+        self.order = Order.SHUFFLED
+        self.shard = (shard_index, shard_count)
+        return self
+
+    def shuffle_key(self) -> int:
+        """The key of the shuffled order, drawn on first use if not given."""
+        if self.key is None:
+            if self.shard is not None and self.seed is None:
+                self.key = PARTITION_KEY
+            else:
+                self.key = (self.rng() or random).getrandbits(64)
+        return self.key
+
+    def positions(self, size: int) -> tuple[int, int]:
+        """The range of positions of the shuffled order left to generate."""
+        start, stop = 0, size
+        if self.shard is not None:
+            from improbable_cpr import shards
+
+            start, stop = shards.shard_range(size, *self.shard)
+        if self.stop is not None:
+            stop = min(stop, self.stop)
+        return start + self.position, stop
+
+    def remaining(self, count: int | None) -> tuple[int, int]:
+        """The first position and number of numbers to generate in the
+        shuffled order, at most `count` if given."""
+        start, stop = self.positions(len(self.index()))
+        remaining = max(stop - start, 0)
+        return start, remaining if count is None else min(count, remaining)
+
+    def write_shards(
+        self,
+        directory: str,
+        workers: int,
+        count: int | None = None,
+        dash: bool = True,
+    ) -> list[str]:
+        """Generate the numbers in the shuffled order using `workers`
+        processes, writing one file per process to `directory`.
+
+        Raises ValueError if `workers` is less than 1.
+        """
+        from improbable_cpr import shards
+
+        start, count = self.remaining(count)
+        return shards.write_shards(
+            self.options,
+            self.shuffle_key(),
+            directory,
+            workers,
+            count,
+            dash,
+            start,
+        )
+
+    def write_sharded(
+        self,
+        output: BinaryIO,
+        workers: int,
+        count: int | None = None,
+        dash: bool = True,
+    ) -> None:
+        """Like `write_shards`, but merge the shards in order into `output`."""
+        from improbable_cpr import shards
+
+        start, count = self.remaining(count)
+        shards.write_merged(
+            self.options,
+            self.shuffle_key(),
+            output,
+            workers,
+            count,
+            dash,
+            start,
+        )
+
+    def export(
+        self,
+        path: str,
+        fmt: str = "dash",
+        count: int | None = None,
+        reference_date: date | None = None,
+    ) -> int:
+        """Write `count` numbers, or all of them, to the file at `path` in
+        one of `output.FORMATS` and return how many were written.
+
+        The csv and jsonl formats add the birth date, the age on
+        `reference_date` (today if not given), the gender and the century
+        digit. The npy and packed formats hold the packed numbers as
+        little-endian uint64, which can be memory-mapped.
+        """
+        cprs = itertools.islice(iter(self), count)
+        with open(path, "wb") as stream:
+            return output.write_cprs(
+                cprs,
+                stream,
+                fmt,
+                buffer_size=1 << 20,
+                reference_date=reference_date,
+            )
+
     def __iter__(self) -> Iterator[Cpr]:
-        return iter(CprGenerator(self.options))
+        if self.distribution is not None:
+            if self.order != Order.RANDOM:
+                raise GenerationException(
+                    f"A distribution is drawn in random order, not {self.order}"
+                )
+            return iter(
+                DistributionGenerator(
+                    self.options, self.distribution, self.rng()
+                )
+            )
+        if self.order == Order.SHUFFLED:
+            index = self.index()
+            permutation = FeistelPermutation(len(index), self.shuffle_key())
+            return IndexStream(index, permutation, *self.positions(len(index)))
+        if self.order == Order.SEQUENTIAL:
+            index = self.index()
+            return IndexStream(index, None, *self.positions(len(index)))
+        window = self.window if self.order == Order.WINDOWED else None
+        return iter(CprGenerator(self.options, self.rng(), window))
+
+    def __aiter__(self) -> "AsyncCprStream":
+        from improbable_cpr.aio import AsyncCprStream
+
+        return AsyncCprStream(self)
+
+    async def agenerate(
+        self, n: int | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[list[Cpr]]:
+        """Generate `n` numbers, or all of them, in batches of at most
+        `batch_size` without blocking the event loop."""
+        from improbable_cpr.aio import AsyncCprStream
+
+        stream = AsyncCprStream(self, batch_size, n)
+        try:
+            while batch := await stream.next_batch():
+                yield batch
+        finally:
+            await stream.aclose()
 
     def __next__(self) -> Cpr:
         if self.iterator is None:
             self.iterator = iter(self)
         return next(self.iterator)
+
+    def checkpoint(self) -> str:
+        """A token from which `resume` continues after the numbers drawn.
+
+        Only the shuffled and sequential orders can be resumed, the random
+        orders keep the numbers they have drawn in memory and cannot be
+        restored from a token.
+        """
+        if self.iterator is None:
+            self.iterator = iter(self)
+        if not isinstance(self.iterator, IndexStream):
+            raise GenerationException(
+                "Only the shuffled and sequential orders support checkpoints"
+            )
+        return self.iterator.checkpoint()
+
+    @classmethod
+    def resume(cls, token: str) -> Self:
+        """A builder continuing from a token made by `checkpoint`."""
+        stream = IndexStream.resume(token)
+        builder = cls()
+        builder.options = stream.index.options
+        if stream.permutation is None:
+            builder.order = Order.SEQUENTIAL
+        else:
+            builder.order = Order.SHUFFLED
+            builder.key = stream.permutation.key
+        builder.position = stream.position
+        builder.stop = stream.stop
+        return builder
@@ -0,0 +1,271 @@
+"""
+Drawing numbers whose ages, years or dates and genders follow given weights.
+
+Every matched date and gender is a cell of its group. The groups are drawn
+from an alias table so each group gets its share of the draws, and every
+group hands out the numbers of its cells in the order of its own Feistel
+permutation, so the numbers left within a group are equally likely and no
+number is drawn twice. Drawing a number takes constant time but for finding
+its cell, which bisects the cells of the group.
+"""
+
+import random
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from dataclasses import replace
+from datetime import date
+from itertools import accumulate
+from typing import Any
+from typing import Iterator
+from typing import Sequence
+
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.cpr import Gender
+from improbable_cpr.generators import Options
+from improbable_cpr.generators import date_residue
+from improbable_cpr.generators import improbable_running_numbers
+from improbable_cpr.generators import matching_dates
+from improbable_cpr.generators import seventh_digits
+from improbable_cpr.permutation import FeistelPermutation
+
+
+DIMENSIONS = ("age", "year", "date")
+
+
+class AliasTable:
+    """Walker's alias table: draws position `i` with probability
+    proportional to `weights[i]` in constant time."""
+
+    def __init__(self, weights: Sequence[float]) -> None:
+        size = len(weights)
+        total = sum(weights)
+        if size == 0 or total <= 0:
+            raise ValueError("The weights must have a positive sum")
+        scaled = [weight * size / total for weight in weights]
+        self.probabilities = [1.0] * size
+        self.aliases = list(range(size))
+        small = [i for i, weight in enumerate(scaled) if weight < 1]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def draw(self, rng: Any = random) -> int:
+        value = rng.random() * self.size
+        position = int(value)
+        if value - position < self.probabilities[position]:
+            return position
+        return self.aliases[position]
+
+
+def age_on(day: date, reference_date: date) -> int:
+    before_birthday = (reference_date.month, reference_date.day) < (
+        day.month,
+        day.day,
+    )
+    return reference_date.year - day.year - before_birthday
+
+
+def years_before(day: date, years: int) -> date:
+    year = max(day.year - years, 1)
+    try:
+        return day.replace(year=year)
+    except ValueError:
+        return date(year, 2, 28)
+
+
+@dataclass
+class Distribution:
+    """Weights of the groups of numbers to draw.
+
+    `weights` maps ages (on `reference_date`), years or inclusive
+    `(start, end)` date ranges, depending on `by`, to the share of the
+    numbers drawn from them. Dates outside the groups are not drawn.
+    `genders` optionally maps genders to their share within every group.
+
+    Raises ValueError for unknown dimensions, negative weights or date
+    ranges that overlap.
+    """
+
+    weights: dict[Any, float]
+    by: str = "age"
+    genders: dict[Gender, float] | None = None
+    reference_date: date | None = None
+
+    def __post_init__(self) -> None:
+        if self.by not in DIMENSIONS:
+            raise ValueError(
+                f"Unknown dimension {self.by!r}, expected one of"
+                f" {', '.join(DIMENSIONS)}"
+            )
+        weights = [*self.weights.values(), *(self.genders or {}).values()]
+        if any(weight < 0 for weight in weights):
+            raise ValueError("The weights must not be negative")
+        if self.by == "date":
+            ranges = sorted(self.weights)
+            for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                if start <= end:
+                    raise ValueError(f"The date range from {start} overlaps")
+            self.ranges = ranges
+        if self.reference_date is None:
+            self.reference_date = date.today()
+
+    def date_range(self) -> tuple[date, date]:
+        """Dates from before the first to after the last date of the groups
+        with a weight."""
+        keys = [key for key, weight in self.weights.items() if weight > 0]
+        if not keys:
+            raise ValueError("The weights must have a positive sum")
+        if self.by == "year":
+            return date(min(keys), 1, 1), date(max(keys), 12, 31)
+        if self.by == "date":
+            return min(start for start, _ in keys), max(end for _, end in keys)
+        reference_date = self.reference_date
+        first = years_before(reference_date, max(keys) + 1)  # type: ignore
+        return first, years_before(reference_date, min(keys))  # type: ignore
+
+    def group(self, day: date) -> Any:
+        """The key of the group of the date in `weights`, if any."""
+        if self.by == "year":
+            return day.year
+        if self.by == "age":
+            return age_on(day, self.reference_date)  # type: ignore
+        for start, end in self.ranges:
+            if start <= day <= end:
+                return (start, end)
+        return None
+
+    def gender_weight(self, gender: Gender) -> float:
+        if self.genders is None:
+            return 1.0
+        return self.genders.get(gender, 0.0)
+
+
+class DistributionGenerator:
+    """Draws every number matching the options at most once, with each
+    group of the distribution getting its share of the draws until its
+    numbers run out."""
+
+    def __init__(
+        self,
+        options: Options,
+        distribution: Distribution,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.options = options
+        self.distribution = distribution
+        self.rng = rng
+
+    def cells(
+        self,
+    ) -> tuple[list[date], list[Gender], list[int], list[int], list[float]]:
+        """The dates, genders, sizes and groups of the non-empty cells, and
+        the weight of every group. With gender weights, the genders of a
+        group of the distribution are groups of their own."""
+        distribution = self.distribution
+        options = self.options
+        first, last = distribution.date_range()
+        if options.min_date is not None:
+            first = max(first, options.min_date)
+        if options.max_date is not None:
+            last = min(last, options.max_date)
+        genders = [
+            gender
+            for gender in dict.fromkeys(options.genders)
+            if distribution.gender_weight(gender) > 0
+        ]
+        by_gender = distribution.genders is not None
+
+        days: list[date] = []
+        cell_genders: list[Gender] = []
+        sizes: list[int] = []
+        cell_groups: list[int] = []
+        groups: dict[tuple[Any, Gender | None], int] = {}
+        group_weights: list[float] = []
+        limited = replace(options, min_date=first, max_date=last)
+        for day in matching_dates(limited):
+            group = distribution.group(day)
+            weight = distribution.weights.get(group, 0)
+            if not weight:
+                continue
+            digits = seventh_digits(day.year)
+            residue = date_residue(day.day, day.month, day.year)
+            for gender in genders:
+                size = len(improbable_running_numbers(digits, gender, residue))
+                if not size:
+                    continue
+                key = (group, gender if by_gender else None)
+                if key not in groups:
+                    groups[key] = len(group_weights)
+                    group_weights.append(
+                        weight * distribution.gender_weight(gender)
+                    )
+                days.append(day)
+                cell_genders.append(gender)
+                sizes.append(size)
+                cell_groups.append(groups[key])
+        return days, cell_genders, sizes, cell_groups, group_weights
+
+    def __iter__(self) -> Iterator[Cpr]:
+        # A group is drawn from an alias table over the weights of the
+        # groups with numbers left, and the group hands out its numbers in
+        # the order of one permutation of all of them, so every number left
+        # in a group is equally likely. The position of a number in its
+        # group is mapped to its cell by bisecting the starts of the cells.
+        # The table is rebuilt when a group runs out.
+        rng = self.rng or random
+        days, genders, sizes, cell_groups, group_weights = self.cells()
+        members: list[list[int]] = [[] for _ in group_weights]
+        for cell, group in enumerate(cell_groups):
+            members[group].append(cell)
+        starts = [
+            list(accumulate((sizes[cell] for cell in cells), initial=0))
+            for cells in members
+        ]
+        permutations: list[FeistelPermutation | None] = [None] * len(members)
+        drawn = [0] * len(members)
+        # The running numbers of the cells drawn from so far.
+        tables: dict[int, array] = {}
+        live = list(range(len(group_weights)))
+        while live:
+            table = AliasTable([group_weights[group] for group in live])
+            while True:
+                group = live[table.draw(rng)]
+                group_starts = starts[group]
+                size = group_starts[-1]
+                permutation = permutations[group]
+                if permutation is None:
+                    permutation = FeistelPermutation(size, rng.getrandbits(64))
+                    permutations[group] = permutation
+                position = drawn[group]
+                drawn[group] = position + 1
+                index = permutation[position]
+                member = bisect_right(group_starts, index) - 1
+                cell = members[group][member]
+                day = days[cell]
+                numbers = tables.get(cell)
+                if numbers is None:
+                    numbers = tables[cell] = improbable_running_numbers(
+                        seventh_digits(day.year),
+                        genders[cell],
+                        date_residue(day.day, day.month, day.year),
+                    )
+                yield Cpr(
+                    day.day,
+                    day.month,
+                    day.year,
+                    numbers[index - group_starts[member]],
+                )
+                if position + 1 == size:
+                    permutations[group] = None
+                    break
+            live = [group for group in live if drawn[group] < starts[group][-1]]
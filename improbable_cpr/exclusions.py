@@ -0,0 +1,97 @@
+from array import array
+from bisect import bisect_right
+from datetime import date
+from functools import cache
+from typing import Iterable
+from typing import Iterator
+
+
+# Birth dates for which numbers that do not satisfy the modulo 11 test have
+# been allocated, as published by the CPR office. The list is partial: it
+# holds 17 of the 26 published days, and the other 9 are still generated
+# until they are added here. Bump the version whenever the list changes,
+# since it changes which numbers are generated.
+ALLOCATED_DAYS_VERSION = 1
+ALLOCATED_DAYS = tuple(
+    date(year, 1, 1)
+    for year in (
+        1960,
+        1964,
+        1965,
+        1966,
+        1969,
+        1970,
+        1980,
+        1982,
+        1984,
+        1985,
+        1986,
+        1987,
+        1988,
+        1989,
+        1990,
+        1991,
+        1992,
+    )
+)
+
+
+class DateSet:
+    """Set of dates stored as sorted, disjoint intervals of day ordinals.
+
+    Membership and the excluded days of a month are found by bisecting the
+    interval starts, so the size of the set only depends on the number of
+    intervals and not on how many days they cover.
+    """
+
+    def __init__(self, ranges: Iterable[tuple[date, date]] = ()) -> None:
+        self.starts = array("l")
+        self.stops = array("l")
+        intervals = sorted(
+            (start.toordinal(), end.toordinal() + 1)
+            for start, end in ranges
+            if start <= end
+        )
+        for start, stop in intervals:
+            if self.stops and start <= self.stops[-1]:
+                self.stops[-1] = max(self.stops[-1], stop)
+            else:
+                self.starts.append(start)
+                self.stops.append(stop)
+
+    def __contains__(self, day: date) -> bool:
+        ordinal = day.toordinal()
+        interval = bisect_right(self.starts, ordinal) - 1
+        return interval >= 0 and ordinal < self.stops[interval]
+
+    def __len__(self) -> int:
+        return sum(stop - start for start, stop in zip(self.starts, self.stops))
+
+    def __iter__(self) -> Iterator[tuple[date, date]]:
+        """The intervals as inclusive ranges of dates."""
+        for start, stop in zip(self.starts, self.stops):
+            yield date.fromordinal(start), date.fromordinal(stop - 1)
+
+    def days_in_range(self, first: date, last: date) -> Iterator[date]:
+        """The dates of the set from `first` to `last`, both included."""
+        first_ordinal = first.toordinal()
+        last_ordinal = last.toordinal()
+        interval = max(bisect_right(self.starts, first_ordinal) - 1, 0)
+        while (
+            interval < len(self.starts)
+            and self.starts[interval] <= last_ordinal
+        ):
+            start = max(self.starts[interval], first_ordinal)
+            stop = min(self.stops[interval], last_ordinal + 1)
+            for ordinal in range(start, stop):
+                yield date.fromordinal(ordinal)
+            interval += 1
+
+
+@cache
+def exclusion_set(
+    exclude_allocated: bool, ranges: tuple[tuple[date, date], ...]
+) -> DateSet:
+    if exclude_allocated:
+        ranges += tuple((day, day) for day in ALLOCATED_DAYS)
+    return DateSet(ranges)
@@ -0,0 +1,71 @@
+from typing import Iterable
+
+
+class FenwickTree:
+    """Binary indexed tree over non-negative integer weights.
+
+    Changing a weight and finding the position holding a given cumulative
+    weight both take O(log n) steps, so drawing positions with probability
+    proportional to their weights stays cheap while the weights change.
+    """
+
+    def __init__(self, weights: Iterable[int]) -> None:
+        tree = [0, *weights]
+        size = len(tree) - 1
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+        self.tree = tree
+        self.size = size
+        self.total = sum(tree[index] for index in self.roots())
+        self.step = 1 << (size.bit_length() - 1) if size else 0
+
+    def roots(self) -> Iterable[int]:
+        index = self.size
+        while index > 0:
+            yield index
+            index -= index & -index
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, position: int, delta: int) -> None:
+        """Add `delta` to the weight at `position`."""
+        tree = self.tree
+        size = self.size
+        index = position + 1
+        while index <= size:
+            tree[index] += delta
+            index += index & -index
+        self.total += delta
+
+    def prefix_sum(self, position: int) -> int:
+        """The sum of the weights before `position`."""
+        total = 0
+        index = position
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def weight(self, position: int) -> int:
+        return self.prefix_sum(position + 1) - self.prefix_sum(position)
+
+    def find(self, target: int) -> int:
+        """The position whose weights cover `target`, that is the position
+        `p` with `prefix_sum(p) <= target < prefix_sum(p + 1)`.
+
+        `target` must be at least 0 and below `total`.
+        """
+        tree = self.tree
+        size = self.size
+        position = 0
+        step = self.step
+        while step:
+            index = position + step
+            if index <= size and tree[index] <= target:
+                position = index
+                target -= tree[index]
+            step >>= 1
+        return position
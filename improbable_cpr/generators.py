@@ -1,25 +1,39 @@
 import abc
 import calendar
+import itertools
 import random
+from array import array
 from dataclasses import dataclass
 from dataclasses import field
 from datetime import date
-from enum import StrEnum
-from enum import auto
+from functools import cache
 from operator import mul
+from typing import TYPE_CHECKING
 from typing import Any
 from typing import Generator
+from typing import Iterable
 from typing import Iterator
+from typing import Self
 
+from improbable_cpr import instrumentation
 from improbable_cpr.cpr import Cpr
+from improbable_cpr.cpr import Gender
+from improbable_cpr.exclusions import DateSet
+from improbable_cpr.exclusions import exclusion_set
+from improbable_cpr.fenwick import FenwickTree
+from improbable_cpr.instrumentation import Instrumentation
+from improbable_cpr.tables import FEMALE_YEAR_COUNTS
+from improbable_cpr.tables import FIRST_YEAR
+from improbable_cpr.tables import LAST_YEAR
+from improbable_cpr.tables import MALE_YEAR_COUNTS
 
 
-class Gender(StrEnum):
-    FEMALE = auto()
-    MALE = auto()
+if TYPE_CHECKING:
+    from improbable_cpr.batch import CprBatch
 
-    def __str__(self):
-        return self.value
+
+MULTIPLICATION_TABLE = [4, 3, 2, 7, 6, 5, 4, 3, 2, 1]
+YEAR_COUNTS = {Gender.FEMALE: FEMALE_YEAR_COUNTS, Gender.MALE: MALE_YEAR_COUNTS}
 
 
 @dataclass
@@ -32,56 +46,286 @@ class Options:
     )
     min_date: date | None = None
     max_date: date | None = None
+    exclude_allocated: bool = True
+    excluded_dates: list[tuple[date, date]] = field(default_factory=list)
+
+    def exclusions(self) -> DateSet:
+        """The dates to leave out: the inclusive ranges of `excluded_dates`
+        and, unless disabled, the days known to have allocated numbers."""
+        return exclusion_set(
+            self.exclude_allocated, tuple(map(tuple, self.excluded_dates))
+        )
 
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "years": self.years,
+            "months": self.months,
+            "days": self.days,
+            "genders": [str(gender) for gender in self.genders],
+            "min_date": None if self.min_date is None else str(self.min_date),
+            "max_date": None if self.max_date is None else str(self.max_date),
+            "exclude_allocated": self.exclude_allocated,
+            "excluded_dates": [
+                [str(start), str(end)] for start, end in self.excluded_dates
+            ],
+        }
 
-class RunningNumberGenerator:
-    def __init__(self, year: int, gender: Gender) -> None:
-        self.year = year
-        self.gender = gender
+    @classmethod
+    def from_dict(cls, values: dict[str, Any]) -> Self:
+        min_date = values.get("min_date")
+        max_date = values.get("max_date")
+        return cls(
+            years=list(values["years"]),
+            months=list(values["months"]),
+            days=None if values.get("days") is None else list(values["days"]),
+            genders=[Gender(gender) for gender in values["genders"]],
+            min_date=None if min_date is None else date.fromisoformat(min_date),
+            max_date=None if max_date is None else date.fromisoformat(max_date),
+            exclude_allocated=values.get("exclude_allocated", True),
+            excluded_dates=[
+                (date.fromisoformat(start), date.fromisoformat(end))
+                for start, end in values.get("excluded_dates", [])
+            ],
+        )
 
-    def _validate_7_digit(self, running_number: int) -> bool:
-        if running_number >= 1000:
-            digit_7 = running_number // 1000
-        else:
-            digit_7 = 0
 
-        if digit_7 >= 0 and digit_7 <= 3:
-            return self.year >= 1900 and self.year <= 1999
-        elif digit_7 == 4 or digit_7 == 9:
-            return (self.year >= 1937 and self.year <= 1999) or (
-                self.year >= 2000 and self.year <= 2036
-            )
-        elif digit_7 >= 5 and digit_7 <= 8:
-            return (self.year >= 2000 and self.year <= 2057) or (
-                self.year >= 1858 and self.year <= 1899
-            )
-        else:
-            raise GenerationException(
-                f"The digit {digit_7} is not between 0 and 9"
+def valid_7_digit(digit_7: int, year: int) -> bool:
+    if digit_7 >= 0 and digit_7 <= 3:
+        return year >= 1900 and year <= 1999
+    elif digit_7 == 4 or digit_7 == 9:
+        return (year >= 1937 and year <= 1999) or (
+            year >= 2000 and year <= 2036
+        )
+    elif digit_7 >= 5 and digit_7 <= 8:
+        return (year >= 2000 and year <= 2057) or (
+            year >= 1858 and year <= 1899
+        )
+    else:
+        raise GenerationException(f"The digit {digit_7} is not between 0 and 9")
+
+
+@cache
+def seventh_digits(year: int) -> tuple[int, ...]:
+    """The 7th digits that can be allocated to persons born in `year`.
+
+    Years only fall into a handful of distinct bands, so the returned tuple
+    doubles as the cache key for the running number tables.
+    """
+    return tuple(digit for digit in range(10) if valid_7_digit(digit, year))
+
+
+@cache
+def running_numbers(digits: tuple[int, ...], gender: Gender) -> array:
+    """Ascending table of the running numbers for a 7th digit band and gender.
+
+    The table is shared by every branch that needs it and must not be
+    modified.
+    """
+    first = 0 if gender == Gender.FEMALE else 1
+    return array(
+        "H",
+        (
+            number
+            for digit in digits
+            for number in range(digit * 1000 + first, (digit + 1) * 1000, 2)
+        ),
+    )
+
+
+def date_residue(day: int, month: int, year: int) -> int:
+    """The date part of the modulus 11 weighted sum, reduced modulo 11.
+
+    Uses the first six weights of `MULTIPLICATION_TABLE`.
+    """
+    return (
+        4 * (day // 10)
+        + 3 * (day % 10)
+        + 2 * (month // 10)
+        + 7 * (month % 10)
+        + 6 * (year // 10 % 10)
+        + 5 * (year % 10)
+    ) % 11
+
+
+def running_number_residues() -> array:
+    """The weighted digit sum modulo 11 of every running number."""
+    # The residue of abcd is the residue of ab00 plus that of cd, so every
+    # block of 100 numbers is the block of 0-99 shifted by the residue of
+    # ab00, which `bytes.translate` applies to the whole block at once.
+    low = bytes(
+        (2 * (number // 10) + number % 10) % 11 for number in range(100)
+    )
+    shifted = [
+        bytes((residue + shift) % 11 for residue in range(256))
+        for shift in range(11)
+    ]
+    return array(
+        "B",
+        b"".join(
+            low.translate(shifted[(4 * (high // 10) + 3 * (high % 10)) % 11])
+            for high in range(100)
+        ),
+    )
+
+
+RUNNING_NUMBER_RESIDUES = running_number_residues()
+
+
+@cache
+def improbable_running_numbers(
+    digits: tuple[int, ...], gender: Gender, date_residue: int
+) -> array:
+    """The running numbers that fail the modulus 11 test for a date residue.
+
+    Like `running_numbers` the table is shared and must not be modified.
+    """
+    excluded = -date_residue % 11
+    return array(
+        "H",
+        (
+            number
+            for number in running_numbers(digits, gender)
+            if RUNNING_NUMBER_RESIDUES[number] != excluded
+        ),
+    )
+
+
+@cache
+def improbable_counts(
+    digits: tuple[int, ...], gender: Gender
+) -> tuple[int, ...]:
+    """The number of improbable running numbers for each date residue."""
+    table = running_numbers(digits, gender)
+    residues = [0] * 11
+    for number in table:
+        residues[RUNNING_NUMBER_RESIDUES[number]] += 1
+    return tuple(len(table) - residues[-residue % 11] for residue in range(11))
+
+
+@cache
+def residue_counts(
+    digits: tuple[int, ...], genders: tuple[Gender, ...]
+) -> tuple[int, ...]:
+    """The number of improbable running numbers of all the genders for each
+    date residue."""
+    counts = [improbable_counts(digits, gender) for gender in genders]
+    return tuple(map(sum, zip(*counts))) if counts else (0,) * 11
+
+
+@cache
+def residue_histogram(base: int, days: tuple[int, ...]) -> tuple[int, ...]:
+    """How many of the days have each date residue, given the residue of the
+    month and year."""
+    residues = [0] * 11
+    for day in days:
+        residues[(base + date_residue(day, 0, 0)) % 11] += 1
+    return tuple(residues)
+
+
+def year_count(
+    year: int, genders: tuple[Gender, ...], exclusions: DateSet
+) -> int:
+    """The number of improbable running numbers of the genders in the whole
+    year, less those of the excluded days."""
+    count = sum(YEAR_COUNTS[gender][year - FIRST_YEAR] for gender in genders)
+    excluded = list(
+        exclusions.days_in_range(date(year, 1, 1), date(year, 12, 31))
+    )
+    if excluded:
+        counts = residue_counts(seventh_digits(year), genders)
+        count -= sum(
+            counts[date_residue(day.day, day.month, day.year)]
+            for day in excluded
+        )
+    return count
+
+
+def day_running_numbers(day: date, genders: Iterable[Gender]) -> array:
+    """Ascending table of the improbable running numbers of a single date."""
+    return _day_running_numbers(
+        seventh_digits(day.year),
+        tuple(sorted(set(genders))),
+        date_residue(day.day, day.month, day.year),
+    )
+
+
+@cache
+def _day_running_numbers(
+    digits: tuple[int, ...], genders: tuple[Gender, ...], date_residue: int
+) -> array:
+    return array(
+        "H",
+        sorted(
+            itertools.chain.from_iterable(
+                improbable_running_numbers(digits, gender, date_residue)
+                for gender in genders
             )
+        ),
+    )
 
-    def _validate_gender(self, number: int) -> bool:
-        if self.gender == Gender.FEMALE:
-            return number % 2 == 0
-        else:
-            return not number % 2 == 0
+
+class RunningNumberGenerator:
+    def __init__(
+        self,
+        year: int,
+        gender: Gender,
+        date_residue: int | None = None,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.year = year
+        self.gender = gender
+        self.date_residue = date_residue
+        self.rng = rng
+
+    def get_table(self) -> array:
+        digits = seventh_digits(self.year)
+        if self.date_residue is None:
+            return running_numbers(digits, self.gender)
+        return improbable_running_numbers(
+            digits, self.gender, self.date_residue
+        )
 
     def __iter__(self):
-        runningNumbers = [
-            i
-            for i in range(10000)
-            if self._validate_gender(i) and self._validate_7_digit(i)
-        ]
-        random.shuffle(runningNumbers)
-        for number in runningNumbers:
-            cpr = Cpr()
-            cpr.running_number = number
-            yield cpr
+        stats = instrumentation.current
+        if stats is None:
+            runningNumbers = array("H", self.get_table())
+        else:
+            with stats.stage("tables"):
+                table = self.get_table()
+            with stats.stage("shuffle"):
+                runningNumbers = array("H", table)
+            self.count_candidates(stats, len(table))
+        # Shuffled one position per number drawn, so a branch that only
+        # gives a few numbers does not pay for shuffling all of them.
+        randrange = (self.rng or random).randrange
+        for last in range(len(runningNumbers) - 1, -1, -1):
+            position = randrange(last + 1)
+            number = runningNumbers[position]
+            runningNumbers[position] = runningNumbers[last]
+            yield Cpr(running_number=number)
+
+    def count_candidates(self, stats: Instrumentation, kept: int) -> None:
+        """Count the candidate running numbers of the branch and how many
+        each filter rejects, from the sizes of the tables."""
+        digits = seventh_digits(self.year)
+        band = 1000 * len(digits)
+        gender = len(running_numbers(digits, self.gender))
+        stats.count("candidates", 10000)
+        stats.count("rejected.seventh_digit", 10000 - band)
+        stats.count("rejected.gender", band - gender)
+        stats.count("rejected.mod11", gender - kept)
 
 
 class AbstractGenerator(abc.ABC):
-    def __init__(self, choises: list[Any]) -> None:
+    def __init__(
+        self,
+        choises: list[Any],
+        rng: random.Random | None = None,
+        window: int | None = None,
+    ) -> None:
         self.choises = choises
+        self.rng = rng
+        self.window = window
 
     @abc.abstractmethod
     def getGenerator(self, choise: Any) -> Generator[Cpr, Any, None]:
@@ -91,42 +335,136 @@ class AbstractGenerator(abc.ABC):
     def enrich(self, cpr: Cpr, choise: Any) -> Cpr:
         raise NotImplementedError
 
-    def __iter__(self):
-        generators: dict[Gender, Generator[Cpr, Any, None]] = {}
-        choises = self.choises[:]
+    @abc.abstractmethod
+    def count(self, choise: Any) -> int:
+        """The exact number of numbers the branch of `choise` generates."""
+        raise NotImplementedError
 
-        while len(choises) > 0:
-            choise = random.choice(choises)
-            if not choise in generators:
-                generators[choise] = self.getGenerator(choise)
+    def total(self) -> int:
+        return sum(map(self.count, dict.fromkeys(self.choises)))
 
-            generator = generators[choise]
-            try:
-                yield self.enrich(next(generator), choise)
-            except StopIteration:
-                choises.remove(choise)
+    def __iter__(self):
+        # Every open branch is drawn with probability proportional to the
+        # numbers it has left. With every branch open, every remaining number
+        # has the same chance. With a window, only `window` branches are open
+        # at a time, and the next branch in a random order opens as soon as
+        # one is exhausted, which bounds the branches held in memory.
+        rng = self.rng or random
+        choises = list(dict.fromkeys(self.choises))
+        slots = len(choises)
+        if self.window is not None:
+            rng.shuffle(choises)
+            slots = min(slots, self.window)
+        pending = iter(choises)
+        branches: list[Any] = [None] * slots
+        remaining = [0] * slots
+        generators: list[Iterator[Cpr] | None] = [None] * slots
+        weights = FenwickTree(remaining)
+        randrange = rng.randrange
+        stats = instrumentation.current
+        level = type(self).__name__
+
+        def refill(slot: int) -> None:
+            for choise in pending:
+                count = self.count(choise)
+                if count > 0:
+                    branches[slot] = choise
+                    remaining[slot] = count
+                    weights.add(slot, count)
+                    return
+
+        for slot in range(slots):
+            refill(slot)
+
+        while weights.total > 0:
+            slot = weights.find(randrange(weights.total))
+            generator = generators[slot]
+            if generator is None:
+                generator = generators[slot] = self.getGenerator(branches[slot])
+                if stats is not None:
+                    stats.count(f"branches.{level}")
+
+            cpr = next(generator, None)
+            if cpr is None:
+                weights.add(slot, -remaining[slot])
+                remaining[slot] = 0
+            else:
+                cpr = self.enrich(cpr, branches[slot])
+                weights.add(slot, -1)
+                remaining[slot] -= 1
+            if remaining[slot] == 0:
+                generators[slot] = branches[slot] = None
+                refill(slot)
+            if cpr is not None:
+                yield cpr
 
 
 class GenderGenerator(AbstractGenerator):
-    def __init__(self, year: int, genders: list[Gender]) -> None:
-        super().__init__(genders)
+    def __init__(
+        self,
+        year: int,
+        genders: list[Gender],
+        date_residue: int | None = None,
+        rng: random.Random | None = None,
+        window: int | None = None,
+    ) -> None:
+        super().__init__(genders, rng, window)
         self.year = year
+        self.date_residue = date_residue
 
     def getGenerator(self, gender: Gender) -> Generator[Cpr, Any, None]:
-        return iter(RunningNumberGenerator(self.year, gender))
+        return iter(
+            RunningNumberGenerator(
+                self.year, gender, self.date_residue, self.rng
+            )
+        )
+
+    def count(self, gender: Gender) -> int:
+        digits = seventh_digits(self.year)
+        if self.date_residue is None:
+            return len(running_numbers(digits, gender))
+        return improbable_counts(digits, gender)[self.date_residue]
 
     def enrich(self, cpr: Cpr, choise: Any) -> Cpr:
         return cpr
 
 
 class DayGenerator(AbstractGenerator):
-    def __init__(self, days: list[int], year: int, options: Options) -> None:
-        super().__init__(days)
+    def __init__(
+        self,
+        days: list[int],
+        year: int,
+        options: Options,
+        month: int | None = None,
+        rng: random.Random | None = None,
+        window: int | None = None,
+    ) -> None:
+        super().__init__(days, rng, window)
         self.year = year
         self.options = options
+        self.month = month
 
-    def getGenerator(self, choise: Any) -> Generator[Cpr, Any, None]:
-        return iter(GenderGenerator(self.year, self.options.genders))
+    def getGenerator(self, choise: int) -> Generator[Cpr, Any, None]:
+        residue = None
+        if self.month is not None:
+            residue = date_residue(choise, self.month, self.year)
+        return iter(
+            GenderGenerator(
+                self.year,
+                self.options.genders,
+                residue,
+                self.rng,
+                self.window,
+            )
+        )
+
+    def count(self, choise: int) -> int:
+        digits = seventh_digits(self.year)
+        genders = tuple(sorted(set(self.options.genders)))
+        if self.month is None:
+            return sum(len(running_numbers(digits, g)) for g in genders)
+        residue = date_residue(choise, self.month, self.year)
+        return residue_counts(digits, genders)[residue]
 
     def enrich(self, cpr: Cpr, choise: int) -> Cpr:
         cpr.day = choise
@@ -134,10 +472,17 @@ class DayGenerator(AbstractGenerator):
 
 
 class MonthGenerator(AbstractGenerator):
-    def __init__(self, year: int, options: Options) -> None:
-        super().__init__(self.get_months(year, options))
+    def __init__(
+        self,
+        year: int,
+        options: Options,
+        rng: random.Random | None = None,
+        window: int | None = None,
+    ) -> None:
+        super().__init__(self.get_months(year, options), rng, window)
         self.year = year
         self.options = options
+        self.exclusions = options.exclusions()
 
     def enrich(self, cpr: Cpr, choise: int) -> Cpr:
         cpr.month = choise
@@ -173,20 +518,54 @@ class MonthGenerator(AbstractGenerator):
             and self.is_limit_month(month, self.options.max_date)
             else calendar.monthrange(self.year, month)[1]
         )
-        return list(range(min_day, max_day + 1))
+        days = list(range(min_day, max_day + 1))
+        if days:
+            excluded = self.exclusions.days_in_range(
+                date(self.year, month, min_day), date(self.year, month, max_day)
+            )
+            for day in excluded:
+                days.remove(day.day)
+        return days
 
-    def getGenerator(self, choise: int) -> Generator[Cpr, Any, None]:
-        days = self.get_days(choise)
+    def get_matching_days(self, month: int) -> list[int]:
+        days = self.get_days(month)
         if self.options.days is not None:
-            days = list(set(days) & set(self.options.days))
+            days = sorted(set(days) & set(self.options.days))
+        return days
 
-        return iter(DayGenerator(days, self.year, self.options))
+    def getGenerator(self, choise: int) -> Generator[Cpr, Any, None]:
+        days = self.get_matching_days(choise)
+        return iter(
+            DayGenerator(
+                days, self.year, self.options, choise, self.rng, self.window
+            )
+        )
+
+    def count(self, choise: int) -> int:
+        days = self.get_matching_days(choise)
+        if not days:
+            return 0
+        counts = residue_counts(
+            seventh_digits(self.year), tuple(sorted(set(self.options.genders)))
+        )
+        residues = residue_histogram(
+            date_residue(0, choise, self.year), tuple(days)
+        )
+        return sum(map(mul, residues, counts))
 
 
 class YearGenerator(AbstractGenerator):
-    def __init__(self, options: Options) -> None:
+    def __init__(
+        self,
+        options: Options,
+        rng: random.Random | None = None,
+        window: int | None = None,
+    ) -> None:
         self.options = options
-        super().__init__(self.get_years(options))
+        self.genders = tuple(sorted(set(options.genders)))
+        self.exclusions = options.exclusions()
+        self.all_months = set(options.months) == set(range(1, 13))
+        super().__init__(self.get_years(options), rng, window)
 
     def get_years(self, options: Options) -> list[int]:
         min_filter = lambda x: True
@@ -207,35 +586,76 @@ class YearGenerator(AbstractGenerator):
         return cpr
 
     def getGenerator(self, choise: int) -> Generator[Cpr, Any, None]:
-        return iter(MonthGenerator(choise, self.options))
+        return iter(MonthGenerator(choise, self.options, self.rng, self.window))
 
+    def is_whole_year(self, year: int) -> bool:
+        options = self.options
+        return (
+            FIRST_YEAR <= year <= LAST_YEAR
+            and self.all_months
+            and options.days is None
+            and (options.min_date is None or options.min_date.year < year)
+            and (options.max_date is None or options.max_date.year > year)
+        )
 
-class CprGenerator:
-    MULTIPLICATION_TABLE = [4, 3, 2, 7, 6, 5, 4, 3, 2, 1]
+    def count(self, choise: int) -> int:
+        if self.is_whole_year(choise):
+            return year_count(choise, self.genders, self.exclusions)
+        return MonthGenerator(choise, self.options).total()
 
-    def __init__(self, options: Options) -> None:
+
+def matching_dates(options: Options) -> Iterator[date]:
+    """The dates matched by the options in calendar order."""
+    for year in sorted(set(YearGenerator(options).choises)):
+        month_generator = MonthGenerator(year, options)
+        for month in sorted(set(month_generator.choises)):
+            for day in month_generator.get_matching_days(month):
+                yield date(year, month, day)
+
+
+class CprGenerator:
+    MULTIPLICATION_TABLE = MULTIPLICATION_TABLE
+
+    def __init__(
+        self,
+        options: Options,
+        rng: random.Random | None = None,
+        window: int | None = None,
+    ) -> None:
         self.options = options
+        self.rng = rng
+        self.window = window
 
     @classmethod
     def validateControlDigit(cls, cpr: Cpr) -> bool:
+        residue = date_residue(cpr.day, cpr.month, cpr.year)  # type: ignore
         return (
-            sum(
-                map(
-                    mul,
-                    map(int, list(cpr.get_no_dash())),
-                    cls.MULTIPLICATION_TABLE,
-                )
-            )
-            % 11
-            == 0
-        )
+            residue + RUNNING_NUMBER_RESIDUES[cpr.running_number]  # type: ignore
+        ) % 11 == 0
 
     @classmethod
     def invalidControlDigit(cls, cpr: Cpr) -> bool:
         return not cls.validateControlDigit(cpr)
 
+    def generate_batch(self, n: int | None = None) -> "CprBatch":
+        """Generate up to `n` numbers, or all of them, as a `CprBatch`.
+
+        Uses the NumPy engine when NumPy is installed and otherwise collects
+        the numbers from the regular generators.
+        """
+        from improbable_cpr import batch
+
+        if batch.numpy_installed():
+            seed = None if self.rng is None else self.rng.getrandbits(64)
+            return batch.generate(self.options, n, seed)
+        return batch.CprBatch.from_cprs(itertools.islice(self, n))
+
     def __iter__(self) -> Iterator[Cpr]:
-        return filter(self.invalidControlDigit, YearGenerator(self.options))
+        # Numbers passing the modulus 11 test are already left out of the
+        # running number tables of each day.
+        with instrumentation.stage("setup"):
+            generator = YearGenerator(self.options, self.rng, self.window)
+        return iter(generator)
 
 
 class GenerationException(Exception):
@@ -0,0 +1,198 @@
+import base64
+import json
+import zlib
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from datetime import date
+from typing import Iterator
+from typing import Self
+from typing import overload
+
+from improbable_cpr import instrumentation
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import Options
+from improbable_cpr.generators import day_running_numbers
+from improbable_cpr.permutation import FeistelPermutation
+from improbable_cpr.stats import day_counts
+
+
+class CprIndex:
+    """Dense, bijective index over the numbers matching the options.
+
+    Position 0 is the lowest running number of the earliest date and the
+    positions increase by running number and then by date. Only the
+    cumulative count of every date with numbers is stored, the numbers
+    themselves are looked up in the shared running number tables.
+    """
+
+    def __init__(self, options: Options) -> None:
+        self.options = options
+        self.ordinals = array("l")
+        self.ends = array("q")
+        total = 0
+        with instrumentation.stage("index"):
+            for year, month, day, count in day_counts(options):
+                if count > 0:
+                    total += count
+                    self.ordinals.append(date(year, month, day).toordinal())
+                    self.ends.append(total)
+
+    def __len__(self) -> int:
+        return self.ends[-1] if self.ends else 0
+
+    def start_of(self, day_index: int) -> int:
+        return self.ends[day_index - 1] if day_index > 0 else 0
+
+    def day_of(self, position: int) -> int:
+        """The index of the date holding the number at `position`."""
+        return bisect_right(self.ends, position)
+
+    def unrank(self, position: int) -> Cpr:
+        if position < 0 or position >= len(self):
+            raise IndexError(f"Position {position} is out of range")
+        day_index = self.day_of(position)
+        day = date.fromordinal(self.ordinals[day_index])
+        table = day_running_numbers(day, self.options.genders)
+        return make_cpr(day, table[position - self.start_of(day_index)])
+
+    def rank(self, cpr: Cpr) -> int:
+        ordinal = date(cpr.year, cpr.month, cpr.day).toordinal()  # type: ignore
+        day_index = bisect_left(self.ordinals, ordinal)
+        if (
+            day_index < len(self.ordinals)
+            and self.ordinals[day_index] == ordinal
+        ):
+            table = day_running_numbers(
+                date.fromordinal(ordinal), self.options.genders
+            )
+            offset = bisect_left(table, cpr.running_number)
+            if offset < len(table) and table[offset] == cpr.running_number:
+                return self.start_of(day_index) + offset
+        raise ValueError(f"{cpr} does not match the options")
+
+    def __contains__(self, cpr: Cpr) -> bool:
+        try:
+            self.rank(cpr)
+        except ValueError:
+            return False
+        return True
+
+    def iter_range(self, start: int, stop: int) -> Iterator[Cpr]:
+        """The numbers at positions `start` up to `stop` in order.
+
+        Only the first position is looked up, the rest is a walk over the
+        tables of the following dates.
+        """
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        if start >= stop:
+            return
+        day_index = self.day_of(start)
+        offset = start - self.start_of(day_index)
+        position = start
+        while position < stop:
+            day = date.fromordinal(self.ordinals[day_index])
+            table = day_running_numbers(day, self.options.genders)
+            end = min(len(table), offset + stop - position)
+            day_of_month, month, year = day.day, day.month, day.year
+            for running_number in table[offset:end]:
+                yield Cpr(day_of_month, month, year, running_number)
+            position += end - offset
+            day_index += 1
+            offset = 0
+
+    def __iter__(self) -> Iterator[Cpr]:
+        return self.iter_range(0, len(self))
+
+    @overload
+    def __getitem__(self, key: int) -> Cpr:
+        ...
+
+    @overload
+    def __getitem__(self, key: slice) -> list[Cpr]:
+        ...
+
+    def __getitem__(self, key: int | slice) -> Cpr | list[Cpr]:
+        if isinstance(key, slice):
+            positions = range(len(self))[key]
+            if positions.step == 1:
+                return list(self.iter_range(positions.start, positions.stop))
+            return [self.unrank(position) for position in positions]
+        if key < 0:
+            key += len(self)
+        return self.unrank(key)
+
+
+def make_cpr(day: date, running_number: int) -> Cpr:
+    return Cpr(day.day, day.month, day.year, running_number)
+
+
+CHECKPOINT_VERSION = 1
+
+
+class IndexStream:
+    """Iterator over the numbers at a range of positions of an index.
+
+    With a permutation the positions are first mapped through it, so the
+    numbers come out in the permuted order. Without one the numbers come out
+    in index order, walking the running number tables day by day. The stream
+    only holds its current position, so drawing more numbers never uses more
+    memory.
+    """
+
+    def __init__(
+        self,
+        index: CprIndex,
+        permutation: FeistelPermutation | None = None,
+        start: int = 0,
+        stop: int | None = None,
+    ) -> None:
+        self.index = index
+        self.permutation = permutation
+        self.position = start
+        self.stop = len(index) if stop is None else min(stop, len(index))
+        self.walk: Iterator[Cpr] = iter(())
+        if permutation is None:
+            self.walk = index.iter_range(start, self.stop)
+
+    def __iter__(self) -> Iterator[Cpr]:
+        return self
+
+    def __next__(self) -> Cpr:
+        if self.position >= self.stop:
+            raise StopIteration
+        self.position += 1
+        if self.permutation is not None:
+            return self.index.unrank(self.permutation[self.position - 1])
+        return next(self.walk)
+
+    def checkpoint(self) -> str:
+        """A token from which `resume` continues after the numbers drawn."""
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "options": self.index.options.to_dict(),
+            "size": len(self.index),
+            "key": None if self.permutation is None else self.permutation.key,
+            "position": self.position,
+            "stop": self.stop,
+        }
+        data = json.dumps(state, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(zlib.compress(data)).decode("ascii")
+
+    @classmethod
+    def resume(cls, token: str) -> Self:
+        try:
+            state = json.loads(zlib.decompress(base64.urlsafe_b64decode(token)))
+        except (ValueError, zlib.error) as e:
+            raise ValueError("Not a valid checkpoint") from e
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError("The checkpoint was made by another version")
+
+        index = CprIndex(Options.from_dict(state["options"]))
+        if len(index) != state["size"]:
+            raise ValueError("The checkpoint does not match the current index")
+        permutation = None
+        if state["key"] is not None:
+            permutation = FeistelPermutation(len(index), state["key"])
+        return cls(index, permutation, state["position"], state["stop"])
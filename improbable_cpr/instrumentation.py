@@ -0,0 +1,136 @@
+"""
+Opt-in counters and stage timings for the generators and the CLI.
+
+Instrumentation is off unless enabled with `enabled()`. The generators only
+check `current` when they open a branch or set up, never per number, so
+leaving it off costs nothing measurable.
+"""
+
+import sys
+import time
+from collections import Counter
+from collections import defaultdict
+from contextlib import contextmanager
+from contextlib import nullcontext
+from datetime import timedelta
+from typing import Any
+from typing import ContextManager
+from typing import Iterable
+from typing import Iterator
+from typing import TextIO
+from typing import TypeVar
+
+
+T = TypeVar("T")
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.counters: Counter[str] = Counter()
+        self.seconds: defaultdict[str, float] = defaultdict(float)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Add the time spent in the block to the stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    def timed(self, items: Iterable[T], name: str, counter: str) -> Iterator[T]:
+        """Pass the items through, counting them in `counter` and adding the
+        time spent producing them to the stage `name`."""
+        perf_counter = time.perf_counter
+        iterator = iter(items)
+        count = 0
+        seconds = 0.0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += perf_counter() - start
+                count += 1
+                yield item
+        finally:
+            self.counters[counter] += count
+            self.seconds[name] += seconds
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "elapsed_seconds": time.perf_counter() - self.started,
+            "counters": dict(sorted(self.counters.items())),
+            "seconds": dict(sorted(self.seconds.items())),
+        }
+
+
+current: Instrumentation | None = None
+
+
+@contextmanager
+def enabled() -> Iterator[Instrumentation]:
+    """Collect counters and timings until the block exits."""
+    global current
+    previous = current
+    current = Instrumentation()
+    try:
+        yield current
+    finally:
+        current = previous
+
+
+def stage(name: str) -> ContextManager[None]:
+    """Time the block as stage `name` if instrumentation is enabled."""
+    if current is None:
+        return nullcontext()
+    return current.stage(name)
+
+
+class Progress:
+    """Reports the throughput and the time left to a text stream while the
+    numbers pass through `track`."""
+
+    def __init__(
+        self, total: int, stream: TextIO | None = None, interval: float = 0.5
+    ) -> None:
+        self.total = total
+        self.stream = sys.stderr if stream is None else stream
+        self.interval = interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self.reported = self.started
+
+    def track(self, items: Iterable[T]) -> Iterator[T]:
+        for item in items:
+            yield item
+            self.done += 1
+            if not self.done & 4095:
+                now = time.perf_counter()
+                if now - self.reported >= self.interval:
+                    self.reported = now
+                    self.report(now)
+
+    def report(self, now: float) -> None:
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        left = self.total - self.done
+        eta = timedelta(seconds=round(left / rate)) if rate > 0 else "?"
+        percent = 100 * self.done / self.total if self.total else 100.0
+        self.stream.write(
+            f"\r{self.done:,}/{self.total:,} ({percent:.1f}%)"
+            f"  {rate:,.0f} numbers/s  ETA {eta}  "
+        )
+        self.stream.flush()
+
+    def finish(self) -> None:
+        self.report(time.perf_counter())
+        self.stream.write("\n")
+        self.stream.flush()
@@ -1,17 +1,33 @@
 import argparse
 import itertools
-import re
+import json
+import os
+import sys
 from datetime import date
-from typing import Any
 from typing import Callable
+from typing import Iterable
+from typing import cast
 
+from improbable_cpr import bitmap
+from improbable_cpr import instrumentation
+from improbable_cpr.bitmap import FIRST_DAY
+from improbable_cpr.bitmap import LAST_DAY
+from improbable_cpr.bitmap import PATH_VARIABLE
+from improbable_cpr.cpr import Cpr
 from improbable_cpr.cpr_builder import CprBuilder
+from improbable_cpr.cpr_builder import Order
+from improbable_cpr.exclusions import ALLOCATED_DAYS_VERSION
 from improbable_cpr.generators import Gender
+from improbable_cpr.index import IndexStream
+from improbable_cpr.instrumentation import Instrumentation
+from improbable_cpr.instrumentation import Progress
+from improbable_cpr.output import FORMATS
+from improbable_cpr.output import write_cprs
+from improbable_cpr.parsing import list_parser
+from improbable_cpr.parsing import number_list_regex
 
 
-number_list_regex = r"(\d+)(,|$)|(\d+)-(\d+)"
-
-def main_cli() -> None:
+def make_argument_parser() -> argparse.ArgumentParser:
     argument_parser = argparse.ArgumentParser(
         description="Generate CPR numbers suitible for testing. A CPR number is the national identity number of Denmark. This program generates CPR numbers that are suitible for testing, as they do not satisfy the modulo 11 test. These numbers are only allocated as a last resort.",
     )
@@ -48,17 +64,153 @@ def main_cli() -> None:
         type=int,
         help="Generate CPR numbers for persons of a certain age",
     )
+    argument_parser.add_argument(
+        "--exclude",
+        type=date_range,
+        action="append",
+        default=[],
+        help="Do not generate CPR numbers for this date or inclusive range of dates, on the format YYYY-MM-DD or YYYY-MM-DD..YYYY-MM-DD. Can be given multiple times",
+    )
+    argument_parser.add_argument(
+        "--include-allocated",
+        action="store_true",
+        help=f"Also generate CPR numbers for the days that are known to have CPR numbers failing the modulo 11 test allocated (version {ALLOCATED_DAYS_VERSION} of the list). These days are left out by default",
+    )
     argument_parser.add_argument(
         "--count", "-n", type=int, help="The number of CPR numbers to generate"
     )
     argument_parser.add_argument(
         "--format",
         type=str,
-        choices=["dash", "no-dash"],
-        help="Dash format (default) prints the CPR numbers with a dash before the running number",
+        choices=FORMATS,
+        help="Dash format (default) prints the CPR numbers with a dash before the running number. The csv and jsonl formats add the birth date, the age, the gender and the century digit (the 7th digit) of every CPR number. The npy and packed formats write every CPR number as a little-endian unsigned 64-bit integer YYYYMMDDNNNN, as a NumPy array file or raw",
         default="dash",
     )
-    parsed_args = argument_parser.parse_args()
+    argument_parser.add_argument(
+        "--reference-date",
+        type=date.fromisoformat,
+        help="The date on which the ages of the csv and jsonl formats are computed (default: today)",
+    )
+    argument_parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        help="Write the CPR numbers to this file instead of standard output",
+    )
+    argument_parser.add_argument(
+        "--order",
+        type=Order,
+        choices=list(Order),
+        help="Random (default) picks a random year, month, day and gender for every number, weighted by the numbers each has left so every number is equally likely. Shuffled walks all matching numbers in a uniformly shuffled order using constant memory. Windowed walks all matching numbers holding only a few years, months and days open at a time, which bounds memory when enumerating everything. Sequential writes all matching numbers sorted by date and running number, much faster than the other orders",
+    )
+    argument_parser.add_argument(
+        "--shard",
+        type=shard_spec,
+        help="Only generate shard I of N, given as I/N with I counting from 0. Shards never share CPR numbers as long as they are given the same options and --seed, so independent test workers can each take a shard. Implies the shuffled order, and cannot be combined with another --order",
+    )
+    argument_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Generate the CPR numbers in this many processes, at least 1. Implies the shuffled order, and cannot be combined with another --order; the output only depends on the options and the shuffle key, not on the number of workers",
+    )
+    argument_parser.add_argument(
+        "--output-dir",
+        type=str,
+        help="With --workers, write the CPR numbers of each worker to its own file in this directory",
+    )
+    argument_parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed the random choices so the same options and seed always give the same CPR numbers in the same order",
+    )
+    argument_parser.add_argument(
+        "--checkpoint-file",
+        type=str,
+        help="Keep a checkpoint of how far the generation has come in this file. Pass it to --resume-from to continue after the last CPR number written. Only the shuffled and sequential orders support checkpoints, and the shuffled order is used unless --order is given",
+    )
+    argument_parser.add_argument(
+        "--resume-from",
+        type=str,
+        help="Continue the generation from a checkpoint token or a file holding one. The options and shuffle key are taken from the checkpoint",
+    )
+    argument_parser.add_argument(
+        "--stats",
+        type=str,
+        nargs="?",
+        const="year,gender",
+        help="Print how many CPR numbers match the options instead of generating them. Optionally grouped by a comma separated list of year, month, day and gender (default: year,gender). Use an empty string for just the total",
+    )
+    argument_parser.add_argument(
+        "--stats-out",
+        type=str,
+        help="Write counters of the candidates considered and rejected and the time spent in every stage of the generation to this file as JSON",
+    )
+    argument_parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Print the number of CPR numbers generated, the throughput and the estimated time left to standard error while generating",
+    )
+    subparsers = argument_parser.add_subparsers(dest="command")
+    check_parser = subparsers.add_parser(
+        "check",
+        help="Check that the CPR numbers in a file are improbable",
+        description="Check that every line of a file is a CPR number, in dash or no-dash format, with a real birth date, a 7th digit matching its century and a failing modulo 11 test. Prints the number of lines of every status and the line numbers of the lines that are not improbable. Exits with status 1 if there are any such lines.",
+    )
+    check_parser.add_argument(
+        "file", type=str, help="The file to check, or - for standard input"
+    )
+    check_parser.add_argument(
+        "--limit",
+        type=int,
+        default=1000,
+        help="The maximum number of line numbers to print for every status",
+    )
+    build_index_parser = subparsers.add_parser(
+        "build-index",
+        help="Build the bitmap of all improbable CPR numbers",
+        description=f"Build the file holding one bit for every running number of every date from {FIRST_DAY} to {LAST_DAY}, set for the improbable CPR numbers. When the file exists, checking numbers reads the bits instead of computing the modulo 11 test. The file takes about 90 MB",
+    )
+    build_index_parser.add_argument(
+        "--path",
+        type=str,
+        help=f"Where to write the file (default: ${PATH_VARIABLE} or the user's cache directory)",
+    )
+    build_index_parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check the checksum of an existing file instead of building it. Exits with status 1 if it is missing or damaged",
+    )
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Serve CPR numbers over HTTP",
+        description="Serve CPR numbers over HTTP, keeping the generator state and a pool of numbers in memory. GET /cpr?count=1000&year=1980-1990&gender=female returns the numbers as text, /cpr.json as a JSON array, and /metrics reports throughput and latency. The query parameters are named like the options of the command line. Every number is handed out at most once while the server runs",
+    )
+    serve_parser.add_argument(
+        "--host", type=str, default="127.0.0.1", help="The address to listen on"
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=8000, help="The port to listen on"
+    )
+    serve_parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=10000,
+        help="The number of CPR numbers to keep generated ahead for every distinct query",
+    )
+    serve_parser.add_argument(
+        "--max-pools",
+        type=int,
+        default=64,
+        help="The number of distinct queries to keep pools for. The least recently used pool is dropped when a new query needs one",
+    )
+    serve_parser.add_argument(
+        "--seed", type=int, help="Seed the shuffled order of every query"
+    )
+    return argument_parser
+
+
+def make_builder(parsed_args: argparse.Namespace) -> CprBuilder:
+    """A builder with the options, seed and order of the parsed arguments."""
     builder = CprBuilder()
 
     if parsed_args.year is not None:
@@ -86,28 +238,316 @@ def main_cli() -> None:
     if parsed_args.age is not None:
         builder.with_age(parsed_args.age)
 
+    for start, end in parsed_args.exclude:
+        builder.with_excluded_dates(start, end)
+
+    if parsed_args.include_allocated:
+        builder.with_allocated_days()
+
+    if parsed_args.seed is not None:
+        builder.with_seed(parsed_args.seed)
+
+    order = parsed_args.order
+    if order is None and (
+        parsed_args.workers is not None
+        or parsed_args.checkpoint_file is not None
+    ):
+        order = Order.SHUFFLED
+
+    if order == Order.SHUFFLED:
+        builder.shuffled()
+    elif order == Order.WINDOWED:
+        builder.windowed()
+    elif order == Order.SEQUENTIAL:
+        builder.sequential()
+
+    return builder
+
+
+def main_cli() -> None:
+    argument_parser = make_argument_parser()
+    parsed_args = argument_parser.parse_args()
+
+    if parsed_args.command == "serve":
+        from improbable_cpr.server import serve
+
+        serve(
+            parsed_args.host,
+            parsed_args.port,
+            parsed_args.pool_size,
+            parsed_args.seed,
+            max_pools=parsed_args.max_pools,
+        )
+        return
+
+    if parsed_args.command == "build-index":
+        if not build_index(parsed_args.path, parsed_args.verify):
+            sys.exit(1)
+        return
+
+    if parsed_args.command == "check":
+        if not check_file(parsed_args.file, parsed_args.limit):
+            sys.exit(1)
+        return
+
+    if parsed_args.workers is not None and parsed_args.workers < 1:
+        argument_parser.error("--workers must be at least 1")
+
+    if parsed_args.order not in (None, Order.SHUFFLED):
+        if parsed_args.workers is not None or parsed_args.shard is not None:
+            argument_parser.error(
+                f"--workers and --shard use the shuffled order, not --order {parsed_args.order}"
+            )
+
+    if parsed_args.checkpoint_file is not None:
+        if parsed_args.workers is not None:
+            argument_parser.error(
+                "--checkpoint-file does not support --workers"
+            )
+        resumable = (None, Order.SHUFFLED, Order.SEQUENTIAL)
+        if parsed_args.order not in resumable and not parsed_args.resume_from:
+            argument_parser.error(
+                f"--checkpoint-file supports --order shuffled or sequential, not --order {parsed_args.order}"
+            )
+
+    builder = make_builder(parsed_args)
+
+    if parsed_args.shard is not None:
+        try:
+            builder.partition(*parsed_args.shard)
+        except ValueError as e:
+            argument_parser.error(str(e))
+
+    if parsed_args.resume_from is not None:
+        try:
+            builder = CprBuilder.resume(read_token(parsed_args.resume_from))
+        except ValueError as e:
+            argument_parser.error(str(e))
+
+    if parsed_args.stats is not None:
+        try:
+            print_stats(builder, parsed_args.stats)
+        except ValueError as e:
+            argument_parser.error(str(e))
+        return
+
+    if parsed_args.workers is not None:
+        if parsed_args.stats_out is not None or parsed_args.progress:
+            argument_parser.error(
+                "--stats-out and --progress do not support --workers"
+            )
+        if parsed_args.format not in ("dash", "no-dash"):
+            argument_parser.error(
+                "--workers only supports the dash and no-dash formats"
+            )
+        write_sharded(
+            builder,
+            parsed_args.workers,
+            parsed_args.count,
+            parsed_args.format == "dash",
+            parsed_args.output,
+            parsed_args.output_dir,
+        )
+        return
+    elif parsed_args.output_dir is not None:
+        argument_parser.error("--output-dir requires --workers")
+
+    if parsed_args.stats_out is None:
+        generate(builder, parsed_args)
+        return
+
+    with instrumentation.enabled() as stats:
+        generate(builder, parsed_args, stats)
+    with open(parsed_args.stats_out, "w") as stats_file:
+        json.dump(stats.to_dict(), stats_file, indent=2)
+        stats_file.write("\n")
+
+
+def generate(
+    builder: CprBuilder,
+    parsed_args: argparse.Namespace,
+    stats: Instrumentation | None = None,
+) -> None:
     cpr_iter = iter(builder)
+    save_checkpoint = None
+    if parsed_args.checkpoint_file is not None:
+        save_checkpoint = checkpoint_saver(
+            cast(IndexStream, cpr_iter), parsed_args.checkpoint_file
+        )
 
     if parsed_args.count is not None:
         cpr_iter = itertools.islice(cpr_iter, parsed_args.count)
 
-    for cpr in cpr_iter:
-        if parsed_args.format == "dash":
-            print(cpr.get_dash())
-        else:
-            print(cpr.get_no_dash())
+    if stats is not None:
+        cpr_iter = stats.timed(cpr_iter, "generate", "numbers.emitted")
+
+    total = None
+    if parsed_args.progress or parsed_args.format == "npy":
+        total = expected_count(builder, parsed_args.count)
 
+    progress = None
+    if parsed_args.progress:
+        progress = Progress(cast(int, total))
+        cpr_iter = progress.track(cpr_iter)
 
-def list_parser(
-    argument: str,
-    single_func: Callable[[int], Any],
-    range_func: Callable[[int, int], Any],
+    if parsed_args.output is not None:
+        with open(parsed_args.output, "wb", buffering=0) as output:
+            write_cprs(
+                cpr_iter,
+                output,
+                parsed_args.format,
+                buffer_size=1 << 20,
+                on_drain=save_checkpoint,
+                reference_date=parsed_args.reference_date,
+                count=total,
+            )
+    else:
+        write_stdout(
+            cpr_iter,
+            parsed_args.format,
+            save_checkpoint,
+            parsed_args.reference_date,
+            total,
+        )
+
+    if save_checkpoint is not None:
+        save_checkpoint()
+
+    if progress is not None:
+        progress.finish()
+
+
+def expected_count(builder: CprBuilder, count: int | None) -> int:
+    """The exact number of CPR numbers the builder will generate."""
+    if builder.order in (Order.SHUFFLED, Order.SEQUENTIAL):
+        return builder.remaining(count)[1]
+    total = builder.count()
+    return total if count is None else min(count, total)
+
+
+def read_token(token_or_path: str) -> str:
+    if os.path.isfile(token_or_path):
+        with open(token_or_path) as token_file:
+            return token_file.read().strip()
+    return token_or_path
+
+
+def checkpoint_saver(stream: IndexStream, path: str) -> Callable[[], None]:
+    """Returns a function saving a checkpoint of the stream to `path`.
+
+    The checkpoint is written to a temporary file first and then moved in
+    place, so the file always holds a complete checkpoint.
+    """
+
+    def save() -> None:
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            checkpoint_file.write(stream.checkpoint() + "\n")
+        os.replace(temporary_path, path)
+
+    return save
+
+
+def write_sharded(
+    builder: CprBuilder,
+    workers: int,
+    count: int | None,
+    dash: bool,
+    output: str | None,
+    output_dir: str | None,
 ) -> None:
-    for match in re.finditer(number_list_regex, argument):
-        if match.group(1) is not None:
-            single_func(int(match.group(1)))
-        else:
-            range_func(int(match.group(3)), int(match.group(4)))
+    if output_dir is not None:
+        builder.write_shards(output_dir, workers, count, dash)
+    elif output is not None:
+        with open(output, "wb") as stream:
+            builder.write_sharded(stream, workers, count, dash)
+    else:
+        sys.stdout.flush()
+        builder.write_sharded(sys.stdout.buffer, workers, count, dash)
+        sys.stdout.buffer.flush()
+
+
+def write_stdout(
+    cprs: Iterable[Cpr],
+    fmt: str = "dash",
+    on_drain: Callable[[], None] | None = None,
+    reference_date: date | None = None,
+    count: int | None = None,
+) -> None:
+    sys.stdout.flush()
+    try:
+        write_cprs(
+            cprs,
+            sys.stdout.buffer,
+            fmt,
+            on_drain=on_drain,
+            reference_date=reference_date,
+            count=count,
+        )
+    except BrokenPipeError:
+        # The reader went away, e.g. when piping into head. Point stdout at
+        # devnull so the interpreter does not fail flushing it on exit.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+
+
+def build_index(path: str | None, verify: bool) -> bool:
+    path = bitmap.default_path() if path is None else path
+    if not verify:
+        bitmap.build(path)
+        print(f"Wrote {path}")
+        return True
+    try:
+        space = bitmap.SpaceBitmap(path)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return False
+    if not space.verify():
+        print(f"{path} does not match its checksum", file=sys.stderr)
+        return False
+    print(f"{path} is valid")
+    return True
+
+
+def check_file(path: str, limit: int) -> bool:
+    from improbable_cpr.check import Status
+    from improbable_cpr.check import check
+
+    if path == "-":
+        report = check(sys.stdin.buffer, limit)
+    else:
+        with open(path, "rb") as stream:
+            report = check(stream, limit)
+    for status in Status:
+        print(status, report.counts[status], sep="\t")
+    print("total", report.total, sep="\t")
+    lines = [
+        (line_number, status)
+        for status, line_numbers in report.lines.items()
+        for line_number in line_numbers
+    ]
+    for line_number, status in sorted(lines):
+        print(line_number, status, sep="\t")
+    return report.ok
+
+
+def print_stats(builder: CprBuilder, by: str) -> None:
+    dimensions = [dimension for dimension in by.split(",") if dimension]
+    if dimensions:
+        histogram = builder.histogram(dimensions)
+        for key in sorted(histogram):
+            print(*key, histogram[key], sep="\t")
+    print("total", builder.count(), sep="\t")
+
+
+def shard_spec(argument: str) -> tuple[int, int]:
+    shard_index, _, shard_count = argument.partition("/")
+    return int(shard_index), int(shard_count)
+
+
+def date_range(argument: str) -> tuple[date, date]:
+    start, _, end = argument.partition("..")
+    return date.fromisoformat(start), date.fromisoformat(end or start)
 
 
 if __name__ == "__main__":
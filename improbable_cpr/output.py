@@ -0,0 +1,354 @@
+import struct
+import sys
+from array import array
+from datetime import date
+from functools import cache
+from typing import BinaryIO
+from typing import Callable
+from typing import Iterable
+from typing import Protocol
+
+from improbable_cpr import instrumentation
+from improbable_cpr.cpr import Cpr
+
+
+FORMATS = ("dash", "no-dash", "csv", "jsonl", "npy", "packed")
+
+GENDER_NAMES = (b"female", b"male")
+NPY_HEADER_SIZE = 128
+
+
+class BinaryOutput(Protocol):
+    """What `CprWriter` needs of the stream it writes to."""
+
+    def write(self, data: bytes | bytearray, /) -> object: ...
+
+    def flush(self) -> object: ...
+
+
+# The tables of the parts of the records formatted from the running number
+# are built by the first writer needing them rather than on import.
+@cache
+def record_endings() -> list[bytes]:
+    return [b"%04d\n" % number for number in range(10000)]
+
+
+@cache
+def running_numbers() -> list[bytes]:
+    return [b"%04d" % number for number in range(10000)]
+
+
+@cache
+def csv_endings() -> list[bytes]:
+    return [
+        b"%s,%d\n" % (GENDER_NAMES[number % 2], number // 1000)
+        for number in range(10000)
+    ]
+
+
+@cache
+def jsonl_endings() -> list[bytes]:
+    return [
+        b'%s","century_digit":%d}\n'
+        % (GENDER_NAMES[number % 2], number // 1000)
+        for number in range(10000)
+    ]
+
+
+class CprWriter:
+    """Writes CPR numbers as fixed width byte records, one per line.
+
+    Records are formatted straight into a reusable buffer from cached date
+    prefixes and running number endings, and the buffer is written to the
+    binary stream whenever it holds `buffer_size` bytes. `on_drain` is called
+    after every write to the stream, when no written number is still pending.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryOutput,
+        dash: bool = True,
+        buffer_size: int = 1 << 16,
+        on_drain: Callable[[], None] | None = None,
+    ) -> None:
+        self.stream = stream
+        self.separator = b"-" if dash else b""
+        self.buffer_size = buffer_size
+        self.on_drain = on_drain
+        self.buffer = bytearray()
+        self.prefixes: dict[int, bytes] = {}
+        self.endings = self.make_endings()
+
+    def make_endings(self) -> list[bytes]:
+        """The end of the records of every running number."""
+        return record_endings()
+
+    def prefix(self, cpr: Cpr) -> bytes:
+        """The date part of the record, including the dash if any."""
+        day, month, year = cpr.day, cpr.month, cpr.year
+        key = (year * 100 + month) * 100 + day  # type: ignore
+        prefix = self.prefixes.get(key)
+        if prefix is None:
+            prefix = b"%02d%02d%02d" % (day, month, year % 100)  # type: ignore
+            prefix = self.prefixes[key] = prefix + self.separator
+        return prefix
+
+    def write(self, cpr: Cpr) -> None:
+        self.buffer += self.prefix(cpr)
+        self.buffer += self.endings[cpr.running_number]  # type: ignore
+        if len(self.buffer) >= self.buffer_size:
+            self.drain()
+
+    def write_all(self, cprs: Iterable[Cpr]) -> int:
+        """Write all the numbers and return how many there were."""
+        count = 0
+        buffer = self.buffer
+        prefix = self.prefix
+        endings = self.endings
+        for cpr in cprs:
+            buffer += prefix(cpr)
+            buffer += endings[cpr.running_number]  # type: ignore
+            count += 1
+            if len(buffer) >= self.buffer_size:
+                self.drain()
+        return count
+
+    def drain(self) -> None:
+        """Write the buffered records to the stream."""
+        if self.buffer:
+            with instrumentation.stage("write"):
+                self.stream.write(self.buffer)
+            self.buffer.clear()
+            if self.on_drain is not None:
+                self.on_drain()
+
+    def flush(self) -> None:
+        self.drain()
+        self.stream.flush()
+
+    def finish(self) -> None:
+        """Flush the records and complete the output."""
+        self.flush()
+
+
+class DerivedWriter(CprWriter):
+    """Writes records with columns derived from the birth date and the
+    running number.
+
+    Every record is assembled from a head and a middle part cached per date,
+    holding the date columns, and the running number and ending cached per
+    running number, holding the gender and century digit columns.
+    """
+
+    header = b""
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        dash: bool = True,
+        buffer_size: int = 1 << 16,
+        on_drain: Callable[[], None] | None = None,
+        reference_date: date | None = None,
+    ) -> None:
+        super().__init__(stream, dash, buffer_size, on_drain)
+        self.reference_date = reference_date or date.today()
+        self.days: dict[int, tuple[bytes, bytes]] = {}
+        self.buffer += self.header
+
+    def day_parts(self, cpr: Cpr) -> tuple[bytes, bytes]:
+        key = (cpr.year * 100 + cpr.month) * 100 + cpr.day  # type: ignore
+        parts = self.days.get(key)
+        if parts is None:
+            parts = self.days[key] = self.format_day(cpr)
+        return parts
+
+    def format_day(self, cpr: Cpr) -> tuple[bytes, bytes]:
+        """The parts of the records of the birth date before and after the
+        running number."""
+        raise NotImplementedError
+
+    def write(self, cpr: Cpr) -> None:
+        self.write_all((cpr,))
+
+    def write_all(self, cprs: Iterable[Cpr]) -> int:
+        count = 0
+        buffer = self.buffer
+        day_parts = self.day_parts
+        numbers = running_numbers()
+        endings = self.endings
+        for cpr in cprs:
+            head, middle = day_parts(cpr)
+            running_number = cpr.running_number
+            buffer += head
+            buffer += numbers[running_number]  # type: ignore
+            buffer += middle
+            buffer += endings[running_number]  # type: ignore
+            count += 1
+            if len(buffer) >= self.buffer_size:
+                self.drain()
+        return count
+
+
+class CsvWriter(DerivedWriter):
+    header = b"cpr,birth_date,age,gender,century_digit\n"
+
+    def make_endings(self) -> list[bytes]:
+        return csv_endings()
+
+    def format_day(self, cpr: Cpr) -> tuple[bytes, bytes]:
+        age = cpr.age_on(self.reference_date)
+        middle = b",%s,%d," % (cpr.birth_date.isoformat().encode(), age)
+        return self.prefix(cpr), middle
+
+
+class JsonLinesWriter(DerivedWriter):
+    def make_endings(self) -> list[bytes]:
+        return jsonl_endings()
+
+    def format_day(self, cpr: Cpr) -> tuple[bytes, bytes]:
+        age = cpr.age_on(self.reference_date)
+        head = b'{"cpr":"' + self.prefix(cpr)
+        middle = b'","birth_date":"%s","age":%d,"gender":"' % (
+            cpr.birth_date.isoformat().encode(),
+            age,
+        )
+        return head, middle
+
+
+class PackedWriter(CprWriter):
+    """Writes the numbers as little-endian unsigned 64-bit integers holding
+    the packed value YYYYMMDDNNNN, see `Cpr.packed`."""
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        buffer_size: int = 1 << 16,
+        on_drain: Callable[[], None] | None = None,
+    ) -> None:
+        super().__init__(stream, True, buffer_size, on_drain)
+        self.records = 0
+
+    def make_endings(self) -> list[bytes]:
+        return []
+
+    def write(self, cpr: Cpr) -> None:
+        self.write_all((cpr,))
+
+    def write_all(self, cprs: Iterable[Cpr]) -> int:
+        count = 0
+        values = array("Q")
+        limit = max(self.buffer_size // 8, 1)
+        for cpr in cprs:
+            date_key = (cpr.year * 100 + cpr.month) * 100 + cpr.day  # type: ignore
+            values.append(date_key * 10000 + cpr.running_number)  # type: ignore
+            if len(values) >= limit:
+                count += self.append(values)
+                values = array("Q")
+        return count + self.append(values)
+
+    def append(self, values: array) -> int:
+        if sys.byteorder == "big":
+            values.byteswap()
+        self.buffer += values
+        self.records += len(values)
+        if len(self.buffer) >= self.buffer_size:
+            self.drain()
+        return len(values)
+
+
+def npy_header(count: int) -> bytes:
+    """The header of a NPY file holding `count` packed numbers, padded to a
+    fixed size so it can be rewritten once the count is known."""
+    header = (
+        "{'descr': '<u8', 'fortran_order': False, 'shape': (%d,), }" % count
+    )
+    return (
+        b"\x93NUMPY\x01\x00"
+        + struct.pack("<H", NPY_HEADER_SIZE - 10)
+        + header.encode().ljust(NPY_HEADER_SIZE - 11)
+        + b"\n"
+    )
+
+
+class NpyWriter(PackedWriter):
+    """Writes the packed numbers as a one dimensional NPY array of uint64.
+
+    The header holds the number of records, so either `count` must be the
+    exact number of records written, or the stream must be seekable so the
+    header can be corrected when finishing.
+    """
+
+    stream: BinaryIO
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        count: int | None = None,
+        buffer_size: int = 1 << 16,
+        on_drain: Callable[[], None] | None = None,
+    ) -> None:
+        super().__init__(stream, buffer_size, on_drain)
+        self.count = 0 if count is None else count
+        self.buffer += npy_header(self.count)
+
+    def finish(self) -> None:
+        self.flush()
+        if self.records == self.count:
+            return
+        if not self.stream.seekable():
+            raise ValueError(
+                f"Wrote {self.records} numbers to a NPY output that is not "
+                f"seekable, but the header says {self.count}"
+            )
+        self.stream.seek(0)
+        self.stream.write(npy_header(self.records))
+        self.stream.seek(0, 2)
+        self.stream.flush()
+
+
+def make_writer(
+    stream: BinaryIO,
+    fmt: str = "dash",
+    buffer_size: int = 1 << 16,
+    on_drain: Callable[[], None] | None = None,
+    reference_date: date | None = None,
+    count: int | None = None,
+) -> CprWriter:
+    """A writer of the format, one of `FORMATS`.
+
+    The csv and jsonl formats compute the ages on `reference_date`, today
+    if not given. `count` is the expected number of records, which the npy
+    format needs up front when the stream is not seekable.
+    """
+    if fmt in ("dash", "no-dash"):
+        return CprWriter(stream, fmt == "dash", buffer_size, on_drain)
+    if fmt == "csv":
+        return CsvWriter(stream, True, buffer_size, on_drain, reference_date)
+    if fmt == "jsonl":
+        return JsonLinesWriter(
+            stream, True, buffer_size, on_drain, reference_date
+        )
+    if fmt == "packed":
+        return PackedWriter(stream, buffer_size, on_drain)
+    if fmt == "npy":
+        return NpyWriter(stream, count, buffer_size, on_drain)
+    raise ValueError(f"Unknown format {fmt}, expected one of {FORMATS}")
+
+
+def write_cprs(
+    cprs: Iterable[Cpr],
+    stream: BinaryIO,
+    fmt: str = "dash",
+    buffer_size: int = 1 << 16,
+    on_drain: Callable[[], None] | None = None,
+    reference_date: date | None = None,
+    count: int | None = None,
+) -> int:
+    """Write the numbers to the stream in the format and return how many
+    there were. See `make_writer` for the arguments."""
+    writer = make_writer(
+        stream, fmt, buffer_size, on_drain, reference_date, count
+    )
+    written = writer.write_all(cprs)
+    writer.finish()
+    return written
@@ -0,0 +1,25 @@
+import re
+from typing import Any
+from typing import Callable
+
+
+number_list_regex = r"(\d+)(,|$)|(\d+)-(\d+)"
+strict_number_list_regex = r"\d+(-\d+)?(,\d+(-\d+)?)*"
+
+
+def list_parser(
+    argument: str,
+    single_func: Callable[[int], Any],
+    range_func: Callable[[int, int], Any],
+) -> None:
+    for match in re.finditer(number_list_regex, argument):
+        if match.group(1) is not None:
+            single_func(int(match.group(1)))
+        else:
+            range_func(int(match.group(3)), int(match.group(4)))
+
+
+def is_number_list(argument: str) -> bool:
+    """Whether all of `argument` is a comma separated list of numbers and
+    ranges of numbers, such as `1990,1992-1995`."""
+    return re.fullmatch(strict_number_list_regex, argument) is not None
@@ -0,0 +1,53 @@
+import random
+from typing import Iterator
+
+
+MASK_64 = (1 << 64) - 1
+
+
+class FeistelPermutation:
+    """Keyed pseudo-random permutation of `range(size)` in constant memory.
+
+    A Feistel network permutes the integers below the smallest power of two
+    covering `size`. When the number of bits is odd the two halves differ by
+    one bit and trade widths every round. Values that land outside
+    `range(size)` are fed through the network again (cycle walking) until
+    they land inside, which keeps the mapping a bijection on `range(size)`.
+    """
+
+    def __init__(self, size: int, key: int, rounds: int = 6) -> None:
+        self.size = size
+        self.key = key
+        bits = max(2, (size - 1).bit_length())
+        self.right_bits = bits // 2
+        self.left_bits = bits - self.right_bits
+        key_stream = random.Random(key)
+        self.round_keys = [key_stream.getrandbits(64) for _ in range(rounds)]
+
+    def _encrypt(self, value: int) -> int:
+        left_bits = self.left_bits
+        right_bits = self.right_bits
+        left = value >> right_bits
+        right = value & ((1 << right_bits) - 1)
+        for round_key in self.round_keys:
+            mixed = (right ^ round_key) * 0x9E3779B97F4A7C15 & MASK_64
+            mixed ^= mixed >> 29
+            mixed = mixed * 0xBF58476D1CE4E5B9 & MASK_64
+            mixed ^= mixed >> 32
+            left, right = right, (left ^ mixed) & ((1 << left_bits) - 1)
+            left_bits, right_bits = right_bits, left_bits
+        return left << right_bits | right
+
+    def __getitem__(self, position: int) -> int:
+        if position < 0 or position >= self.size:
+            raise IndexError(f"Position {position} is out of range")
+        value = self._encrypt(position)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        return map(self.__getitem__, range(self.size))
@@ -0,0 +1,446 @@
+import itertools
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from collections import deque
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.cpr_builder import CprBuilder
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import Options
+from improbable_cpr.index import CprIndex
+from improbable_cpr.output import CprWriter
+from improbable_cpr.parsing import is_number_list
+from improbable_cpr.parsing import list_parser
+
+
+SPEC_PARAMETERS = (
+    "year",
+    "month",
+    "day",
+    "gender",
+    "min_date",
+    "max_date",
+    "age",
+    "exclude_allocated",
+)
+FORMATS = ("dash", "no-dash")
+BOOLEANS = {"true": True, "false": False}
+
+
+def parse_parameter(name: str, value: str, parse: Callable[[str], Any]) -> Any:
+    """Raises ValueError naming the parameter if `parse` cannot parse the
+    value."""
+    try:
+        return parse(value)
+    except (KeyError, ValueError):
+        raise ValueError(f"Malformed {name}: {value!r}") from None
+
+
+def builder_from_query(query: dict[str, list[str]]) -> CprBuilder:
+    """A builder matching the query parameters, named like the CLI options.
+
+    Raises ValueError for unknown or malformed parameters.
+    """
+    unknown = set(query) - set(SPEC_PARAMETERS) - {"count", "format"}
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    builder = CprBuilder()
+    number_lists = (
+        ("year", builder.with_year, builder.with_year_range),
+        ("month", builder.with_month, builder.with_month_range),
+        ("day", builder.with_day, builder.with_day_range),
+    )
+    for name, single_func, range_func in number_lists:
+        for value in query.get(name, []):
+            if not is_number_list(value):
+                raise ValueError(f"Malformed {name}: {value!r}")
+            list_parser(value, single_func, range_func)
+    if "gender" in query:
+        value = ",".join(query["gender"])
+        builder.with_genders(parse_parameter("gender", value, parse_genders))
+    if "min_date" in query:
+        value = query["min_date"][-1]
+        builder.with_min_date(
+            parse_parameter("min_date", value, date.fromisoformat)
+        )
+    if "max_date" in query:
+        value = query["max_date"][-1]
+        builder.with_max_date(
+            parse_parameter("max_date", value, date.fromisoformat)
+        )
+    if "age" in query:
+        builder.with_age(parse_parameter("age", query["age"][-1], int))
+    if "exclude_allocated" in query:
+        value = query["exclude_allocated"][-1]
+        if not parse_parameter(
+            "exclude_allocated", value, BOOLEANS.__getitem__
+        ):
+            builder.with_allocated_days()
+    return builder
+
+
+def parse_genders(value: str) -> list[Gender]:
+    return [Gender(gender) for gender in value.split(",")]
+
+
+def spec_key(options: Options) -> tuple:
+    """A key that is the same for all queries matching the same numbers,
+    however their values are written and ordered."""
+    return (
+        tuple(sorted(set(options.years))),
+        tuple(sorted(set(options.months))),
+        None if options.days is None else tuple(sorted(set(options.days))),
+        tuple(sorted(set(options.genders))),
+        options.min_date,
+        options.max_date,
+        options.exclude_allocated,
+        tuple(sorted(set(options.excluded_dates))),
+    )
+
+
+class IssuedNumbers:
+    """Bitmap of the numbers handed out, one bit per position in the index
+    of every number that can be generated."""
+
+    def __init__(self) -> None:
+        self.index = CprIndex(CprBuilder().with_allocated_days().options)
+        self.bits = bytearray((len(self.index) + 7) // 8)
+        self.lock = threading.Lock()
+
+    def __contains__(self, cpr: Cpr) -> bool:
+        byte, bit = divmod(self.index.rank(cpr), 8)
+        return bool(self.bits[byte] & 1 << bit)
+
+    def claim(self, cprs: Iterable[Cpr]) -> list[Cpr]:
+        """Mark the numbers as handed out and return those that were not
+        already."""
+        rank = self.index.rank
+        bits = self.bits
+        claimed = []
+        with self.lock:
+            for cpr in cprs:
+                byte, bit = divmod(rank(cpr), 8)
+                mask = 1 << bit
+                if not bits[byte] & mask:
+                    bits[byte] |= mask
+                    claimed.append(cpr)
+        return claimed
+
+
+class NumberPool:
+    """Numbers matching one spec, drawn ahead from its shuffled order.
+
+    The numbers are only claimed when they are taken, skipping those other
+    pools handed out first, so the numbers left in a pool that is dropped
+    can still be handed out by other pools.
+    """
+
+    def __init__(self, builder: CprBuilder, issued: IssuedNumbers) -> None:
+        self.stream = iter(builder)
+        self.issued = issued
+        self.numbers: deque[Cpr] = deque()
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    def draw(self, n: int) -> None:
+        """Add up to `n` numbers to the pool. Requires the lock."""
+        before = len(self.numbers)
+        self.numbers.extend(itertools.islice(self.stream, n))
+        if len(self.numbers) - before < n:
+            self.exhausted = True
+
+    def fill(self, size: int, step: int) -> bool:
+        """Draw up to `step` numbers towards `size`, False when the pool is
+        full or exhausted."""
+        with self.lock:
+            missing = size - len(self.numbers)
+            if missing <= 0 or self.exhausted:
+                return False
+            self.draw(min(missing, step))
+            return True
+
+    def take(self, n: int) -> list[Cpr]:
+        """Claim and return up to `n` numbers, fewer only once the spec is
+        exhausted."""
+        taken: list[Cpr] = []
+        with self.lock:
+            numbers = self.numbers
+            while len(taken) < n:
+                wanted = n - len(taken)
+                if len(numbers) < wanted and not self.exhausted:
+                    self.draw(wanted - len(numbers))
+                if not numbers:
+                    break
+                batch = [
+                    numbers.popleft() for _ in range(min(wanted, len(numbers)))
+                ]
+                taken += self.issued.claim(batch)
+        return taken
+
+
+class Metrics:
+    def __init__(self, window: int = 1000) -> None:
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.numbers = 0
+        self.latencies: deque[float] = deque(maxlen=window)
+
+    def record(self, numbers: int, seconds: float) -> None:
+        with self.lock:
+            self.requests += 1
+            self.numbers += numbers
+            self.latencies.append(seconds)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Totals since the start, and latencies over the latest requests."""
+        with self.lock:
+            uptime = time.perf_counter() - self.started
+            latencies = sorted(self.latencies)
+            numbers = self.numbers
+            requests = self.requests
+
+        def percentile(fraction: float) -> float | None:
+            if not latencies:
+                return None
+            position = min(int(fraction * len(latencies)), len(latencies) - 1)
+            return latencies[position] * 1000
+
+        return {
+            "uptime_seconds": uptime,
+            "requests": requests,
+            "numbers": numbers,
+            "numbers_per_second": numbers / uptime if uptime else 0.0,
+            "latency_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": percentile(1.0),
+            },
+        }
+
+
+class CprService:
+    """Hands out every CPR number at most once during its lifetime.
+
+    Every distinct spec gets a pool drawn from its own shuffled order, and a
+    background thread keeps the pools topped up to `pool_size` numbers. The
+    `max_pools` most recently used pools are kept, and the numbers in the
+    pools dropped are never handed out, so varying the queries neither
+    grows the memory nor uses up numbers. A bitmap of the handed out numbers
+    keeps specs that overlap from giving out the same number twice.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10000,
+        max_count: int = 1_000_000,
+        seed: int | None = None,
+        max_pools: int = 64,
+    ) -> None:
+        self.pool_size = pool_size
+        self.max_count = max_count
+        self.max_pools = max_pools
+        self.keys = random.Random(seed)
+        self.lock = threading.Lock()
+        self.issued = IssuedNumbers()
+        self.pools: OrderedDict[tuple, NumberPool] = OrderedDict()
+        self.metrics = Metrics()
+        self.refill_needed = threading.Event()
+        self.closed = False
+        self.pool(builder_from_query({}))
+        self.refiller = threading.Thread(target=self.refill, daemon=True)
+        self.refiller.start()
+
+    def pool(self, builder: CprBuilder) -> NumberPool:
+        """The pool of the spec of the builder, created on first use and
+        dropping the least recently used pool when there are too many."""
+        spec = spec_key(builder.options)
+        with self.lock:
+            pool = self.pools.get(spec)
+            if pool is not None:
+                self.pools.move_to_end(spec)
+                return pool
+        # Built outside the lock, so a new spec does not hold up the others.
+        builder.shuffled(self.keys.getrandbits(64))
+        created = NumberPool(builder, self.issued)
+        with self.lock:
+            pool = self.pools.setdefault(spec, created)
+            self.pools.move_to_end(spec)
+            while len(self.pools) > self.max_pools:
+                self.pools.popitem(last=False)
+        return pool
+
+    def take(
+        self, query: dict[str, list[str]], n: int, batch_size: int = 10000
+    ) -> Iterator[list[Cpr]]:
+        """Up to `n` numbers matching the query, in batches.
+
+        The spec is checked before the first batch is returned, so a
+        malformed query raises ValueError before anything is handed out.
+        """
+        pool = self.pool(builder_from_query(query))
+        return self.batches(pool, n, batch_size)
+
+    def batches(
+        self, pool: NumberPool, n: int, batch_size: int
+    ) -> Iterator[list[Cpr]]:
+        while n > 0:
+            batch = pool.take(min(n, batch_size))
+            self.refill_needed.set()
+            if not batch:
+                return
+            n -= len(batch)
+            yield batch
+
+    def refill(self, step: int = 1000) -> None:
+        while not self.closed:
+            self.refill_needed.wait()
+            self.refill_needed.clear()
+            with self.lock:
+                pools = list(self.pools.values())
+            for pool in pools:
+                while not self.closed and pool.fill(self.pool_size, step):
+                    pass
+
+    def close(self) -> None:
+        self.closed = True
+        self.refill_needed.set()
+
+
+class CprRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "CprServer"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self.send_json(self.server.service.metrics.to_dict())
+        elif url.path in ("/cpr", "/cpr.json"):
+            self.send_cprs(parse_qs(url.query), url.path == "/cpr.json")
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+
+    def send_cprs(self, query: dict[str, list[str]], as_json: bool) -> None:
+        start = time.perf_counter()
+        service = self.server.service
+        try:
+            count = int(query.get("count", ["1"])[-1])
+            if not 0 <= count <= service.max_count:
+                raise ValueError(
+                    f"count must be between 0 and {service.max_count}"
+                )
+            fmt = query.get("format", ["dash"])[-1]
+            if fmt not in FORMATS:
+                raise ValueError(
+                    f"Unknown format {fmt}, expected one of {', '.join(FORMATS)}"
+                )
+            dash = fmt == "dash"
+            batches = service.take(query, count)
+        except ValueError as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+
+        self.send_response(HTTPStatus.OK)
+        content_type = "application/json" if as_json else "text/plain"
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunks = ChunkedStream(self.wfile)
+        writer = CprWriter(chunks, dash, buffer_size=1 << 20)
+        served = 0
+        if as_json:
+            chunks.write(b"[")
+        for batch in batches:
+            if as_json:
+                records = ",".join(
+                    f'"{cpr.get_dash() if dash else cpr.get_no_dash()}"'
+                    for cpr in batch
+                )
+                chunks.write((b"," if served else b"") + records.encode())
+            else:
+                writer.write_all(batch)
+                writer.drain()
+            served += len(batch)
+        if as_json:
+            chunks.write(b"]")
+        chunks.close()
+        service.metrics.record(served, time.perf_counter() - start)
+
+    def send_json(self, value: Any) -> None:
+        body = json.dumps(value).encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ChunkedStream:
+    """Writes to a stream using the chunked transfer encoding."""
+
+    def __init__(self, stream: Any) -> None:
+        self.stream = stream
+
+    def write(self, data: bytes | bytearray) -> None:
+        if data:
+            self.stream.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.stream.write(b"0\r\n\r\n")
+        self.stream.flush()
+
+
+class CprServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        service: CprService,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__(address, CprRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.service.close()
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    pool_size: int = 10000,
+    seed: int | None = None,
+    verbose: bool = True,
+    max_pools: int = 64,
+) -> None:
+    service = CprService(pool_size, seed=seed, max_pools=max_pools)
+    with CprServer((host, port), service, verbose) as server:
+        print(f"Serving CPR numbers on http://{host}:{server.server_port}/cpr")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,141 @@
+import glob
+import os
+import tempfile
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO
+
+from improbable_cpr.generators import Options
+from improbable_cpr.index import CprIndex
+from improbable_cpr.index import IndexStream
+from improbable_cpr.output import CprWriter
+from improbable_cpr.permutation import FeistelPermutation
+
+
+def shard_range(total: int, shard: int, shard_count: int) -> tuple[int, int]:
+    """The start and stop of shard `shard` when splitting `range(total)` into
+    `shard_count` contiguous ranges differing in size by at most one."""
+    return total * shard // shard_count, total * (shard + 1) // shard_count
+
+
+def shard_bounds(total: int, shard_count: int) -> list[tuple[int, int]]:
+    return [
+        shard_range(total, shard, shard_count) for shard in range(shard_count)
+    ]
+
+
+def check_workers(workers: int) -> None:
+    if workers < 1:
+        raise ValueError(
+            f"The number of workers must be at least 1, not {workers}"
+        )
+
+
+def shard_path(directory: str, shard: int) -> str:
+    return os.path.join(directory, f"shard-{shard:05d}.txt")
+
+
+def remove_shards(directory: str) -> None:
+    """Remove the shard files of an earlier run from `directory`."""
+    for path in glob.glob(os.path.join(directory, "shard-*.txt")):
+        if os.path.basename(path)[6:-4].isdigit():
+            os.remove(path)
+
+
+def write_shard(
+    options: Options, key: int, start: int, stop: int, path: str, dash: bool
+) -> str:
+    index = CprIndex(options)
+    stream = IndexStream(
+        index, FeistelPermutation(len(index), key), start, stop
+    )
+    with open(path, "wb", buffering=0) as output:
+        writer = CprWriter(output, dash, buffer_size=1 << 20)
+        writer.write_all(stream)
+        writer.flush()
+    return path
+
+
+def submit_shards(
+    executor: Executor,
+    options: Options,
+    key: int,
+    directory: str,
+    shard_count: int,
+    start: int,
+    count: int | None,
+    dash: bool,
+) -> list["Future[str]"]:
+    stop = len(CprIndex(options))
+    if count is not None:
+        stop = min(stop, start + count)
+    bounds = shard_bounds(max(stop - start, 0), shard_count)
+    return [
+        executor.submit(
+            write_shard,
+            options,
+            key,
+            start + first,
+            start + last,
+            shard_path(directory, shard),
+            dash,
+        )
+        for shard, (first, last) in enumerate(bounds)
+    ]
+
+
+def write_shards(
+    options: Options,
+    key: int,
+    directory: str,
+    workers: int,
+    count: int | None = None,
+    dash: bool = True,
+    start: int = 0,
+) -> list[str]:
+    """Write the shuffled numbers to one file per worker in `directory`.
+
+    The shards are consecutive ranges of the positions of the shuffled
+    order, balanced using the exact counts of `CprIndex`. The concatenated
+    shard files are therefore the same for a given key and count whatever
+    the number of workers. Generation begins at position `start` of the
+    shuffled order. Shard files already in `directory` are removed first,
+    so the files of an earlier run with more workers are not mixed in.
+    """
+    check_workers(workers)
+    os.makedirs(directory, exist_ok=True)
+    remove_shards(directory)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = submit_shards(
+            executor, options, key, directory, workers, start, count, dash
+        )
+        return [future.result() for future in futures]
+
+
+def write_merged(
+    options: Options,
+    key: int,
+    output: BinaryIO,
+    workers: int,
+    count: int | None = None,
+    dash: bool = True,
+    start: int = 0,
+) -> None:
+    """Generate the shards in parallel and copy them to `output` in order.
+
+    Each shard is copied as soon as it and all shards before it are done.
+    """
+    check_workers(workers)
+    with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        futures = submit_shards(
+            executor, options, key, directory, workers, start, count, dash
+        )
+        for future in futures:
+            path = future.result()
+            with open(path, "rb") as shard:
+                while chunk := shard.read(1 << 20):
+                    output.write(chunk)
+            os.remove(path)
@@ -0,0 +1,98 @@
+from collections import Counter
+from operator import mul
+from typing import Any
+from typing import Iterator
+from typing import Sequence
+
+from improbable_cpr.generators import MonthGenerator
+from improbable_cpr.generators import Options
+from improbable_cpr.generators import YearGenerator
+from improbable_cpr.generators import date_residue
+from improbable_cpr.generators import improbable_counts
+from improbable_cpr.generators import residue_histogram
+from improbable_cpr.generators import seventh_digits
+
+
+DIMENSIONS = ("year", "month", "day", "gender")
+
+
+def month_days(
+    options: Options,
+) -> Iterator[tuple[int, int, list[int], list[tuple[int, ...]]]]:
+    """The matched days of every matched month, in calendar order.
+
+    Yields the year, the month, the days and, for each gender in the
+    options, the number of improbable numbers per date residue.
+    """
+    genders = sorted(set(options.genders))
+    for year in sorted(set(YearGenerator(options).choises)):
+        digits = seventh_digits(year)
+        if not digits:
+            continue
+        counts = [improbable_counts(digits, gender) for gender in genders]
+        month_generator = MonthGenerator(year, options)
+        for month in sorted(set(month_generator.choises)):
+            days = month_generator.get_matching_days(month)
+            if days:
+                yield year, month, days, counts
+
+
+def day_counts(options: Options) -> Iterator[tuple[int, int, int, int]]:
+    """The year, month, day and number of improbable numbers of every date."""
+    for year, month, days, counts in month_days(options):
+        base = date_residue(0, month, year)
+        for day in days:
+            residue = (base + date_residue(day, 0, 0)) % 11
+            yield year, month, day, sum(count[residue] for count in counts)
+
+
+def count(options: Options) -> int:
+    """The number of improbable numbers matching the options."""
+    total = 0
+    for year, month, days, counts in month_days(options):
+        residues = residue_histogram(date_residue(0, month, year), tuple(days))
+        for gender_counts in counts:
+            total += sum(map(mul, residues, gender_counts))
+    return total
+
+
+def histogram(
+    options: Options, by: str | Sequence[str] = "year"
+) -> dict[Any, int]:
+    """Count the improbable numbers matching the options per group.
+
+    `by` names one of `DIMENSIONS` or is a sequence of them. With a single
+    name the keys are the values of that dimension, with a sequence they are
+    tuples of the values in the order given. Groups without any numbers are
+    left out.
+    """
+    scalar = isinstance(by, str)
+    dimensions = [by] if isinstance(by, str) else list(by)
+    for dimension in dimensions:
+        if dimension not in DIMENSIONS:
+            raise ValueError(
+                f"Unknown dimension {dimension}, expected one of {DIMENSIONS}"
+            )
+
+    genders = sorted(set(options.genders))
+    result: Counter[Any] = Counter()
+    for year, month, days, counts in month_days(options):
+        base = date_residue(0, month, year)
+        residues = residue_histogram(base, tuple(days))
+        for gender, gender_counts in zip(genders, counts):
+            groups: list[tuple[int | None, int]]
+            if "day" in dimensions:
+                groups = [
+                    (day, gender_counts[(base + date_residue(day, 0, 0)) % 11])
+                    for day in days
+                ]
+            else:
+                groups = [(None, sum(map(mul, residues, gender_counts)))]
+            values = {"year": year, "month": month, "gender": gender}
+            for day, n in groups:
+                if n == 0:
+                    continue
+                values["day"] = day
+                key = tuple(values[dimension] for dimension in dimensions)
+                result[key[0] if scalar else key] += n
+    return dict(result)
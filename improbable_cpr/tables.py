@@ -0,0 +1,122 @@
+"""
+Precomputed number of improbable CPR numbers in every whole year.
+
+Counting a year from its months and days is the bulk of the work before the
+first number, since the years are drawn weighted by their counts. The
+counts only depend on the calendar and the 7th digit rules, so they are
+computed once and kept here. The counts include the excluded days, which
+are subtracted when counting.
+
+Regenerate with `python -m improbable_cpr.tables`; a test checks that the
+tables match the computed counts.
+"""
+
+FIRST_YEAR = 1858
+LAST_YEAR = 2057
+
+# fmt: off
+FEMALE_YEAR_COUNTS = (
+    663637, 663635, 665455, 663636, 663636, 663640, 665451, 663633,
+    663640, 663636, 665454, 663637, 663635, 663637, 665454, 663636,
+    663640, 663634, 665452, 663640, 663636, 663636, 665456, 663635,
+    663637, 663636, 665455, 663640, 663634, 663633, 665459, 663636,
+    663636, 663637, 665453, 663637, 663636, 663636, 665458, 663634,
+    663633, 663640, 663636, 663640, 663634, 663633, 665459, 663636,
+    663636, 663637, 665453, 663637, 663636, 663636, 665458, 663634,
+    663633, 663640, 665453, 663636, 663637, 663635, 665455, 663636,
+    663636, 663640, 665451, 663633, 663640, 663636, 665454, 663637,
+    663635, 663637, 665454, 663636, 663640, 663634, 665452, 995458,
+    995456, 995455, 998179, 995451, 995458, 995458, 998179, 995455,
+    995452, 995453, 998186, 995456, 995455, 995452, 998179, 995458,
+    995458, 995452, 998183, 995452, 995453, 995458, 998183, 995455,
+    995452, 995451, 998186, 995458, 995452, 995455, 998179, 995453,
+    995458, 995456, 998182, 995452, 995451, 995458, 998184, 995452,
+    995455, 995452, 998180, 995458, 995456, 995455, 998179, 995451,
+    995458, 995458, 998179, 995455, 995452, 995453, 998186, 995456,
+    995455, 995452, 998179, 995458, 995458, 995452, 998183, 995451,
+    995454, 995457, 998180, 995457, 995455, 995451, 998184, 995455,
+    995455, 995456, 998178, 995454, 995457, 995453, 998185, 995455,
+    995451, 995456, 998182, 995455, 995456, 995451, 998182, 995457,
+    995453, 995457, 998182, 995451, 995456, 995455, 998182, 995456,
+    995451, 995454, 998184, 663635, 663637, 663636, 665455, 663640,
+    663634, 663633, 665459, 663636, 663636, 663637, 665453, 663637,
+    663636, 663636, 665458, 663634, 663633, 663640, 665453, 663636,
+)
+MALE_YEAR_COUNTS = (
+    663636, 663636, 665456, 663635, 663637, 663636, 665455, 663640,
+    663634, 663633, 665459, 663636, 663636, 663637, 665453, 663637,
+    663636, 663636, 665458, 663634, 663633, 663640, 665453, 663636,
+    663637, 663635, 665455, 663636, 663636, 663640, 665451, 663633,
+    663640, 663636, 665454, 663637, 663635, 663637, 665454, 663636,
+    663640, 663634, 663637, 663636, 663636, 663640, 665451, 663633,
+    663640, 663636, 665454, 663637, 663635, 663637, 665454, 663636,
+    663640, 663634, 665452, 663640, 663636, 663636, 665456, 663635,
+    663637, 663636, 665455, 663640, 663634, 663633, 665459, 663636,
+    663636, 663637, 665453, 663637, 663636, 663636, 665458, 995452,
+    995453, 995458, 998183, 995455, 995452, 995451, 998186, 995458,
+    995452, 995455, 998179, 995453, 995458, 995456, 998182, 995452,
+    995451, 995458, 998184, 995452, 995455, 995452, 998180, 995458,
+    995456, 995455, 998179, 995451, 995458, 995458, 998179, 995455,
+    995452, 995453, 998186, 995456, 995455, 995452, 998179, 995458,
+    995458, 995452, 998183, 995452, 995453, 995458, 998183, 995455,
+    995452, 995451, 998186, 995458, 995452, 995455, 998179, 995453,
+    995458, 995456, 998182, 995452, 995451, 995458, 998182, 995455,
+    995456, 995451, 998182, 995457, 995453, 995457, 998182, 995451,
+    995456, 995455, 998182, 995456, 995451, 995454, 998184, 995453,
+    995457, 995455, 998178, 995456, 995455, 995455, 998183, 995451,
+    995454, 995457, 998180, 995457, 995455, 995451, 998184, 995455,
+    995455, 995456, 998178, 663636, 663637, 663635, 665455, 663636,
+    663636, 663640, 665451, 663633, 663640, 663636, 665454, 663637,
+    663635, 663637, 665454, 663636, 663640, 663634, 665452, 663640,
+)
+# fmt: on
+
+
+def compute_year_counts(gender: str) -> tuple[int, ...]:
+    """The counts of every year, computed from the running number tables."""
+    import calendar
+
+    from improbable_cpr.cpr import Gender
+    from improbable_cpr.generators import date_residue
+    from improbable_cpr.generators import improbable_counts
+    from improbable_cpr.generators import seventh_digits
+
+    counts = []
+    for year in range(FIRST_YEAR, LAST_YEAR + 1):
+        table = improbable_counts(seventh_digits(year), Gender(gender))
+        counts.append(
+            sum(
+                table[date_residue(day, month, year)]
+                for month in range(1, 13)
+                for day in range(1, calendar.monthrange(year, month)[1] + 1)
+            )
+        )
+    return tuple(counts)
+
+
+def render(counts: tuple[int, ...]) -> str:
+    lines = [
+        "    " + " ".join(f"{count}," for count in counts[start : start + 8])
+        for start in range(0, len(counts), 8)
+    ]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    with open(__file__) as module:
+        source = module.read()
+    for name, gender in [
+        ("FEMALE_YEAR_COUNTS", "female"),
+        ("MALE_YEAR_COUNTS", "male"),
+    ]:
+        start = source.index(f"\n{name} = (\n") + len(name) + 6
+        end = source.index("\n)\n", start)
+        source = (
+            source[:start] + render(compute_year_counts(gender)) + source[end:]
+        )
+    with open(__file__, "w") as module:
+        module.write(source)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ Conftest module.
 import random
 
 import pytest
+from improbable_cpr import bitmap
 
 
 @pytest.fixture
@@ -12,3 +13,12 @@ def seed_random(request):
     seed = request.node.name
     print(f"seed: {seed}")
     random.seed(seed)
+
+
+@pytest.fixture(autouse=True)
+def no_bitmap(monkeypatch, tmp_path):
+    """Keep a bitmap built on this machine out of the tests."""
+    monkeypatch.setenv(bitmap.PATH_VARIABLE, str(tmp_path / "missing.bitmap"))
+    bitmap.load.cache_clear()
+    yield
+    bitmap.load.cache_clear()
@@ -0,0 +1,109 @@
+import asyncio
+import itertools
+import time
+
+import pytest
+from improbable_cpr.aio import AsyncCprStream
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.cpr_builder import CprBuilder
+
+
+STALL_LIMIT = 0.1
+
+
+def builder() -> CprBuilder:
+    return CprBuilder().with_year(1990).with_month(2).with_day(3).with_seed(5)
+
+
+async def collect(numbers) -> list[str]:
+    return [cpr.get_dash() async for cpr in numbers]
+
+
+def test_async_iteration_matches_sync():
+    expected = [cpr.get_dash() for cpr in builder()]
+    assert asyncio.run(collect(builder())) == expected
+
+
+def test_agenerate_batches():
+    async def batches() -> list[list[Cpr]]:
+        return [batch async for batch in builder().agenerate(250, 100)]
+
+    result = asyncio.run(batches())
+    assert [len(batch) for batch in result] == [100, 100, 50]
+    expected = [cpr.get_dash() for cpr in itertools.islice(builder(), 250)]
+    assert [cpr.get_dash() for batch in result for cpr in batch] == expected
+
+
+def test_backpressure():
+    drawn = []
+
+    def numbers():
+        for running_number in itertools.count():
+            drawn.append(running_number)
+            yield Cpr(1, 1, 1990, running_number)
+
+    async def take(n: int) -> None:
+        stream = AsyncCprStream(numbers(), batch_size=10)
+        for _ in range(n):
+            await stream.__anext__()
+
+    asyncio.run(take(3))
+    assert len(drawn) == 10
+
+
+def test_cancel_stops_batch():
+    started = asyncio.Event()
+
+    def numbers():
+        yield Cpr(1, 1, 1990, 0)
+        started_loop.call_soon_threadsafe(started.set)
+        while True:
+            time.sleep(0.001)
+            yield Cpr(1, 1, 1990, 1)
+
+    async def cancel() -> AsyncCprStream:
+        nonlocal started_loop
+        started_loop = asyncio.get_running_loop()
+        stream = AsyncCprStream(numbers(), batch_size=10**9)
+        task = asyncio.create_task(stream.__anext__())
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return stream
+
+    started_loop = None
+    stream = asyncio.run(cancel())
+    assert stream.stopped.is_set()
+
+
+@pytest.mark.parametrize(
+    "slow_builder",
+    [
+        lambda: CprBuilder().with_seed(1),
+        lambda: CprBuilder().with_seed(1).shuffled(),
+        lambda: CprBuilder().with_year(1990).with_day(31).with_seed(1),
+    ],
+)
+def test_event_loop_never_stalls(slow_builder):
+    async def generate() -> float:
+        longest = 0.0
+        done = False
+
+        async def ticker() -> None:
+            nonlocal longest
+            last = time.perf_counter()
+            while not done:
+                await asyncio.sleep(0.001)
+                now = time.perf_counter()
+                longest = max(longest, now - last)
+                last = now
+
+        task = asyncio.create_task(ticker())
+        async for _ in slow_builder().agenerate(1000, batch_size=250):
+            pass
+        done = True
+        await task
+        return longest
+
+    assert asyncio.run(generate()) < STALL_LIMIT
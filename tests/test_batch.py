@@ -0,0 +1,188 @@
+import io
+import mmap
+from datetime import date
+
+import pytest
+from improbable_cpr import batch as batch_module
+from improbable_cpr.batch import CprBatch
+from improbable_cpr.batch import generate
+from improbable_cpr.batch import parse_records
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.cpr_builder import CprBuilder
+from improbable_cpr.generators import CprGenerator
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import Options
+from improbable_cpr.output import make_writer
+
+
+def python_candidates(options: Options) -> set[tuple[int, int]]:
+    return {
+        (date(cpr.year, cpr.month, cpr.day).toordinal(), cpr.running_number)
+        for cpr in CprGenerator(options)
+    }
+
+
+def batch_candidates(batch: CprBatch) -> set[tuple[int, int]]:
+    return set(zip(map(int, batch.ordinals), map(int, batch.running_numbers)))
+
+
+def test_python_batch_round_trip(seed_random):
+    options = Options(years=[1984], months=[3], days=[14, 15])
+    batch = CprBatch.from_cprs(CprGenerator(options))
+    assert batch_candidates(batch) == python_candidates(options)
+    assert [cpr.get_dash() for cpr in batch.to_cprs()] == [
+        record.decode() for record in batch.dash()
+    ]
+    assert all(len(record) == 10 for record in batch.no_dash())
+
+
+def test_builder_to_array_limits_count(seed_random):
+    batch = CprBuilder().with_year(1999).with_month(12).to_array(100)
+    assert len(batch) == 100
+    assert len(batch_candidates(batch)) == 100
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        Options(years=[1899, 1937], months=[1, 2]),
+        Options(years=[2000, 2036, 2037], months=[2], genders=[Gender.MALE]),
+        Options(
+            years=[1965, 1966],
+            days=[1, 31],
+            genders=[Gender.FEMALE],
+            min_date=date(1965, 3, 31),
+            max_date=date(1966, 1, 31),
+        ),
+    ],
+)
+def test_numpy_engine_matches_python(options: Options, seed_random):
+    pytest.importorskip("numpy")
+    batch = generate(options, seed=0)
+    assert len(batch) == len(batch_candidates(batch))
+    assert batch_candidates(batch) == python_candidates(options)
+
+
+def test_numpy_records(seed_random):
+    np = pytest.importorskip("numpy")
+    batch = CprBuilder().with_year(2012).to_array(1000)
+    assert isinstance(batch.ordinals, np.ndarray)
+    assert batch.dash().dtype == np.dtype("S11")
+    assert batch.no_dash().dtype == np.dtype("S10")
+    assert [record.decode() for record in batch.dash()] == [
+        cpr.get_dash() for cpr in batch.to_cprs()
+    ]
+
+
+PARSE_CPRS = [
+    Cpr(1, 1, 1858, 5000),
+    Cpr(29, 2, 2000, 4042),
+    Cpr(31, 12, 2057, 8999),
+    Cpr(15, 6, 1937, 9001),
+    Cpr(10, 5, 1874, 6804),
+]
+
+
+def write_records(cprs: list[Cpr], fmt: str) -> bytes:
+    stream = io.BytesIO()
+    writer = make_writer(stream, fmt)
+    writer.write_all(cprs)
+    writer.finish()
+    return stream.getvalue()
+
+
+@pytest.fixture(params=["numpy", "python"])
+def engine(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(batch_module, "np", None)
+    return request.param
+
+
+@pytest.mark.parametrize("fmt", ["dash", "no-dash", "packed"])
+def test_parse_round_trip(engine: str, fmt: str):
+    data = write_records(PARSE_CPRS, fmt)
+    parsed = Cpr.parse_many(data, fmt)
+    assert len(parsed) == len(PARSE_CPRS)
+    assert not any(parsed.errors)
+    assert parsed.to_cprs() == PARSE_CPRS
+    assert list(parsed.years) == [cpr.year for cpr in PARSE_CPRS]
+    if fmt != "packed":
+        # The last line may leave out its newline.
+        assert parse_records(data[:-1], fmt).to_cprs() == PARSE_CPRS
+
+
+@pytest.mark.parametrize("dash", [True, False])
+def test_parse_errors(engine: str, dash: bool):
+    lines = [
+        b"0101580000",
+        b"0101a80000",
+        b"3102904000",
+        b"0013904000",
+        b"2902000001",
+        b"2902004000",
+    ]
+    if dash:
+        lines = [line[:6] + b"-" + line[6:] for line in lines]
+        lines[0] = lines[0].replace(b"-", b"+")
+    data = b"\n".join(lines) + b"\n"
+    parsed = parse_records(data, "dash" if dash else "no-dash")
+    assert list(map(bool, parsed.errors)) == [
+        dash,
+        True,
+        True,
+        True,
+        True,
+        False,
+    ]
+    assert parsed.to_cprs()[5] == Cpr(29, 2, 2000, 4000)
+    assert list(parsed.days)[:5] == [0 if dash else 1, 0, 0, 0, 0]
+
+
+def test_parse_missing_newline(engine: str):
+    parsed = parse_records(b"0101580000 0101580001\n", "no-dash")
+    assert list(map(bool, parsed.errors)) == [True, False]
+
+
+def test_parse_packed_century(engine: str):
+    data = write_records([Cpr(1, 1, 1958, 0)], "packed")
+    # 1958 cannot be written with a running number starting with 5.
+    data += (195801015000).to_bytes(8, "little")
+    parsed = parse_records(data, "packed")
+    assert list(map(bool, parsed.errors)) == [False, True]
+
+
+def test_parse_mmap(engine: str, tmp_path):
+    path = tmp_path / "cprs.txt"
+    path.write_bytes(write_records(PARSE_CPRS * 1000, "dash"))
+    with open(path, "rb") as stream:
+        with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            parsed = parse_records(memoryview(data)[12:], "dash")
+            assert len(parsed) == len(PARSE_CPRS) * 1000 - 1
+            assert parsed.to_cprs()[:4] == PARSE_CPRS[1:]
+
+
+def test_parse_large_buffer(monkeypatch):
+    np = pytest.importorskip("numpy")
+    monkeypatch.setattr(batch_module, "PARSE_CHUNK_SIZE", 1000)
+    cprs = (
+        CprBuilder().with_year(1990).with_month(3).with_day_range(1, 3)
+    ).sequential()
+    data = write_records(list(cprs), "no-dash")
+    parsed = parse_records(data, "no-dash")
+    assert parsed.running_numbers.dtype == np.uint16
+    assert parsed.to_cprs() == list(cprs)
+
+
+@pytest.mark.parametrize(
+    "data,fmt", [(b"0101580000\n01", "no-dash"), (b"1234567", "packed")]
+)
+def test_parse_partial_record(data: bytes, fmt: str):
+    with pytest.raises(ValueError, match="whole number"):
+        parse_records(data, fmt)
+
+
+def test_parse_unknown_format():
+    with pytest.raises(ValueError, match="Unknown format"):
+        parse_records(b"", "csv")
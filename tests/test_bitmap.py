@@ -0,0 +1,154 @@
+import io
+from datetime import date
+
+import pytest
+from improbable_cpr import bitmap
+from improbable_cpr import check
+from improbable_cpr.check import Status
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import CprGenerator
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import Options
+
+
+FIRST = date(1999, 12, 30)
+LAST = date(2000, 1, 2)
+
+
+@pytest.fixture
+def space(monkeypatch, tmp_path) -> bitmap.SpaceBitmap:
+    path = str(tmp_path / "space.bitmap")
+    monkeypatch.setenv(bitmap.PATH_VARIABLE, path)
+    bitmap.build(first=FIRST, last=LAST)
+    space = bitmap.load()
+    assert space is not None
+    return space
+
+
+def test_header(space: bitmap.SpaceBitmap):
+    assert space.first == FIRST.toordinal()
+    assert space.days == 4
+    assert space.verify()
+    assert space.offset(date(1999, 12, 29)) is None
+    assert space.offset(LAST) == bitmap.HEADER_SIZE + 3 * 1250
+
+
+def test_bits_match_generator(space: bitmap.SpaceBitmap):
+    options = Options(min_date=FIRST, max_date=LAST)
+    numbers = {cpr.get_no_dash() for cpr in CprGenerator(options)}
+    found = set()
+    for day in bitmap.dates(FIRST, LAST):
+        bits = space.day_bits(day)
+        assert bits == bitmap.compute_day_bits(day)
+        found.update(
+            Cpr(day.day, day.month, day.year, number).get_no_dash()
+            for number in range(10000)
+            if bits[number >> 3] >> (number & 7) & 1
+        )
+    assert found == numbers
+
+
+@pytest.mark.parametrize(
+    "genders", [[Gender.FEMALE], [Gender.MALE], [Gender.FEMALE, Gender.MALE]]
+)
+def test_day_count(space: bitmap.SpaceBitmap, genders: list[Gender]):
+    for day in bitmap.dates(FIRST, LAST):
+        options = Options(min_date=day, max_date=day, genders=genders)
+        expected = sum(1 for _ in CprGenerator(options))
+        assert bitmap.day_count(day, genders) == expected
+
+
+def test_is_improbable(space: bitmap.SpaceBitmap):
+    assert bitmap.is_improbable(Cpr(1, 1, 2000, 4000))
+    assert not bitmap.is_improbable(Cpr(1, 1, 2000, 4007))
+    assert not bitmap.is_improbable(Cpr(1, 1, 2000, 1))
+    assert not bitmap.is_improbable(Cpr(30, 2, 2000, 4000))
+    # Outside the file, the bits are computed.
+    assert bitmap.is_improbable(Cpr(1, 1, 1958, 0))
+
+
+def test_missing_file():
+    assert bitmap.load() is None
+    assert bitmap.is_improbable(Cpr(1, 1, 2000, 4000))
+    assert bitmap.day_count(date(2000, 1, 1)) == sum(
+        1
+        for _ in CprGenerator(
+            Options(min_date=date(2000, 1, 1), max_date=date(2000, 1, 1))
+        )
+    )
+
+
+def truncate(data: bytes) -> bytes:
+    return data[:-1]
+
+
+def wrong_magic(data: bytes) -> bytes:
+    return b"NOTABMAP" + data[8:]
+
+
+def wrong_version(data: bytes) -> bytes:
+    return data[:8] + bytes([bitmap.BITMAP_VERSION + 1]) + data[9:]
+
+
+def flip_bit(data: bytes) -> bytes:
+    return data[:-1] + bytes([data[-1] ^ 1])
+
+
+@pytest.mark.parametrize(
+    "damage", [truncate, wrong_magic, wrong_version, flip_bit]
+)
+def test_unusable_file(monkeypatch, tmp_path, damage):
+    path = tmp_path / "space.bitmap"
+    bitmap.build(str(path), FIRST, LAST)
+    path.write_bytes(damage(path.read_bytes()))
+    monkeypatch.setenv(bitmap.PATH_VARIABLE, str(path))
+    with pytest.warns(UserWarning, match="Ignoring the bitmap"):
+        assert bitmap.load() is None
+    assert bitmap.is_improbable(Cpr(1, 1, 2000, 4000))
+
+
+def test_checksum(tmp_path):
+    path = tmp_path / "space.bitmap"
+    bitmap.build(str(path), FIRST, LAST)
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 1
+    path.write_bytes(data)
+    assert not bitmap.SpaceBitmap(str(path)).verify()
+
+
+def test_check_lines_shares_bits(space: bitmap.SpaceBitmap):
+    data = b"".join(
+        cpr.get_dash().encode() + b"\n"
+        for cpr in [
+            Cpr(1, 1, 2000, 4000),
+            Cpr(1, 1, 2000, 4007),
+            Cpr(31, 12, 1999, 4001),
+        ]
+    )
+    report = check.CheckReport()
+    dates: dict = {}
+    assert check.check_lines(data, 1, report, dates) == 3
+    assert report.counts[Status.IMPROBABLE] == 2
+    assert report.lines[Status.VALID_MOD11] == [2]
+    assert all(bits is space.data for _, bits, _ in dates.values())
+
+
+def test_check_reads_bits(monkeypatch):
+    """The check looks the numbers up in a full bitmap, so wrong bits show
+    up in the report."""
+    pytest.importorskip("numpy")
+    data = b"".join(
+        cpr.get_no_dash().encode() + b"\n"
+        for cpr in [Cpr(1, 1, 2000, 4000), Cpr(1, 1, 2000, 4007)]
+    )
+    expected = check.check(io.BytesIO(data))
+
+    class Inverted:
+        first = bitmap.FIRST_DAY.toordinal()
+        days = bitmap.LAST_DAY.toordinal() - first + 1
+        data = bytes(bitmap.HEADER_SIZE) + b"\xff" * days * 1250
+
+    monkeypatch.setattr(check, "load", lambda: Inverted)
+    report = check.check(io.BytesIO(data))
+    assert expected.counts[Status.IMPROBABLE] == 1
+    assert report.counts[Status.IMPROBABLE] == 2
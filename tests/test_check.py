@@ -0,0 +1,89 @@
+import io
+
+import pytest
+from improbable_cpr import check
+from improbable_cpr.check import Status
+from improbable_cpr.cpr_builder import CprBuilder
+from improbable_cpr.output import CprWriter
+
+
+@pytest.mark.parametrize(
+    "line,status",
+    [
+        (b"0101580000", Status.IMPROBABLE),
+        (b"010158-0000", Status.IMPROBABLE),
+        (b"0101580008", Status.VALID_MOD11),
+        (b"010158-0008", Status.VALID_MOD11),
+        (b"2902004000", Status.IMPROBABLE),
+        (b"2902000001", Status.BAD_CENTURY),
+        (b"3102904000", Status.BAD_DATE),
+        (b"0013904000", Status.BAD_DATE),
+        (b"0101580a00", Status.MALFORMED),
+        (b"0101580-000", Status.MALFORMED),
+        (b"010158000", Status.MALFORMED),
+        (b"hello", Status.MALFORMED),
+    ],
+)
+def test_classify(line: bytes, status: Status):
+    assert check.classify(line) == status
+
+
+LINES = [
+    b"0101580000",
+    b"010158-0000",
+    b"0101580008",
+    b"",
+    b"2902000001 ",
+    b"3102904000\r",
+    b"hello",
+    b"0101580001",
+]
+
+
+def test_check_lines(monkeypatch):
+    monkeypatch.setattr(check, "np", None)
+    report = check.check(io.BytesIO(b"\n".join(LINES)))
+    assert report.counts == {
+        Status.IMPROBABLE: 3,
+        Status.VALID_MOD11: 1,
+        Status.BAD_CENTURY: 1,
+        Status.BAD_DATE: 1,
+        Status.MALFORMED: 1,
+    }
+    assert report.lines == {
+        Status.VALID_MOD11: [3],
+        Status.BAD_CENTURY: [5],
+        Status.BAD_DATE: [6],
+        Status.MALFORMED: [7],
+    }
+    assert report.total == 7
+    assert not report.ok
+
+
+def test_limit(monkeypatch):
+    monkeypatch.setattr(check, "np", None)
+    report = check.check(io.BytesIO(b"x\n" * 5), limit=2)
+    assert report.counts[Status.MALFORMED] == 5
+    assert report.lines[Status.MALFORMED] == [1, 2]
+
+
+@pytest.mark.parametrize("dash", [True, False])
+def test_records_match_lines(monkeypatch, dash: bool):
+    pytest.importorskip("numpy")
+    stream = io.BytesIO()
+    writer = CprWriter(stream, dash)
+    builder = CprBuilder().with_year(2000).with_month(2).with_day_range(28, 29)
+    writer.write_all(builder.with_seed(1).shuffled())
+    writer.flush()
+    data = bytearray(stream.getvalue())
+    width = 12 if dash else 11
+    for row, replacement in [(17, b"0101580008"), (40, b"2902000001")]:
+        if dash:
+            replacement = replacement[:6] + b"-" + replacement[6:]
+        data[row * width : (row + 1) * width - 1] = replacement
+
+    report = check.check(io.BytesIO(data))
+    monkeypatch.setattr(check, "np", None)
+    expected = check.check(io.BytesIO(data))
+    assert report == expected
+    assert report.lines == {Status.VALID_MOD11: [18], Status.BAD_CENTURY: [41]}
@@ -1,4 +1,8 @@
+from datetime import date
+
+import pytest
 from improbable_cpr.cpr import Cpr
+from improbable_cpr.cpr import Gender
 
 
 def test_cpr_constructor():
@@ -7,3 +11,59 @@ def test_cpr_constructor():
     assert cpr.month == 5
     assert cpr.year == 1874
     assert cpr.running_number == 6804
+
+
+def test_from_str_seventh_digit():
+    assert Cpr.from_str("0101584000").year == 1958
+    assert Cpr.from_str("010158-5000").year == 1858
+    assert Cpr.from_str("010158-5000") == Cpr.from_str("0101585000")
+
+
+def test_value_equality():
+    first = Cpr.from_str("1005746804")
+    second = Cpr(10, 5, 1874, 6804)
+    assert first == second
+    assert first is not second
+    assert len({first, second}) == 1
+    assert first != Cpr(10, 5, 1874, 6805)
+
+
+def test_ordering():
+    cprs = [
+        Cpr(31, 12, 2057, 9999),
+        Cpr(1, 1, 1958, 0),
+        Cpr(1, 1, 1858, 5001),
+        Cpr(2, 1, 1958, 0),
+        Cpr(1, 1, 1958, 1),
+    ]
+    assert sorted(cprs) == [cprs[2], cprs[1], cprs[4], cprs[3], cprs[0]]
+    assert cprs[1] < cprs[4] <= cprs[3]
+
+
+def test_unset_fields():
+    assert Cpr() == Cpr()
+    assert hash(Cpr()) == hash(Cpr())
+    assert Cpr() != Cpr(1, 1, 1958, 0)
+    assert Cpr(running_number=1) < Cpr(1, 1, 1958, 0)
+    assert sorted([Cpr(1, 1, 1958, 0), Cpr()]) == [Cpr(), Cpr(1, 1, 1958, 0)]
+
+
+def test_packed():
+    cpr = Cpr.from_str("1005746804")
+    assert cpr.packed == 187405106804
+    assert Cpr.from_packed(cpr.packed) == cpr
+
+
+def test_slots():
+    with pytest.raises(AttributeError):
+        Cpr().check_digit = 4  # type: ignore
+
+
+def test_derived_properties():
+    cpr = Cpr(29, 2, 2000, 4042)
+    assert cpr.birth_date == date(2000, 2, 29)
+    assert cpr.gender == Gender.FEMALE
+    assert Cpr(29, 2, 2000, 4043).gender == Gender.MALE
+    assert cpr.century == 2000
+    assert cpr.age_on(date(2010, 2, 28)) == 9
+    assert cpr.age_on(date(2010, 3, 1)) == 10
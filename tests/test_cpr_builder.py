@@ -1,7 +1,13 @@
+import itertools
+import json
+import random
+import tracemalloc
 from datetime import date
 
 import pytest
 from improbable_cpr import cpr_builder
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import GenerationException
 
 
 @pytest.fixture
@@ -27,3 +33,148 @@ def test_age(override_today_func, min_date: date, max_date: date):
     builder.with_age(10)
     assert builder.options.min_date == min_date
     assert builder.options.max_date == max_date
+
+
+def draw(builder: cpr_builder.CprBuilder, n: int) -> list[str]:
+    return [next(builder).get_dash() for _ in range(n)]
+
+
+@pytest.mark.parametrize("shuffled", [False, True])
+def test_seed_repeats_sequence(shuffled: bool):
+    def builder() -> cpr_builder.CprBuilder:
+        result = cpr_builder.CprBuilder().with_year(1990).with_seed(42)
+        return result.shuffled() if shuffled else result
+
+    state = random.getstate()
+    assert draw(builder(), 50) == draw(builder(), 50)
+    assert random.getstate() == state
+
+
+def test_resume_continues_after_checkpoint():
+    builder = cpr_builder.CprBuilder().with_year(1990).with_seed(7).shuffled()
+    expected = draw(builder, 300)
+
+    builder = cpr_builder.CprBuilder().with_year(1990).with_seed(7).shuffled()
+    first = draw(builder, 120)
+    resumed = cpr_builder.CprBuilder.resume(builder.checkpoint())
+    assert first + draw(resumed, 180) == expected
+
+
+def test_checkpoint_random_order():
+    builder = cpr_builder.CprBuilder().with_year(1990)
+    with pytest.raises(GenerationException):
+        builder.checkpoint()
+
+
+def test_resume_invalid_token():
+    with pytest.raises(ValueError):
+        cpr_builder.CprBuilder.resume("not a checkpoint")
+
+
+def test_partition_is_disjoint_and_balanced():
+    def builder() -> cpr_builder.CprBuilder:
+        return (
+            cpr_builder.CprBuilder().with_year(1990).with_month(2).with_day(3)
+        )
+
+    shards = [
+        [cpr.get_dash() for cpr in builder().partition(shard, 7)]
+        for shard in range(7)
+    ]
+    numbers = [number for shard in shards for number in shard]
+    assert len(numbers) == len(set(numbers)) == builder().count()
+    sizes = [len(shard) for shard in shards]
+    assert max(sizes) - min(sizes) <= 1
+    assert draw(builder().partition(3, 7), 20) == shards[3][:20]
+
+
+def test_partition_checkpoint_stays_in_shard():
+    builder = cpr_builder.CprBuilder().with_year(1990).with_month(2).with_day(3)
+    shard = [cpr.get_dash() for cpr in builder.partition(1, 3)]
+    first = draw(builder, 10)
+    resumed = cpr_builder.CprBuilder.resume(builder.checkpoint())
+    assert first + [cpr.get_dash() for cpr in resumed] == shard
+
+
+def test_partition_invalid_shard():
+    with pytest.raises(ValueError):
+        cpr_builder.CprBuilder().partition(3, 3)
+
+
+def test_windowed_emits_every_number_once():
+    def builder() -> cpr_builder.CprBuilder:
+        return (
+            cpr_builder.CprBuilder()
+            .with_year_range(1990, 1991)
+            .with_month(2)
+            .with_day_range(1, 3)
+        )
+
+    numbers = [cpr.get_dash() for cpr in builder().with_seed(3).windowed(2)]
+    assert len(numbers) == len(set(numbers)) == builder().count()
+    assert set(numbers) == {cpr.get_dash() for cpr in builder().shuffled()}
+
+
+def test_windowed_memory_is_bounded():
+    def builder() -> cpr_builder.CprBuilder:
+        return (
+            cpr_builder.CprBuilder()
+            .with_year_range(1970, 2001)
+            .with_month(2)
+            .with_day(3)
+            .with_genders([Gender.FEMALE])
+        )
+
+    # A first run fills the caches of running number tables shared by all
+    # runs, so only the branches held by the second run are traced.
+    for _ in builder().with_seed(4).windowed():
+        pass
+    stream = iter(builder().with_seed(5).windowed())
+    tracemalloc.start()
+    try:
+        drawn = sum(1 for _ in stream)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert drawn == builder().count()
+    # The whole run passes through 8 windows of 4 years. Each open year holds
+    # the shuffled running numbers of its day, about 9 kB, so keeping the
+    # branches of the years already drawn would take more than 250 kB.
+    assert peak < 150_000
+    assert current < 20_000
+
+
+def test_windowed_invalid_window():
+    with pytest.raises(ValueError):
+        cpr_builder.CprBuilder().windowed(0)
+
+
+def test_sequential_is_sorted_and_complete():
+    def builder() -> cpr_builder.CprBuilder:
+        return cpr_builder.CprBuilder().with_year(1990).with_month(2)
+
+    numbers = list(builder().sequential())
+    assert numbers == sorted(numbers)
+    assert len(numbers) == len(set(numbers)) == builder().count()
+    assert set(numbers) == set(builder().shuffled())
+
+
+def test_sequential_resumes_after_checkpoint():
+    def builder() -> cpr_builder.CprBuilder:
+        return cpr_builder.CprBuilder().with_year(1990).sequential()
+
+    expected = draw(builder(), 8000)
+    first_builder = builder()
+    first = draw(first_builder, 5000)
+    resumed = cpr_builder.CprBuilder.resume(first_builder.checkpoint())
+    assert resumed.order == cpr_builder.Order.SEQUENTIAL
+    assert first + draw(resumed, 3000) == expected
+
+
+def test_export(tmp_path):
+    builder = cpr_builder.CprBuilder().with_year(1990).sequential()
+    path = tmp_path / "cprs.jsonl"
+    assert builder.export(str(path), "jsonl", count=10) == 10
+    lines = path.read_text().splitlines()
+    expected = [cpr.get_dash() for cpr in itertools.islice(builder, 10)]
+    assert [json.loads(line)["cpr"] for line in lines] == expected
@@ -1,6 +1,19 @@
+import random
+from collections import Counter
+from datetime import date
+from typing import Iterator
+
 import pytest
+from improbable_cpr import stats
 from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import RUNNING_NUMBER_RESIDUES
+from improbable_cpr.generators import AbstractGenerator
 from improbable_cpr.generators import CprGenerator
+from improbable_cpr.generators import MonthGenerator
+from improbable_cpr.generators import Options
+from improbable_cpr.generators import YearGenerator
+from improbable_cpr.generators import date_residue
+from improbable_cpr.generators import valid_7_digit
 
 
 @pytest.mark.parametrize(
@@ -14,3 +27,116 @@ from improbable_cpr.generators import CprGenerator
 )
 def test_cpr_control_digit_validation(cpr: str, valid: bool):
     assert CprGenerator.validateControlDigit(Cpr.from_str(cpr)) == valid
+
+
+@pytest.mark.parametrize(
+    "cpr",
+    ["2110625629", "0707614285", "2110625624", "0101000000", "3112999999"],
+)
+def test_residues_match_weighted_sum(cpr: str):
+    weighted_sum = sum(
+        int(digit) * weight
+        for digit, weight in zip(cpr, CprGenerator.MULTIPLICATION_TABLE)
+    )
+    parsed = Cpr.from_str(cpr)
+    residue = date_residue(parsed.day, parsed.month, parsed.year)
+    assert (
+        residue + RUNNING_NUMBER_RESIDUES[parsed.running_number]
+    ) % 11 == weighted_sum % 11
+
+
+def test_only_improbable_numbers(seed_random):
+    options = Options(years=[1962], months=[7], days=[7])
+    numbers = list(CprGenerator(options))
+    assert len(numbers) > 0
+    assert not any(map(CprGenerator.validateControlDigit, numbers))
+
+
+def test_no_improbable_numbers_lost(seed_random):
+    options = Options(years=[2020], months=[2], days=[29])
+    generated = {cpr.running_number for cpr in CprGenerator(options)}
+    expected = {
+        number
+        for number in range(10000)
+        if valid_7_digit(number // 1000, 2020)
+        and CprGenerator.invalidControlDigit(
+            Cpr.from_str(f"290220{number:04d}")
+        )
+    }
+    assert generated == expected
+
+
+class ListGenerator(AbstractGenerator):
+    def getGenerator(self, choise: list[int]) -> Iterator[Cpr]:
+        return (Cpr(running_number=number) for number in choise)
+
+    def enrich(self, cpr: Cpr, choise: list[int]) -> Cpr:
+        return cpr
+
+    def count(self, choise: list[int]) -> int:
+        return len(choise)
+
+
+def test_branches_are_drawn_by_their_size():
+    branches = [(0,), tuple(range(1, 10)), tuple(range(10, 30))]
+    draws = 15000
+    counts = Counter(
+        next(iter(ListGenerator(branches, random.Random(seed)))).running_number
+        for seed in range(draws)
+    )
+    chi_squared = 0.0
+    for branch in branches:
+        expected = draws * len(branch) / 30
+        drawn = counts[branch[0]]
+        chi_squared += (drawn - expected) ** 2 / expected
+    # 99.9% quantile of the chi squared distribution with 2 degrees of freedom
+    assert chi_squared < 13.82
+
+
+def test_every_order_is_equally_likely():
+    branches = [(0,), (1, 2)]
+    draws = 6000
+    counts = Counter(
+        tuple(
+            cpr.running_number
+            for cpr in ListGenerator(branches, random.Random(seed))
+        )
+        for seed in range(draws)
+    )
+    # The branches yield in order, so 1 comes before 2 and the position of
+    # 0 decides the order.
+    assert set(counts) == {(0, 1, 2), (1, 0, 2), (1, 2, 0)}
+    expected = draws / 3
+    chi_squared = sum(
+        (count - expected) ** 2 / expected for count in counts.values()
+    )
+    # 99.9% quantile of the chi squared distribution with 2 degrees of freedom
+    assert chi_squared < 13.82
+
+
+def test_nearly_empty_month_is_drawn_by_its_size():
+    options = Options(min_date=date(1990, 1, 30), max_date=date(1990, 2, 28))
+    generator = MonthGenerator(1990, options)
+    january = generator.count(1) / generator.total()
+    draws = 400
+    drawn = sum(
+        next(iter(MonthGenerator(1990, options, random.Random(seed)))).month
+        == 1
+        for seed in range(draws)
+    )
+    expected = draws * january
+    chi_squared = (drawn - expected) ** 2 / expected + (
+        draws - drawn - (draws - expected)
+    ) ** 2 / (draws - expected)
+    # 99.9% quantile of the chi squared distribution with 1 degree of freedom
+    assert chi_squared < 10.83
+
+
+def test_branch_counts_match_stats():
+    options = Options(
+        years=[1899, 1900, 1960],
+        min_date=date(1899, 12, 20),
+        max_date=date(1960, 1, 10),
+        excluded_dates=[(date(1900, 1, 1), date(1900, 1, 5))],
+    )
+    assert YearGenerator(options).total() == stats.count(options)
@@ -0,0 +1,136 @@
+import itertools
+import random
+from collections import Counter
+from datetime import date
+
+import pytest
+from improbable_cpr import cpr_builder
+from improbable_cpr.cpr_builder import CprBuilder
+from improbable_cpr.distribution import AliasTable
+from improbable_cpr.distribution import Distribution
+from improbable_cpr.distribution import DistributionGenerator
+from improbable_cpr.distribution import age_on
+from improbable_cpr.generators import CprGenerator
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import GenerationException
+from improbable_cpr.generators import Options
+
+
+@pytest.fixture
+def override_today_func(request):
+    old_func = cpr_builder.today_func
+    cpr_builder.today_func = lambda: request.param
+    yield
+    cpr_builder.today_func = old_func
+
+
+def test_alias_table():
+    weights = [0, 1, 2, 3, 0.5]
+    table = AliasTable(weights)
+    rng = random.Random(1)
+    counts = Counter(table.draw(rng) for _ in range(65000))
+    assert counts[0] == 0
+    for position, weight in enumerate(weights):
+        assert counts[position] / 65000 == pytest.approx(weight / 6.5, abs=0.01)
+
+
+def test_alias_table_requires_weight():
+    with pytest.raises(ValueError):
+        AliasTable([0, 0])
+
+
+def test_draws_every_number_once():
+    options = Options(years=[1990], months=[6], days=[1, 2, 3, 4])
+    distribution = Distribution(
+        {
+            (date(1990, 6, 1), date(1990, 6, 1)): 10,
+            (date(1990, 6, 2), date(1990, 6, 4)): 1,
+        },
+        by="date",
+    )
+    cprs = list(DistributionGenerator(options, distribution, random.Random(1)))
+    assert len(cprs) == len(set(cprs))
+    assert set(cprs) == set(CprGenerator(options))
+    # The first date gets most of the early draws until it runs out.
+    early = Counter(cpr.day for cpr in cprs[:1000])
+    assert early[1] > 800
+
+
+def test_dates_outside_groups_are_not_drawn():
+    options = Options(years=[1990, 1991, 1992])
+    distribution = Distribution({1991: 1}, by="year")
+    generator = DistributionGenerator(options, distribution)
+    assert {cpr.year for cpr in itertools.islice(generator, 1000)} == {1991}
+
+
+@pytest.mark.parametrize(
+    "override_today_func", [date(2024, 2, 29)], indirect=True
+)
+def test_age_shares(override_today_func, seed_random):
+    weights = {age: 100 - age for age in range(0, 100, 10)}
+    genders = {Gender.FEMALE: 3, Gender.MALE: 1}
+    builder = (
+        CprBuilder().with_seed(1).with_distribution(weights, "age", genders)
+    )
+    cprs = list(itertools.islice(builder, 20000))
+    assert len(set(cprs)) == len(cprs)
+    ages = Counter(age_on(cpr.birth_date, date(2024, 2, 29)) for cpr in cprs)
+    assert set(ages) == set(weights)
+    total = sum(weights.values())
+    for age, weight in weights.items():
+        assert ages[age] / len(cprs) == pytest.approx(weight / total, abs=0.01)
+    females = sum(cpr.gender == Gender.FEMALE for cpr in cprs)
+    assert females / len(cprs) == pytest.approx(0.75, abs=0.01)
+
+
+def test_seed_is_reproducible():
+    def draw() -> list:
+        builder = CprBuilder().with_seed(7).with_distribution({1990: 1}, "year")
+        return list(itertools.islice(builder, 100))
+
+    assert draw() == draw()
+
+
+def test_only_random_order():
+    builder = CprBuilder().with_distribution({30: 1}).shuffled(1)
+    with pytest.raises(GenerationException):
+        iter(builder)
+
+
+@pytest.mark.parametrize(
+    "weights,by",
+    [
+        ({30: 1}, "month"),
+        ({30: -1}, "age"),
+        (
+            {
+                (date(1990, 1, 1), date(1990, 6, 1)): 1,
+                (date(1990, 6, 1), date(1990, 12, 31)): 1,
+            },
+            "date",
+        ),
+    ],
+)
+def test_invalid_distribution(weights: dict, by: str):
+    with pytest.raises(ValueError):
+        CprBuilder().with_distribution(weights, by)
+
+
+def test_shares_hold_until_a_group_runs_out():
+    options = Options(years=[1990], months=[6])
+    distribution = Distribution(
+        {
+            (date(1990, 6, 1), date(1990, 6, 10)): 1,
+            (date(1990, 6, 11), date(1990, 6, 30)): 1,
+        },
+        by="date",
+    )
+    generator = DistributionGenerator(options, distribution, random.Random(2))
+    positions = [
+        position for position, cpr in enumerate(generator) if cpr.day <= 10
+    ]
+    # Both groups get half of the draws until the first one runs out, also
+    # while the last numbers of its cells are drawn.
+    assert len(positions) / (positions[-1] + 1) == pytest.approx(0.5, abs=0.005)
+    last = positions[len(positions) * 95 // 100 :]
+    assert len(last) / (last[-1] - last[0] + 1) == pytest.approx(0.5, abs=0.05)
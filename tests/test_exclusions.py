@@ -0,0 +1,65 @@
+from datetime import date
+
+from improbable_cpr.exclusions import ALLOCATED_DAYS
+from improbable_cpr.exclusions import DateSet
+from improbable_cpr.generators import MonthGenerator
+from improbable_cpr.generators import Options
+
+
+def test_date_set_merges_ranges():
+    dates = DateSet(
+        [
+            (date(2000, 1, 10), date(2000, 1, 20)),
+            (date(2000, 1, 1), date(2000, 1, 3)),
+            (date(2000, 1, 15), date(2000, 2, 2)),
+            (date(2000, 1, 4), date(2000, 1, 4)),
+            (date(2000, 3, 1), date(2000, 2, 1)),
+        ]
+    )
+    assert list(dates) == [
+        (date(2000, 1, 1), date(2000, 1, 4)),
+        (date(2000, 1, 10), date(2000, 2, 2)),
+    ]
+    assert len(dates) == 4 + 24
+    assert date(2000, 1, 4) in dates
+    assert date(2000, 1, 5) not in dates
+    assert date(2000, 2, 2) in dates
+    assert date(1999, 12, 31) not in dates
+
+
+def test_days_in_range():
+    dates = DateSet([(date(2000, 1, 30), date(2000, 2, 2))])
+    assert list(dates.days_in_range(date(2000, 2, 1), date(2000, 2, 29))) == [
+        date(2000, 2, 1),
+        date(2000, 2, 2),
+    ]
+    assert list(dates.days_in_range(date(2000, 3, 1), date(2000, 3, 31))) == []
+
+
+def test_allocated_days_excluded_by_default():
+    day = ALLOCATED_DAYS[0]
+    days = MonthGenerator(day.year, Options()).get_days(day.month)
+    assert day.day not in days
+    options = Options(exclude_allocated=False)
+    assert day.day in MonthGenerator(day.year, options).get_days(day.month)
+
+
+def test_excluded_dates():
+    options = Options(
+        months=[2],
+        min_date=date(2001, 2, 10),
+        excluded_dates=[
+            (date(2001, 1, 20), date(2001, 2, 12)),
+            (date(2001, 2, 28), date(2001, 3, 5)),
+        ],
+    )
+    days = MonthGenerator(2001, options).get_days(2)
+    assert days == list(range(13, 28))
+
+
+def test_options_round_trip():
+    options = Options(
+        exclude_allocated=False,
+        excluded_dates=[(date(2001, 1, 20), date(2001, 2, 12))],
+    )
+    assert Options.from_dict(options.to_dict()) == options
@@ -0,0 +1,26 @@
+import random
+
+import pytest
+from improbable_cpr.fenwick import FenwickTree
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 5, 8, 13, 100])
+def test_matches_prefix_sums(size: int):
+    rng = random.Random(size)
+    weights = [rng.randrange(5) for _ in range(size)]
+    tree = FenwickTree(weights)
+    for _ in range(50):
+        if size:
+            position = rng.randrange(size)
+            delta = rng.randrange(-weights[position], 5)
+            weights[position] += delta
+            tree.add(position, delta)
+        assert tree.total == sum(weights)
+        for position in range(size):
+            assert tree.prefix_sum(position) == sum(weights[:position])
+            assert tree.weight(position) == weights[position]
+        for target in range(tree.total):
+            position = tree.find(target)
+            assert (
+                sum(weights[:position]) <= target < sum(weights[: position + 1])
+            )
@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.generators import CprGenerator
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import Options
+from improbable_cpr.index import CprIndex
+
+
+def key(cpr: Cpr) -> tuple:
+    return (cpr.year, cpr.month, cpr.day, cpr.running_number)
+
+
+@pytest.fixture
+def options() -> Options:
+    return Options(
+        years=[1899, 1900, 2036],
+        months=[2, 12],
+        days=[1, 28, 29, 31],
+        genders=[Gender.MALE],
+        min_date=date(1899, 12, 31),
+    )
+
+
+def test_matches_generator(options: Options, seed_random):
+    index = CprIndex(options)
+    generated = sorted(map(key, CprGenerator(options)))
+    assert len(index) == len(generated)
+    assert list(map(key, index)) == generated
+
+
+def test_rank_inverts_unrank(options: Options):
+    index = CprIndex(options)
+    for position in range(0, len(index), 97):
+        assert index.rank(index.unrank(position)) == position
+
+
+@pytest.mark.parametrize(
+    "cpr",
+    [
+        "0112000002",  # female
+        "1512000001",  # day not selected
+        "0112990001",  # year not selected
+        "0112004001",  # 7th digit belongs to 2000
+        "0112000003",  # passes modulus 11
+    ],
+)
+def test_rank_outside_options(options: Options, cpr: str):
+    index = CprIndex(options)
+    assert Cpr.from_str(cpr) not in index
+    with pytest.raises(ValueError):
+        index.rank(Cpr.from_str(cpr))
+
+
+def test_out_of_range(options: Options):
+    index = CprIndex(options)
+    with pytest.raises(IndexError):
+        index.unrank(len(index))
+    with pytest.raises(IndexError):
+        index.unrank(-1)
+
+
+def test_slices(options: Options):
+    index = CprIndex(options)
+    everything = list(map(key, index))
+    assert list(map(key, index[1000:9000])) == everything[1000:9000]
+    assert list(map(key, index[-5:])) == everything[-5:]
+    assert list(map(key, index[10:5000:7])) == everything[10:5000:7]
+    assert key(index[-1]) == everything[-1]
+
+
+def test_random_access_on_full_range():
+    index = CprIndex(Options())
+    assert index[0].get_dash() == "010158-5000"
+    assert index[-1].get_dash() == "311257-8999"
+    assert index.rank(index[123456789]) == 123456789
+
+
+def test_empty():
+    index = CprIndex(Options(years=[2058]))
+    assert len(index) == 0
+    assert list(index) == []
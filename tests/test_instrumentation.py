@@ -0,0 +1,59 @@
+import io
+from datetime import date
+
+from improbable_cpr import instrumentation
+from improbable_cpr.cpr_builder import CprBuilder
+from improbable_cpr.instrumentation import Progress
+
+
+def single_day() -> CprBuilder:
+    return CprBuilder().with_year(1990).with_month(6).with_day(15).with_seed(1)
+
+
+def test_counters(seed_random):
+    builder = single_day()
+    with instrumentation.enabled() as stats:
+        numbers = list(builder)
+    counters = stats.counters
+    assert counters["branches.YearGenerator"] == 1
+    assert counters["branches.DayGenerator"] == 1
+    assert counters["branches.GenderGenerator"] == 2
+    assert counters["candidates"] == 2 * 10000
+    rejected = sum(
+        count
+        for name, count in counters.items()
+        if name.startswith("rejected.")
+    )
+    assert counters["candidates"] - rejected == len(numbers) == builder.count()
+    assert {"setup", "tables", "shuffle"} <= set(stats.seconds)
+
+
+def test_empty_branches_are_not_opened():
+    builder = single_day().with_excluded_dates(date(1990, 6, 15))
+    with instrumentation.enabled() as stats:
+        assert list(builder) == []
+    assert not stats.counters
+
+
+def test_disabled():
+    with instrumentation.enabled() as stats:
+        pass
+    assert instrumentation.current is None
+    list(single_day())
+    assert not stats.counters and not stats.seconds
+
+
+def test_timed():
+    with instrumentation.enabled() as stats:
+        assert list(stats.timed(range(5), "stage", "items")) == [*range(5)]
+    assert stats.counters["items"] == 5
+    assert "stage" in stats.seconds
+
+
+def test_progress():
+    output = io.StringIO()
+    progress = Progress(10000, output)
+    assert sum(1 for _ in progress.track(range(10000))) == 10000
+    progress.finish()
+    assert output.getvalue().endswith("\n")
+    assert "10,000/10,000 (100.0%)" in output.getvalue().split("\r")[-1]
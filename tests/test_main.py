@@ -0,0 +1,271 @@
+import json
+import sys
+
+import pytest
+from improbable_cpr.main import main_cli
+
+
+def run_cli(monkeypatch, capsys, *args: str) -> str:
+    monkeypatch.setattr(sys, "argv", ["improbable_cpr", *args])
+    capsys.readouterr()
+    main_cli()
+    return capsys.readouterr().out
+
+
+def test_count(monkeypatch, capsys, seed_random):
+    output = run_cli(monkeypatch, capsys, "--year", "1990", "-n", "5")
+    lines = output.splitlines()
+    assert len(lines) == 5
+    assert all(line[4:6] == "90" and line[6] == "-" for line in lines)
+
+
+def test_stats(monkeypatch, capsys):
+    output = run_cli(monkeypatch, capsys, "--year", "1990", "--stats", "gender")
+    assert output.splitlines() == [
+        "female\t992725",
+        "male\t992724",
+        "total\t1985449",
+    ]
+
+
+def test_stats_include_allocated(monkeypatch, capsys):
+    output = run_cli(
+        monkeypatch,
+        capsys,
+        "--year",
+        "1990",
+        "--include-allocated",
+        "--stats",
+        "gender",
+    )
+    assert output.splitlines() == [
+        "female\t995452",
+        "male\t995452",
+        "total\t1990904",
+    ]
+
+
+def test_exclude(monkeypatch, capsys):
+    output = run_cli(
+        monkeypatch,
+        capsys,
+        "--year",
+        "1991",
+        "--month",
+        "2",
+        "--exclude",
+        "1991-02-02..1991-02-27",
+        "--exclude",
+        "1991-02-28",
+        "--stats",
+        "day",
+    )
+    assert [line.split("\t")[0] for line in output.splitlines()] == [
+        "1",
+        "total",
+    ]
+
+
+def test_stats_unknown_dimension(monkeypatch, capsys):
+    with pytest.raises(SystemExit):
+        run_cli(monkeypatch, capsys, "--stats", "week")
+
+
+def test_output_file(monkeypatch, capsys, tmp_path):
+    path = tmp_path / "cprs.txt"
+    output = run_cli(
+        monkeypatch,
+        capsys,
+        "--year",
+        "1990",
+        "--order",
+        "shuffled",
+        "--format",
+        "no-dash",
+        "-n",
+        "2500",
+        "--output",
+        str(path),
+    )
+    assert output == ""
+    lines = path.read_bytes().splitlines()
+    assert len(lines) == len(set(lines)) == 2500
+    assert all(len(line) == 10 for line in lines)
+
+
+def test_output_dir_requires_workers(monkeypatch, capsys, tmp_path):
+    with pytest.raises(SystemExit):
+        run_cli(monkeypatch, capsys, "--output-dir", str(tmp_path))
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--workers", "0"],
+        ["--workers", "-2"],
+        ["--workers", "2", "--order", "sequential"],
+        ["--shard", "0/2", "--order", "windowed"],
+    ],
+)
+def test_invalid_workers_and_shard(monkeypatch, capsys, args: list[str]):
+    with pytest.raises(SystemExit):
+        run_cli(monkeypatch, capsys, "--year", "1990", *args)
+
+
+def test_checkpoint_file(monkeypatch, capsys, tmp_path):
+    checkpoint = tmp_path / "checkpoint"
+    args = ["--year", "1990", "--order", "shuffled", "--seed", "3"]
+    expected = run_cli(monkeypatch, capsys, *args, "-n", "20").splitlines()
+
+    first = run_cli(
+        monkeypatch,
+        capsys,
+        *args,
+        "-n",
+        "8",
+        "--checkpoint-file",
+        str(checkpoint),
+    )
+    rest = run_cli(
+        monkeypatch, capsys, "--resume-from", str(checkpoint), "-n", "12"
+    )
+    assert (first + rest).splitlines() == expected
+
+
+def test_checkpoint_file_defaults_to_shuffled(monkeypatch, capsys, tmp_path):
+    checkpoint = tmp_path / "checkpoint"
+    args = ["--year", "1990", "--seed", "3"]
+    expected = run_cli(
+        monkeypatch, capsys, *args, "--order", "shuffled", "-n", "20"
+    ).splitlines()
+    first = run_cli(
+        monkeypatch,
+        capsys,
+        *args,
+        "-n",
+        "8",
+        "--checkpoint-file",
+        str(checkpoint),
+    )
+    rest = run_cli(
+        monkeypatch, capsys, "--resume-from", str(checkpoint), "-n", "12"
+    )
+    assert (first + rest).splitlines() == expected
+
+
+@pytest.mark.parametrize("order", ["random", "windowed"])
+def test_checkpoint_file_rejects_order(monkeypatch, capsys, tmp_path, order):
+    with pytest.raises(SystemExit):
+        run_cli(
+            monkeypatch,
+            capsys,
+            "--order",
+            order,
+            "--checkpoint-file",
+            str(tmp_path / "checkpoint"),
+        )
+    assert not (tmp_path / "checkpoint").exists()
+
+
+def test_check(monkeypatch, capsys, tmp_path):
+    path = tmp_path / "cprs.txt"
+    path.write_bytes(b"0101580000\n010158-0008\n3102904000\n")
+    with pytest.raises(SystemExit) as exit_info:
+        run_cli(monkeypatch, capsys, "check", str(path))
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().out.splitlines() == [
+        "improbable\t1",
+        "valid-mod11\t1",
+        "bad-century\t0",
+        "bad-date\t1",
+        "malformed\t0",
+        "total\t3",
+        "2\tvalid-mod11",
+        "3\tbad-date",
+    ]
+
+
+def test_shard(monkeypatch, capsys):
+    args = ["--year", "1990", "--month", "2", "--day", "1-3"]
+    shards = [
+        run_cli(monkeypatch, capsys, *args, "--shard", f"{shard}/2")
+        for shard in range(2)
+    ]
+    everything = run_cli(monkeypatch, capsys, *args, "--order", "shuffled")
+    lines = [line for shard in shards for line in shard.splitlines()]
+    assert len(lines) == len(set(lines))
+    assert set(lines) == set(everything.splitlines())
+
+
+def test_stats_out(monkeypatch, capsys, tmp_path):
+    path = tmp_path / "stats.json"
+    args = ["--year", "1990", "--month", "6", "--day", "15", "-n", "100"]
+    output = run_cli(monkeypatch, capsys, *args, "--stats-out", str(path))
+    assert len(output.splitlines()) == 100
+    stats = json.loads(path.read_text())
+    assert stats["counters"]["numbers.emitted"] == 100
+    assert stats["counters"]["candidates"] == 2 * 10000
+    assert "generate" in stats["seconds"]
+
+
+def test_progress(monkeypatch, capsys):
+    args = ["--year", "1990", "--month", "6", "--day", "15", "--progress"]
+    monkeypatch.setattr(sys, "argv", ["improbable_cpr", *args])
+    main_cli()
+    captured = capsys.readouterr()
+    count = len(captured.out.splitlines())
+    assert f"{count:,}/{count:,} (100.0%)" in captured.err
+
+
+def test_windowed_order(monkeypatch, capsys):
+    args = ["--year", "1990", "--month", "2", "--day", "1-2"]
+    windowed = run_cli(monkeypatch, capsys, *args, "--order", "windowed")
+    shuffled = run_cli(monkeypatch, capsys, *args, "--order", "shuffled")
+    assert sorted(windowed.splitlines()) == sorted(shuffled.splitlines())
+
+
+def test_sequential_order(monkeypatch, capsys):
+    args = ["--year", "1990", "--month", "2", "--order", "sequential"]
+    lines = run_cli(monkeypatch, capsys, *args).splitlines()
+    assert lines[:2] == ["010290-0000", "010290-0001"]
+    keys = [line[4:6] + line[2:4] + line[:2] + line[7:] for line in lines]
+    assert keys == sorted(keys)
+
+
+def test_csv_format(monkeypatch, capsys):
+    args = ["--year", "1990", "-n", "5", "--format", "csv"]
+    lines = run_cli(
+        monkeypatch, capsys, *args, "--reference-date", "2020-12-31"
+    ).splitlines()
+    assert lines[0] == "cpr,birth_date,age,gender,century_digit"
+    assert len(lines) == 6
+    assert all(line.split(",")[2] == "30" for line in lines[1:])
+
+
+def test_npy_format_to_stdout(monkeypatch, capsysbinary):
+    args = ["--year", "1990", "--month", "2", "--day", "1", "--format", "npy"]
+    monkeypatch.setattr(sys, "argv", ["improbable_cpr", *args, "-n", "7"])
+    main_cli()
+    data = capsysbinary.readouterr().out
+    assert b"'shape': (7,)" in data[:128]
+    assert len(data) == 128 + 7 * 8
+
+
+def test_build_index(monkeypatch, capsys, tmp_path):
+    path = tmp_path / "space.bitmap"
+    output = run_cli(monkeypatch, capsys, "build-index", "--path", str(path))
+    assert output == f"Wrote {path}\n"
+    output = run_cli(
+        monkeypatch, capsys, "build-index", "--path", str(path), "--verify"
+    )
+    assert output == f"{path} is valid\n"
+
+    with open(path, "r+b") as bitmap_file:
+        bitmap_file.seek(-1, 2)
+        bitmap_file.write(b"\xff")
+    with pytest.raises(SystemExit) as exit_info:
+        run_cli(
+            monkeypatch, capsys, "build-index", "--path", str(path), "--verify"
+        )
+    assert exit_info.value.code == 1
+    assert "does not match its checksum" in capsys.readouterr().err
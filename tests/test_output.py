@@ -0,0 +1,132 @@
+import io
+import json
+import struct
+import sys
+from array import array
+from datetime import date
+
+import pytest
+from improbable_cpr.cpr import Cpr
+from improbable_cpr.output import CprWriter
+from improbable_cpr.output import make_writer
+from improbable_cpr.output import write_cprs
+
+
+CPRS = ["0101580000", "3112579999", "2902000042", "1005746804"]
+
+
+@pytest.mark.parametrize("dash", [True, False])
+def test_records(dash: bool):
+    stream = io.BytesIO()
+    writer = CprWriter(stream, dash)
+    cprs = [Cpr.from_str(cpr) for cpr in CPRS]
+    assert writer.write_all(cprs) == len(cprs)
+    writer.flush()
+    expected = [cpr.get_dash() if dash else cpr.get_no_dash() for cpr in cprs]
+    assert stream.getvalue().decode().splitlines() == expected
+
+
+def test_buffers_until_size():
+    stream = io.BytesIO()
+    writer = CprWriter(stream, buffer_size=3 * 12)
+    writer.write(Cpr.from_str(CPRS[0]))
+    writer.write(Cpr.from_str(CPRS[1]))
+    assert stream.getvalue() == b""
+    writer.write(Cpr.from_str(CPRS[2]))
+    assert len(stream.getvalue()) == 3 * 12
+    writer.write(Cpr.from_str(CPRS[3]))
+    writer.flush()
+    assert stream.getvalue().endswith(b"100574-6804\n")
+
+
+def test_on_drain():
+    stream = io.BytesIO()
+    sizes = []
+    writer = CprWriter(
+        stream,
+        buffer_size=2 * 12,
+        on_drain=lambda: sizes.append(len(stream.getvalue())),
+    )
+    writer.write_all(Cpr.from_str(cpr) for cpr in CPRS[:3])
+    writer.flush()
+    assert sizes == [2 * 12, 3 * 12]
+
+
+REFERENCE_DATE = date(2026, 1, 1)
+
+
+def cprs() -> list[Cpr]:
+    return [Cpr(1, 1, 1958, 0), Cpr(31, 12, 2057, 9999), Cpr(29, 2, 2000, 42)]
+
+
+def test_csv():
+    stream = io.BytesIO()
+    assert write_cprs(cprs(), stream, "csv", reference_date=REFERENCE_DATE) == 3
+    assert stream.getvalue().decode().splitlines() == [
+        "cpr,birth_date,age,gender,century_digit",
+        "010158-0000,1958-01-01,68,female,0",
+        "311257-9999,2057-12-31,-32,male,9",
+        "290200-0042,2000-02-29,25,female,0",
+    ]
+
+
+def test_jsonl():
+    stream = io.BytesIO()
+    write_cprs(cprs(), stream, "jsonl", reference_date=REFERENCE_DATE)
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert records[2] == {
+        "cpr": "290200-0042",
+        "birth_date": "2000-02-29",
+        "age": 25,
+        "gender": "female",
+        "century_digit": 0,
+    }
+    assert [record["cpr"] for record in records] == [
+        cpr.get_dash() for cpr in cprs()
+    ]
+
+
+def test_packed():
+    stream = io.BytesIO()
+    write_cprs(cprs(), stream, "packed", buffer_size=8)
+    values = array("Q", stream.getvalue())
+    if sys.byteorder == "big":
+        values.byteswap()
+    assert [Cpr.from_packed(value) for value in values] == cprs()
+
+
+@pytest.mark.parametrize("seekable", [True, False])
+def test_npy_header(seekable: bool):
+    stream = io.BytesIO()
+    if not seekable:
+        stream.seekable = lambda: False  # type: ignore
+    count = None if seekable else 3
+    write_cprs(cprs(), stream, "npy", count=count)
+    data = stream.getvalue()
+    assert data[:8] == b"\x93NUMPY\x01\x00"
+    header_size = 10 + struct.unpack("<H", data[8:10])[0]
+    assert header_size % 64 == 0
+    assert b"'shape': (3,)" in data[:header_size]
+    assert len(data) == header_size + 3 * 8
+
+
+def test_npy_not_seekable_count_mismatch():
+    stream = io.BytesIO()
+    stream.seekable = lambda: False  # type: ignore
+    with pytest.raises(ValueError):
+        write_cprs(cprs(), stream, "npy", count=2)
+
+
+def test_npy_loads_with_numpy(tmp_path):
+    np = pytest.importorskip("numpy")
+    path = tmp_path / "cprs.npy"
+    with open(path, "wb") as stream:
+        write_cprs(cprs(), stream, "npy")
+    values = np.load(path, mmap_mode="r")
+    assert values.dtype == np.uint64
+    assert list(values) == [cpr.packed for cpr in cprs()]
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        make_writer(io.BytesIO(), "xml")
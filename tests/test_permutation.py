@@ -0,0 +1,55 @@
+import itertools
+import tracemalloc
+from collections import Counter
+
+import pytest
+from improbable_cpr.cpr_builder import CprBuilder
+from improbable_cpr.permutation import FeistelPermutation
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 7, 64, 1000, 4099])
+def test_is_permutation(size: int):
+    assert sorted(FeistelPermutation(size, 7)) == list(range(size))
+
+
+def test_same_key_same_order():
+    assert list(FeistelPermutation(500, 3)) == list(FeistelPermutation(500, 3))
+    assert list(FeistelPermutation(500, 3)) != list(FeistelPermutation(500, 4))
+
+
+def test_out_of_range():
+    with pytest.raises(IndexError):
+        FeistelPermutation(10, 1)[10]
+
+
+def test_first_value_is_uniform():
+    size = 10
+    draws = 20000
+    counts = Counter(FeistelPermutation(size, key)[0] for key in range(draws))
+    expected = draws / size
+    chi_squared = sum(
+        (counts[i] - expected) ** 2 / expected for i in range(size)
+    )
+    # 99.9% quantile of the chi squared distribution with 9 degrees of freedom
+    assert chi_squared < 27.88
+
+
+def test_shuffled_builder_emits_every_number_once():
+    builder = CprBuilder().with_year(1970).with_month(3).with_day_range(1, 3)
+    numbers = [cpr.get_no_dash() for cpr in builder.shuffled(11)]
+    assert len(numbers) == len(set(numbers)) == builder.count()
+    assert numbers != sorted(numbers)
+
+
+def test_shuffled_builder_constant_memory():
+    stream = iter(CprBuilder().shuffled(5))
+    for _ in itertools.islice(stream, 1000):
+        pass
+    tracemalloc.start()
+    try:
+        for _ in itertools.islice(stream, 3000):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 100_000
@@ -1,6 +1,9 @@
 import pytest
 from improbable_cpr.generators import Gender
 from improbable_cpr.generators import RunningNumberGenerator
+from improbable_cpr.generators import running_numbers
+from improbable_cpr.generators import seventh_digits
+from improbable_cpr.generators import valid_7_digit
 
 
 def test_female(seed_random):
@@ -48,3 +51,32 @@ def test_7_digit(year: int, valid_digits: list[int], seed_random):
 @pytest.mark.parametrize("year", [(1857), (2058)])
 def test_out_of_bounds(year: int, seed_random):
     assert len(list(RunningNumberGenerator(year, Gender.MALE))) == 0
+
+
+@pytest.mark.parametrize("year", [(1858), (1920), (1950), (2010), (2040)])
+@pytest.mark.parametrize("gender", list(Gender))
+def test_table_matches_rules(year: int, gender: Gender):
+    expected = [
+        i
+        for i in range(10000)
+        if i % 2 == (0 if gender == Gender.FEMALE else 1)
+        and valid_7_digit(get_7_digit(i), year)
+    ]
+    assert list(running_numbers(seventh_digits(year), gender)) == expected
+
+
+def test_table_shared_within_band():
+    assert running_numbers(seventh_digits(1940), Gender.MALE) is (
+        running_numbers(seventh_digits(1990), Gender.MALE)
+    )
+
+
+def test_table_not_modified_by_shuffle(seed_random):
+    table = running_numbers(seventh_digits(1975), Gender.FEMALE)
+    before = list(table)
+    numbers = [
+        cpr.running_number
+        for cpr in RunningNumberGenerator(1975, Gender.FEMALE)
+    ]
+    assert sorted(numbers) == before
+    assert list(table) == before
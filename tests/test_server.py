@@ -0,0 +1,137 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import parse_qs
+
+import pytest
+from improbable_cpr.server import CprServer
+from improbable_cpr.server import CprService
+from improbable_cpr.server import builder_from_query
+
+
+@pytest.fixture(scope="module")
+def url():
+    server = CprServer(("127.0.0.1", 0), CprService(pool_size=500, seed=1))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.read()
+
+
+def test_text(url: str):
+    lines = get(f"{url}/cpr?count=1000&year=1980-1990&gender=female")
+    numbers = lines.decode().splitlines()
+    assert len(numbers) == len(set(numbers)) == 1000
+    assert all(80 <= int(number[4:6]) <= 90 for number in numbers)
+    assert all(number[6] == "-" for number in numbers)
+    assert all(int(number[7:]) % 2 == 0 for number in numbers)
+
+
+def test_json(url: str):
+    cprs = json.loads(get(f"{url}/cpr.json?count=5&format=no-dash"))
+    assert len(cprs) == 5
+    assert all(len(cpr) == 10 for cpr in cprs)
+
+
+def test_numbers_given_out_once(url: str):
+    query = "year=1990&month=2&day=3&gender=male"
+    overlapping = "year=1989-1991&month=2&day=3"
+    results = []
+
+    def client(query: str) -> None:
+        results.append(get(f"{url}/cpr?count=1200&{query}").splitlines())
+
+    clients = [
+        threading.Thread(target=client, args=(spec,))
+        for spec in (query, query, overlapping)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    numbers = [number for result in results for number in result]
+    assert len(numbers) == len(set(numbers)) == 3 * 1200
+
+
+def test_exhausted_spec(url: str):
+    query = "year=1991&month=3&day=4&gender=female"
+    numbers = get(f"{url}/cpr?count=5000&{query}").splitlines()
+    assert 0 < len(numbers) < 5000
+    assert get(f"{url}/cpr?count=10&{query}") == b""
+
+
+def test_allocated_days(url: str):
+    query = "year=1990&month=1&day=1"
+    assert get(f"{url}/cpr?count=10&{query}") == b""
+    numbers = get(f"{url}/cpr?count=10&{query}&exclude_allocated=false")
+    assert len(numbers.splitlines()) == 10
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "count=x",
+        "count=-1",
+        "gender=other",
+        "week=1",
+        "min_date=1",
+        "format=csv",
+        "year=abc",
+        "year=1990,19x1",
+        "day=1-",
+        "age=old",
+        "max_date=2000-13-01",
+        "exclude_allocated=maybe",
+    ],
+)
+def test_bad_request(url: str, query: str):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(f"{url}/cpr?{query}")
+    assert error.value.code == 400
+
+
+@pytest.mark.parametrize(
+    "query", ["year=abc", "gender=female,other", "min_date=x"]
+)
+def test_malformed_parameter_is_named(query: str):
+    name = query.split("=")[0]
+    with pytest.raises(ValueError, match=f"Malformed {name}"):
+        builder_from_query(parse_qs(query))
+
+
+def test_metrics(url: str):
+    get(f"{url}/cpr?count=7")
+    metrics = json.loads(get(f"{url}/metrics"))
+    assert metrics["requests"] >= 1
+    assert metrics["numbers"] >= 7
+    assert metrics["latency_ms"]["max"] >= metrics["latency_ms"]["p50"] > 0
+
+
+def test_equivalent_queries_share_a_pool():
+    service = CprService(pool_size=10, seed=1)
+    service.close()
+    first = service.pool(builder_from_query({"year": ["1990", "1991"]}))
+    second = service.pool(builder_from_query({"year": ["01991", "1990"]}))
+    assert first is second
+
+
+def test_idle_pools_are_dropped():
+    service = CprService(pool_size=10, seed=1, max_pools=2)
+    service.close()
+    pools = [
+        service.pool(builder_from_query({"year": [str(year)]}))
+        for year in (1990, 1991, 1992)
+    ]
+    assert list(service.pools.values()) == pools[1:]
+    dropped = pools[0]
+    dropped.fill(10, 10)
+    assert len(dropped.numbers) == 10
+    # The numbers left in a dropped pool were never handed out.
+    assert not any(cpr in service.issued for cpr in dropped.numbers)
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from improbable_cpr.cpr_builder import CprBuilder
+from improbable_cpr.shards import shard_bounds
+
+
+@pytest.mark.parametrize("total,shard_count", [(0, 3), (10, 3), (1001, 7)])
+def test_shard_bounds_balanced(total: int, shard_count: int):
+    bounds = shard_bounds(total, shard_count)
+    assert len(bounds) == shard_count
+    assert bounds[0][0] == 0 and bounds[-1][1] == total
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+    sizes = [stop - start for start, stop in bounds]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def builder() -> CprBuilder:
+    return (
+        CprBuilder()
+        .with_year(2001)
+        .with_month_range(5, 6)
+        .with_day_range(1, 2)
+        .shuffled(1234)
+    )
+
+
+def test_output_independent_of_workers():
+    outputs = []
+    for workers in (1, 3):
+        output = io.BytesIO()
+        builder().write_sharded(output, workers, count=5000)
+        outputs.append(output.getvalue())
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0].splitlines()) == 5000
+
+
+def test_shards_follow_shuffled_order(tmp_path):
+    paths = builder().write_shards(str(tmp_path), 2, dash=False)
+    assert len(paths) == 2
+    lines = b"".join(open(path, "rb").read() for path in paths).splitlines()
+    expected = [cpr.get_no_dash().encode() for cpr in builder()]
+    assert lines == expected
+
+
+def test_invalid_workers(tmp_path):
+    with pytest.raises(ValueError):
+        builder().write_shards(str(tmp_path), 0)
+    with pytest.raises(ValueError):
+        builder().write_sharded(io.BytesIO(), -1)
+
+
+def test_shards_replace_earlier_run(tmp_path):
+    builder().write_shards(str(tmp_path), 3, count=100)
+    (tmp_path / "shard-notes.txt").write_text("kept")
+    paths = builder().write_shards(str(tmp_path), 2, count=100)
+    shard_files = sorted(str(path) for path in tmp_path.glob("shard-0*.txt"))
+    assert shard_files == sorted(paths)
+    assert (tmp_path / "shard-notes.txt").read_text() == "kept"
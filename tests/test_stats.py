@@ -0,0 +1,71 @@
+from collections import Counter
+from datetime import date
+
+import pytest
+from improbable_cpr import stats
+from improbable_cpr.exclusions import ALLOCATED_DAYS
+from improbable_cpr.generators import CprGenerator
+from improbable_cpr.generators import Gender
+from improbable_cpr.generators import Options
+
+
+@pytest.fixture
+def options() -> Options:
+    return Options(
+        years=[1899, 1936, 1937, 2036, 2037],
+        months=[2, 7],
+        days=[1, 9, 29],
+        min_date=date(1899, 7, 5),
+        max_date=date(2037, 2, 1),
+    )
+
+
+def test_count_matches_generator(options: Options, seed_random):
+    assert stats.count(options) == sum(1 for _ in CprGenerator(options))
+
+
+def test_histogram_matches_generator(options: Options, seed_random):
+    expected = Counter(
+        (
+            cpr.year,
+            cpr.day,
+            Gender.FEMALE if cpr.running_number % 2 == 0 else Gender.MALE,
+        )
+        for cpr in CprGenerator(options)
+    )
+    assert stats.histogram(options, ["year", "day", "gender"]) == expected
+
+
+def test_single_dimension_keys(options: Options):
+    histogram = stats.histogram(options, "month")
+    assert set(histogram) == {2, 7}
+    assert sum(histogram.values()) == stats.count(options)
+
+
+def test_unknown_dimension(options: Options):
+    with pytest.raises(ValueError):
+        stats.histogram(options, "week")
+
+
+def test_count_full_range():
+    assert stats.count(Options(exclude_allocated=False)) == 332041820
+
+
+def test_count_excludes_allocated_days():
+    allocated = sum(
+        stats.count(
+            Options(
+                years=[day.year],
+                months=[day.month],
+                days=[day.day],
+                exclude_allocated=False,
+            )
+        )
+        for day in ALLOCATED_DAYS
+    )
+    assert allocated > 0
+    assert stats.count(Options()) == 332041820 - allocated
+
+
+def test_count_outside_supported_years():
+    assert stats.count(Options(years=[1857, 2058])) == 0
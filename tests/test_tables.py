@@ -0,0 +1,64 @@
+import subprocess
+import sys
+
+import pytest
+from improbable_cpr import tables
+from improbable_cpr.generators import MULTIPLICATION_TABLE
+from improbable_cpr.generators import RUNNING_NUMBER_RESIDUES
+
+
+@pytest.mark.parametrize(
+    "gender,counts",
+    [
+        ("female", tables.FEMALE_YEAR_COUNTS),
+        ("male", tables.MALE_YEAR_COUNTS),
+    ],
+)
+def test_year_counts_are_current(gender: str, counts: tuple[int, ...]):
+    assert counts == tables.compute_year_counts(gender)
+
+
+def test_running_number_residues():
+    weights = MULTIPLICATION_TABLE[6:]
+    for number in range(10000):
+        digits = [int(digit) for digit in f"{number:04d}"]
+        residue = sum(map(int.__mul__, digits, weights)) % 11
+        assert RUNNING_NUMBER_RESIDUES[number] == residue
+
+
+def imported_modules(statement: str) -> set[str]:
+    code = f"{statement}; import sys; print(' '.join(sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return set(output.split())
+
+
+@pytest.mark.parametrize(
+    "statement,lazy",
+    [
+        (
+            "import improbable_cpr",
+            {"improbable_cpr.main", "improbable_cpr.generators", "argparse"},
+        ),
+        (
+            "from improbable_cpr import CprBuilder",
+            {"improbable_cpr.main", "argparse", "asyncio", "multiprocessing"},
+        ),
+        (
+            "from improbable_cpr import main_cli",
+            {"asyncio", "multiprocessing", "numpy", "improbable_cpr.check"},
+        ),
+    ],
+)
+def test_lazy_imports(statement: str, lazy: set[str]):
+    assert not imported_modules(statement) & lazy
+
+
+def test_package_exports():
+    import improbable_cpr
+
+    assert improbable_cpr.CprBuilder().with_year(1990).count() > 0
+    assert "main_cli" in dir(improbable_cpr)
+    with pytest.raises(AttributeError):
+        improbable_cpr.missing
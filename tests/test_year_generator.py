@@ -3,6 +3,7 @@ from datetime import date
 
 import pytest
 from improbable_cpr.generators import Gender
+from improbable_cpr.generators import MonthGenerator
 from improbable_cpr.generators import Options
 from improbable_cpr.generators import YearGenerator
 
@@ -104,3 +105,19 @@ def test_years_only_between_min_and_max_year(seed_random):
         has_results = True
         assert cpr.year == 2005
     assert has_results
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        Options(),
+        Options(genders=[Gender.MALE]),
+        Options(excluded_dates=[(date(1999, 12, 20), date(2000, 2, 10))]),
+        Options(min_date=date(1990, 1, 1), max_date=date(2000, 12, 30)),
+    ],
+)
+def test_whole_year_count(options: Options):
+    generator = YearGenerator(options)
+    for year in [1858, 1899, 1936, 1937, 1960, 1990, 1999, 2000, 2057]:
+        expected = MonthGenerator(year, options).total()
+        assert generator.count(year) == expected